@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark for the synthesis pipeline.
+
+Runs extraction (FileModel.read_file), chunking, synthesis through TTSModel
+and stitching against the offline backend, over a sweep of document sizes and
+concurrency levels, and writes the results as JSON:
+
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 1KB,1MB --baseline bench.json
+
+With --baseline the run fails (exit code 1) if any throughput figure dropped
+by more than --tolerance compared to the baseline results.
+"""
+import argparse
+import datetime
+import json
+import logging
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.absolute()
+sys.path.insert(0, str(BENCH_DIR.parent / "universal_tts"))
+
+from models.file_model import FileModel
+from models.tts_model import TTSModel
+from utils.audio_stitcher import AudioStitcher
+from utils.metrics import registry
+from utils.text_chunker import split_text
+from offline_backend import OfflineSpeechClient
+
+DEFAULT_SIZES = "1KB,64KB,1MB,10MB,50MB"
+DEFAULT_CONCURRENCY = "1,4,8"
+DEFAULT_FILE_TYPES = "txt,docx,pdf"
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+WORDS = (
+    "the voice of a narrator carries meaning across long documents and every chapter "
+    "deserves clear pacing natural pauses and warm intonation while numbers dates and "
+    "names such as 2024 March or Dr Smith must be read correctly in context"
+).split()
+
+
+def parse_size(value):
+    """Parse a size such as '64KB' or '10MB' into bytes"""
+    value = value.strip().upper()
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(value)
+
+
+def format_size(size):
+    """Format a byte count using the largest whole unit"""
+    for unit in ("GB", "MB", "KB"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+def make_corpus_text(size, seed=0):
+    """Generate deterministic prose of roughly size bytes, split into paragraphs"""
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(256):
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = rng.choices(WORDS, k=rng.randint(8, 24))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+    pool = "\n".join(paragraphs) + "\n"
+    repeats = size // len(pool) + 1
+    return (pool * repeats)[:size].rstrip()
+
+
+def write_document(path, text, file_type):
+    """Write text as a txt, docx or pdf document"""
+    if file_type == "txt":
+        path.write_text(text, encoding="utf-8")
+    elif file_type == "docx":
+        from docx import Document
+        doc = Document()
+        for paragraph in text.split("\n"):
+            doc.add_paragraph(paragraph)
+        doc.save(str(path))
+    elif file_type == "pdf":
+        import fitz  # PyMuPDF
+        doc = fitz.open()
+        page_chars = 3000
+        for offset in range(0, len(text), page_chars):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), text[offset:offset + page_chars], fontsize=7)
+        doc.save(str(path))
+    else:
+        raise ValueError(f"Unsupported benchmark file type: {file_type}")
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values, pct):
+    """Return the pct percentile of values using linear interpolation"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(values):
+    """Summarize a list of latencies in milliseconds"""
+    return {
+        "p50_ms": _ms(percentile(values, 50)),
+        "p95_ms": _ms(percentile(values, 95)),
+        "p99_ms": _ms(percentile(values, 99)),
+        "max_ms": _ms(max(values) if values else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def bench_extraction(corpus, file_model):
+    """Time FileModel.read_file for every generated document"""
+    results = []
+    for (file_type, size), path in corpus.items():
+        start = time.perf_counter()
+        text = file_model.read_file(path)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "file_type": file_type,
+            "size": format_size(size),
+            "file_bytes": path.stat().st_size,
+            "chars": len(text),
+            "seconds": round(elapsed, 6),
+            "chars_per_second": round(len(text) / elapsed, 1) if elapsed else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        })
+        print(f"extraction {file_type:>4} {format_size(size):>6}: {elapsed:.3f}s")
+    return results
+
+
+def bench_chunking(texts):
+    """Time split_text for every document size"""
+    results = []
+    for size, text in texts.items():
+        start = time.perf_counter()
+        chunks = split_text(text)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "size": format_size(size),
+            "chars": len(text),
+            "chunks": len(chunks),
+            "seconds": round(elapsed, 6),
+            "chars_per_second": round(len(text) / elapsed, 1) if elapsed else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        })
+        print(f"chunking  {format_size(size):>6}: {len(chunks)} chunks in {elapsed:.3f}s")
+    return results
+
+
+def bench_synthesis(texts, concurrency_levels, format, backend, workdir):
+    """Run TTSModel.generate_speech for concurrent documents against the backend"""
+    tts_model = TTSModel()
+    tts_model.client = backend
+    results = []
+    for size, text in texts.items():
+        for concurrency in concurrency_levels:
+            out_dir = workdir / f"synth_{size}_{concurrency}"
+            out_dir.mkdir(parents=True, exist_ok=True)
+            backend.take_records()
+
+            def run(index):
+                started = time.perf_counter()
+                tts_model.generate_speech(text, out_dir / f"doc_{index}.{format}", "alloy",
+                                          "gpt-4o-mini-tts", None, format)
+                return time.perf_counter() - started
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                job_seconds = list(executor.map(run, range(concurrency)))
+            elapsed = time.perf_counter() - start
+            records = backend.take_records()
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+            chars = sum(r["chars"] for r in records)
+            audio_seconds = sum(r["audio_seconds"] for r in records)
+            results.append({
+                "size": format_size(size),
+                "concurrency": concurrency,
+                "format": format,
+                "documents": concurrency,
+                "requests": len(records),
+                "seconds": round(elapsed, 6),
+                "chars_per_second": round(chars / elapsed, 1) if elapsed else None,
+                "audio_seconds_per_second": round(audio_seconds / elapsed, 1) if elapsed else None,
+                "job_seconds": latency_summary(job_seconds),
+                "ttfb": latency_summary([r["ttfb"] for r in records]),
+                "chunk_latency": latency_summary([r["latency"] for r in records]),
+                "peak_rss_bytes": peak_rss_bytes(),
+            })
+            print(f"synthesis {format_size(size):>6} x{concurrency:<3}: {elapsed:.3f}s, "
+                  f"{len(records)} requests")
+    return results
+
+
+def bench_stitching(format, backend, workdir, segments=64, segment_seconds=60):
+    """Time AudioStitcher writing pre-rendered chunk responses to disk"""
+    body, audio_seconds = backend.render(format, segment_seconds)
+    blocks = [body[i:i + 16384] for i in range(0, len(body), 16384)]
+    output_file = workdir / f"stitched.{format}"
+
+    start = time.perf_counter()
+    with AudioStitcher(output_file, format) as stitcher:
+        for _ in range(segments):
+            stitcher.add_segment(blocks)
+    elapsed = time.perf_counter() - start
+    total_bytes = stitcher.bytes_written
+    output_file.unlink()
+
+    print(f"stitching {segments} x {segment_seconds}s {format}: {elapsed:.3f}s")
+    return [{
+        "format": format,
+        "segments": segments,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 6),
+        "bytes_per_second": round(total_bytes / elapsed, 1) if elapsed else None,
+        "audio_seconds_per_second": round(segments * audio_seconds / elapsed, 1) if elapsed else None,
+    }]
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a list of throughput regressions compared to a baseline result file"""
+    regressions = []
+    for stage in ("extraction", "chunking", "synthesis", "stitching"):
+        previous = {_case_key(r): r for r in baseline.get("results", {}).get(stage, [])}
+        for current in results.get(stage, []):
+            old = previous.get(_case_key(current))
+            if not old:
+                continue
+            for metric in ("chars_per_second", "audio_seconds_per_second", "bytes_per_second"):
+                if current.get(metric) is None or not old.get(metric):
+                    continue
+                change = (current[metric] - old[metric]) / old[metric]
+                if change < -tolerance:
+                    regressions.append({
+                        "stage": stage,
+                        "case": _case_key(current),
+                        "metric": metric,
+                        "baseline": old[metric],
+                        "current": current[metric],
+                        "change": round(change, 4),
+                    })
+    return regressions
+
+
+def _case_key(result):
+    keys = ("file_type", "size", "concurrency", "format", "segments")
+    return "/".join(f"{k}={result[k]}" for k in keys if k in result)
+
+
+def git_revision():
+    """Return the short git revision of the working tree, if available"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Universal-TTS synthesis pipeline")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"document sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY,
+                        help=f"concurrent documents per synthesis case (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--file-types", default=DEFAULT_FILE_TYPES,
+                        help=f"document types to extract (default: {DEFAULT_FILE_TYPES})")
+    parser.add_argument("--synth-max-size", default="16KB",
+                        help="largest document size sent through synthesis (default: 16KB)")
+    parser.add_argument("--format", default="wav", choices=["mp3", "wav", "pcm"],
+                        help="audio format requested from the offline backend (default: wav)")
+    parser.add_argument("--ttfb-ms", type=float, default=0.0, help="simulated time-to-first-byte per request")
+    parser.add_argument("--stream-rate", type=float, default=0.0,
+                        help="simulated audio seconds streamed per second (default: unthrottled)")
+    parser.add_argument("--workdir", help="directory for generated documents (default: temporary)")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed throughput drop versus the baseline (default: 0.10)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    file_types = [t.strip() for t in args.file_types.split(",") if t.strip()]
+    synth_max = parse_size(args.synth_max_size)
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="tts_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Generating corpus in {workdir}")
+    texts = {size: make_corpus_text(size) for size in sizes}
+    corpus = {}
+    for file_type in file_types:
+        for size in sizes:
+            path = workdir / f"doc_{format_size(size)}.{file_type}"
+            if not path.exists():
+                write_document(path, texts[size], file_type)
+            corpus[(file_type, size)] = path
+
+    backend = OfflineSpeechClient(ttfb=args.ttfb_ms / 1000, stream_rate=args.stream_rate)
+    synth_texts = {size: text for size, text in texts.items() if size <= synth_max}
+
+    results = {
+        "extraction": bench_extraction(corpus, FileModel()),
+        "chunking": bench_chunking(texts),
+        "synthesis": bench_synthesis(synth_texts, concurrency_levels, args.format, backend, workdir),
+        "stitching": bench_stitching(args.format, backend, workdir),
+    }
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "sizes": [format_size(s) for s in sizes],
+            "concurrency": concurrency_levels,
+            "file_types": file_types,
+            "synth_max_size": format_size(synth_max),
+            "format": args.format,
+            "ttfb_ms": args.ttfb_ms,
+            "stream_rate": args.stream_rate,
+        },
+        "results": results,
+        "metrics": registry.snapshot(),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["regressions"] = compare_with_baseline(results, baseline, args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['stage']} {regression['case']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})")
+        exit_code = 1 if report["regressions"] else 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
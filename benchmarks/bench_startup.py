@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark for the application entry points.
+
+Each case runs in a fresh interpreter, repeated --runs times:
+
+    python benchmarks/bench_startup.py --output startup.json
+
+- process: wall-clock time of the whole process, including interpreter start
+- in_process: time measured inside the process from before the first
+  application import to the end of the case (for gui_first_paint, the first
+  idle callback of the Tk main loop, i.e. the window has been drawn)
+
+The slowest imports of the GUI controller, as reported by
+`python -X importtime`, are listed to show where startup time goes.
+gui_first_paint is skipped when no display is available.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.absolute()
+APP_DIR = BENCH_DIR.parent / "universal_tts"
+
+CASES = {
+    "models_import": (
+        "import time; t0 = time.perf_counter()\n"
+        "import models.file_model, models.tts_model, models.settings_model\n"
+        "print(time.perf_counter() - t0)\n"
+    ),
+    "gui_import": (
+        "import time; t0 = time.perf_counter()\n"
+        "import tkinter\n"
+        "import controllers.app_controller\n"
+        "print(time.perf_counter() - t0)\n"
+    ),
+    "gui_first_paint": (
+        "import time; t0 = time.perf_counter()\n"
+        "import tkinter as tk\n"
+        "from controllers.app_controller import AppController\n"
+        "root = tk.Tk()\n"
+        "app = AppController(root)\n"
+        "def painted():\n"
+        "    print(time.perf_counter() - t0)\n"
+        "    root.destroy()\n"
+        "root.after_idle(painted)\n"
+        "root.mainloop()\n"
+    ),
+}
+
+
+def run_case(code, workdir):
+    """Run code in a fresh interpreter; return (process seconds, in-process seconds)"""
+    env = dict(os.environ, PYTHONPATH=str(APP_DIR))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return elapsed, float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(workdir, top=15):
+    """Return the slowest imports of the GUI controller by cumulative time"""
+    env = dict(os.environ, PYTHONPATH=str(APP_DIR))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import controllers.app_controller"],
+                            cwd=workdir, env=env, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if not parts[1].isdigit():
+            continue
+        imports.append({"module": parts[2].strip(), "self_ms": int(parts[0]) / 1000,
+                        "cumulative_ms": int(parts[1]) / 1000})
+    imports.sort(key=lambda i: i["cumulative_ms"], reverse=True)
+    return imports[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Universal-TTS startup time")
+    parser.add_argument("--runs", type=int, default=5, help="runs per case (default: 5)")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated cases to run")
+    parser.add_argument("--output", default="startup_results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="tts_startup_") as workdir:
+        for name in args.cases.split(","):
+            process_times, in_process_times = [], []
+            try:
+                for _ in range(args.runs):
+                    process_seconds, in_process_seconds = run_case(CASES[name], workdir)
+                    process_times.append(process_seconds)
+                    in_process_times.append(in_process_seconds)
+            except RuntimeError as e:
+                print(f"{name}: skipped ({e})")
+                results[name] = {"skipped": str(e)}
+                continue
+            results[name] = {
+                "runs": args.runs,
+                "process_ms": round(statistics.median(process_times) * 1000, 1),
+                "in_process_ms": round(statistics.median(in_process_times) * 1000, 1),
+                "min_in_process_ms": round(min(in_process_times) * 1000, 1),
+            }
+            print(f"{name}: {results[name]['in_process_ms']} ms in process, "
+                  f"{results[name]['process_ms']} ms total (median of {args.runs})")
+        imports = slowest_imports(workdir)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+        "slowest_imports": imports,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Offline stand-in for the OpenAI speech endpoint used by the benchmarks.
+
+OfflineSpeechClient mimics the part of the OpenAI client that TTSModel uses
+(client.audio.speech.with_streaming_response.create) and streams silent audio
+whose duration is proportional to the input length. It never touches the
+network, so benchmark numbers measure the local pipeline only, plus whatever
+latency is simulated with ttfb and stream_rate.
+"""
+import struct
+import threading
+import time
+from types import SimpleNamespace
+
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono. An all-zero frame body decodes as silence.
+MP3_FRAME_HEADER = b"\xff\xfb\x90\xc0"
+MP3_FRAME_LENGTH = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+BLOCK_SIZE = 16384
+
+
+def wav_header(data_size, sample_rate=PCM_SAMPLE_RATE, sample_width=PCM_SAMPLE_WIDTH, channels=1):
+    """Build a 44-byte RIFF/WAVE header"""
+    byte_rate = sample_rate * sample_width * channels
+    return (
+        b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate,
+                                sample_width * channels, sample_width * 8)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+class OfflineResponse:
+    """Streaming response returned by OfflineSpeechClient.create"""
+
+    status_code = 200
+
+    def __init__(self, backend, params):
+        self.backend = backend
+        self.params = params
+        self.created_at = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def iter_bytes(self, chunk_size=None):
+        """Yield the synthesized audio in blocks, recording timing on the backend"""
+        backend = self.backend
+        text = self.params["input"]
+        format = self.params.get("response_format", "mp3")
+        seconds = len(text) / backend.chars_per_second
+        body, audio_seconds = backend.render(format, seconds)
+        block_size = chunk_size or BLOCK_SIZE
+
+        if backend.ttfb:
+            time.sleep(backend.ttfb)
+        first_byte_at = None
+        for offset in range(0, len(body), block_size):
+            if first_byte_at is None:
+                first_byte_at = time.perf_counter()
+            yield body[offset:offset + block_size]
+            if backend.stream_rate:
+                # Throttle to stream_rate seconds of audio per wall-clock second
+                elapsed = time.perf_counter() - first_byte_at
+                target = audio_seconds * (offset + block_size) / len(body) / backend.stream_rate
+                if target > elapsed:
+                    time.sleep(target - elapsed)
+
+        finished_at = time.perf_counter()
+        backend.record({
+            "chars": len(text),
+            "bytes": len(body),
+            "audio_seconds": audio_seconds,
+            "ttfb": (first_byte_at or finished_at) - self.created_at,
+            "latency": finished_at - self.created_at,
+        })
+
+
+class OfflineSpeechClient:
+    """Drop-in replacement for OpenAI() as used by TTSModel.generate_speech.
+
+    ttfb: simulated seconds before the first audio byte of each request
+    stream_rate: audio seconds streamed per wall-clock second (0 = unthrottled)
+    chars_per_second: speaking rate used to size the generated audio
+    """
+
+    def __init__(self, ttfb=0.0, stream_rate=0.0, chars_per_second=15.0):
+        self.ttfb = ttfb
+        self.stream_rate = stream_rate
+        self.chars_per_second = chars_per_second
+        self.records = []
+        self._lock = threading.Lock()
+        self.audio = SimpleNamespace(speech=SimpleNamespace(with_streaming_response=self))
+
+    def create(self, **params):
+        """Start a simulated streaming speech request"""
+        if not params.get("input"):
+            raise ValueError("input is required")
+        return OfflineResponse(self, params)
+
+    def render(self, format, seconds):
+        """Return (audio bytes, duration) of silent audio in the requested format"""
+        if format == "mp3":
+            frames = max(1, round(seconds / MP3_FRAME_SECONDS))
+            frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_LENGTH - len(MP3_FRAME_HEADER))
+            return frame * frames, frames * MP3_FRAME_SECONDS
+        if format in ("pcm", "wav"):
+            samples = max(1, round(seconds * PCM_SAMPLE_RATE))
+            pcm = bytes(samples * PCM_SAMPLE_WIDTH)
+            if format == "wav":
+                return wav_header(len(pcm)) + pcm, samples / PCM_SAMPLE_RATE
+            return pcm, samples / PCM_SAMPLE_RATE
+        raise ValueError(f"Offline backend does not support format: {format}")
+
+    def record(self, entry):
+        """Store the timing of a finished request"""
+        with self._lock:
+            self.records.append(entry)
+
+    def take_records(self):
+        """Return and clear the timing records collected so far"""
+        with self._lock:
+            records, self.records = self.records, []
+        return records
@@ -0,0 +1,7 @@
+"""Test setup: the application modules import each other from universal_tts/, as when run from there"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(ROOT / "universal_tts"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+pytest.importorskip("tkinter")
+
+from controllers.app_controller import AppController
+
+
+class FakeRoot:
+    """Records root.after calls instead of running a Tk event loop"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, fn, *args):
+        self.scheduled.append((fn, args))
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for fn, args in scheduled:
+            fn(*args)
+
+
+@pytest.fixture
+def controller():
+    controller = AppController.__new__(AppController)
+    controller.root = FakeRoot()
+    controller.settings_ready = threading.Event()
+    controller._waiting_for_settings = []
+    return controller
+
+
+def test_actions_wait_for_settings_without_blocking(controller):
+    calls = []
+    controller.when_settings_ready(lambda: calls.append("ran"))
+    controller.root.run_pending()
+    assert calls == []
+    assert controller.root.scheduled
+
+    controller.settings_ready.set()
+    controller.root.run_pending()
+    assert calls == ["ran"]
+    assert not controller.root.scheduled
+
+
+def test_repeated_presses_run_once(controller):
+    calls = []
+
+    def action():
+        calls.append("ran")
+    controller.when_settings_ready(action)
+    controller.when_settings_ready(action)
+    controller.settings_ready.set()
+    controller.root.run_pending()
+    assert calls == ["ran"]
+
+
+def test_ready_settings_run_the_action_at_once(controller):
+    calls = []
+    controller.settings_ready.set()
+    controller.when_settings_ready(lambda: calls.append("ran"))
+    assert calls == ["ran"]
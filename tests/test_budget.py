@@ -0,0 +1,96 @@
+"""Budget limits: hard limits refuse requests and cancel jobs, soft limits pause them once"""
+import pytest
+
+from controllers.worker_controller import WorkerController
+from models.budget import BudgetExceeded, BudgetGuard, BudgetLimit, MemoryLedger, parse_budget
+from models.file_model import FileModel
+from models.job_model import JobModel
+from models.tts_model import TTSModel
+from offline_backend import OfflineSpeechClient
+
+# Paragraphs of about 1,500 characters; three fit in a chunk
+PARAGRAPH = "This is a sentence of a queued document about budgets. " * 27
+
+
+def test_parse_budget():
+    job, day = parse_budget("job=2M,day=$50/$40")
+    assert (job.scope, job.hard, job.soft, job.unit) == ("job", 2_000_000, 1_600_000, "chars")
+    assert (day.scope, day.hard, day.soft, day.unit) == ("day", 50, 40, "usd")
+    with pytest.raises(ValueError):
+        parse_budget("week=10")
+    with pytest.raises(ValueError):
+        parse_budget("job=$10/500k")
+
+
+def test_hard_limit_refuses_and_releases_the_other_scopes():
+    ledger = MemoryLedger()
+    guard = BudgetGuard([BudgetLimit("day", 1000), BudgetLimit("job", 100)], ledger)
+    guard.reserve(80, "tts-1", job_id=1)
+    with pytest.raises(BudgetExceeded) as raised:
+        guard.reserve(30, "tts-1", job_id=1)
+    assert raised.value.scope == "job"
+    # The day scope taken before the job limit refused the request is given back
+    assert ledger.reserve_budget(guard._scope_key(guard.limits[0], 1, None), 0) == 80
+    guard.reserve(30, "tts-1", job_id=2)
+
+
+def test_soft_limit_pauses_a_job_only_when_crossed():
+    guard = BudgetGuard([BudgetLimit("job", 1000, soft=100)])
+    assert guard.reserve(60, "tts-1", job_id=1).soft_crossed == []
+    assert guard.reserve(60, "tts-1", job_id=1).soft_crossed == ["job"]
+    assert guard.job_paused(1) and not guard.job_paused(2)
+
+    guard.clear_job_pause(1)
+    # Later requests of the resumed job are over the soft limit but do not pause it again
+    assert guard.reserve(60, "tts-1", job_id=1).soft_crossed == []
+    assert not guard.job_paused(1)
+
+
+def test_day_stays_paused_while_over_the_soft_limit():
+    guard = BudgetGuard([BudgetLimit("day", 1000, soft=100)])
+    guard.reserve(150, "tts-1")
+    assert guard.day_paused()
+    assert guard.reserve(10, "tts-1").soft_crossed == ["day"]
+
+
+def run_queue(tmp_path, budget, paragraphs=12):
+    source = tmp_path / "doc.txt"
+    source.write_text("\n".join(f"Paragraph {i}. {PARAGRAPH}" for i in range(paragraphs)), encoding="utf-8")
+    jobs = JobModel(tmp_path / "jobs.db")
+    job_id = jobs.add_job(source, tmp_path / "out.wav", "alloy", "tts-1", "wav")
+    tts = TTSModel(api_key="sk-test")
+    tts.client = OfflineSpeechClient(0.0)
+    tts.budget = BudgetGuard(parse_budget(budget), jobs)
+    worker = WorkerController(jobs, FileModel(), tts, worker_id="test:1")
+
+    def drain():
+        while (work := jobs.claim_work(worker.worker_id)) is not None:
+            worker.process(work)
+    return jobs, job_id, drain, tts
+
+
+def job_status(jobs, job_id):
+    return jobs._connection().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()["status"]
+
+
+def test_soft_paused_job_runs_to_the_end_once_resumed(tmp_path):
+    jobs, job_id, drain, tts = run_queue(tmp_path, "job=1M/5k")
+    drain()
+    assert job_status(jobs, job_id) == "paused"
+    done_before = jobs.status_counts()["chunks"].get("done", 0)
+    assert 0 < done_before < jobs.status_counts()["chunks"].get("pending", 0) + done_before
+
+    assert jobs.resume_jobs() == 1
+    drain()
+    assert job_status(jobs, job_id) == "done"
+    assert (tmp_path / "out.wav").exists()
+    tts.scheduler.shutdown()
+
+
+def test_hard_limit_cancels_the_job(tmp_path):
+    jobs, job_id, drain, tts = run_queue(tmp_path, "job=5k/4k")
+    drain()
+    assert job_status(jobs, job_id) == "failed"
+    assert "job budget" in jobs.failed_jobs()[0]["error"]
+    assert not (tmp_path / "out.wav").exists()
+    tts.scheduler.shutdown()
@@ -0,0 +1,213 @@
+import codecs
+import zipfile
+
+from utils.document_readers import (
+    iter_epub, iter_epub_chapters, iter_html, iter_markdown, iter_odt, iter_rtf, sniff_encoding,
+)
+
+
+def write(tmp_path, name, content):
+    path = tmp_path / name
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content, encoding="utf-8")
+    return path
+
+
+def write_zip(tmp_path, name, members):
+    path = tmp_path / name
+    with zipfile.ZipFile(path, "w") as archive:
+        for member, content in members.items():
+            archive.writestr(member, content)
+    return path
+
+
+# ---- RTF ----
+
+def test_rtf_destinations_are_skipped(tmp_path):
+    path = write(tmp_path, "doc.rtf", (
+        r"{\rtf1\ansi\deff0{\fonttbl{\f0\froman Times;}}{\colortbl;\red0\green0\blue0;}" "\n"
+        r"{\*\generator Writer 1.0;}{\info{\title Not read}{\author Nobody}}" "\n"
+        r"\pard First paragraph.\par" "\n"
+        r"{\field{\*\fldinst HYPERLINK \"http://example.com\"}{\fldrslt Link text}} stays.\par" "\n"
+        r"{\*\unknowndestination hidden}Escaped \{braces\} and a\tab tab.\par" "\n"
+        r"}"
+    ))
+    assert list(iter_rtf(path)) == ["First paragraph.", "Link text stays.", "Escaped {braces} and a tab."]
+
+
+def test_rtf_escapes(tmp_path):
+    path = write(tmp_path, "doc.rtf", (
+        r"{\rtf1\ansi\ansicpg1252 Caf\'e9 au lait.\par" "\n"
+        r"\uc1 Smart \u8220\'93quotes\u8221\'94 and \u-4064?.\par" "\n"
+        r"{\uc2 Two \u20320??fallbacks}, then one \u233?again.\par" "\n"
+        r"}"
+    ))
+    assert list(iter_rtf(path)) == [
+        "Café au lait.",
+        "Smart \u201cquotes\u201d and \uf020.",
+        "Two 你fallbacks, then one éagain.",
+    ]
+
+
+def test_rtf_hex_escapes_use_the_code_page(tmp_path):
+    path = write(tmp_path, "doc.rtf", r"{\rtf1\ansi\ansicpg1251 \'c4\'e0 \'ed\'e5\'f2}")
+    assert list(iter_rtf(path)) == ["Да нет"]
+
+
+# ---- Markdown ----
+
+def test_markdown_fences_and_headings(tmp_path):
+    path = write(tmp_path, "doc.md", "\n".join([
+        "Setext title",
+        "============",
+        "",
+        "Some *emphasis*, `code` and a [link](http://example.com) with ![an image](pic.png).",
+        "",
+        "```python",
+        "# not a heading",
+        "print('code is left out')",
+        "```",
+        "",
+        "~~~",
+        "tilde fences too",
+        "~~~",
+        "",
+        "Second title",
+        "------------",
+        "## ATX heading ##",
+        "- item one",
+        "- item two",
+        "",
+        "> quoted **bold**",
+        "",
+        "***",
+        "| a | b |",
+        "|---|---|",
+        "| 1 | 2 |",
+        "",
+        "[ref]: http://example.com",
+    ]))
+    assert list(iter_markdown(path)) == [
+        "Setext title",
+        "Some emphasis, code and a link with an image.",
+        "Second title",
+        "ATX heading",
+        "item one",
+        "item two",
+        "quoted bold",
+        "a b",
+        "1 2",
+    ]
+
+
+def test_markdown_unclosed_fence_hides_the_rest(tmp_path):
+    path = write(tmp_path, "doc.md", "Before.\n\n```\ncode\n\nmore code\n")
+    assert list(iter_markdown(path)) == ["Before."]
+
+
+# ---- ODT ----
+
+ODT_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+    xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">
+  <office:body><office:text>
+    <text:sequence-decls><text:sequence-decl text:name="Figure"/></text:sequence-decls>
+    <text:h text:outline-level="1">Chapter one</text:h>
+    <text:p>The main text<text:note text:note-class="footnote"><text:note-citation>1</text:note-citation>
+      <text:note-body><text:p>A footnote<text:note><text:note-body><text:p>nested</text:p></text:note-body>
+      </text:note> with its own note.</text:p></text:note-body></text:note> goes on.</text:p>
+    <text:p>Two<text:s text:c="3"/>words,<text:tab/>a tab<text:line-break/>and a <text:span>span</text:span>.</text:p>
+    <text:p/>
+    <text:list><text:list-item><text:p>A list item</text:p></text:list-item></text:list>
+  </office:text></office:body>
+</office:document-content>
+"""
+
+
+def test_odt_notes_are_left_out(tmp_path):
+    path = write_zip(tmp_path, "doc.odt", {"mimetype": "application/vnd.oasis.opendocument.text",
+                                           "content.xml": ODT_CONTENT})
+    assert list(iter_odt(path)) == [
+        "Chapter one",
+        "The main text goes on.",
+        "Two words, a tab and a span.",
+        "A list item",
+    ]
+
+
+# ---- HTML ----
+
+HTML = """<html><head><meta charset="{charset}"><title>Not read</title><style>p {{ color: red }}</style></head>
+<body><nav>Menu</nav><h1>Привет</h1><p>Мир, <b>текст</b><br>дальше.</p><script>var x = 1;</script>
+<p>Second<img src="a.png" alt="B"> paragraph &amp; more.</p></body></html>"""
+
+
+def test_html_charset_is_sniffed(tmp_path):
+    path = write(tmp_path, "doc.html", HTML.format(charset="windows-1251").encode("cp1251"))
+    assert list(iter_html(path)) == ["Привет", "Мир, текст дальше.", "SecondB paragraph & more."]
+
+
+def test_html_byte_order_mark_wins(tmp_path):
+    path = write(tmp_path, "doc.html", codecs.BOM_UTF16_LE + HTML.format(charset="utf-8").encode("utf-16-le"))
+    assert list(iter_html(path))[0] == "Привет"
+
+
+def test_sniff_encoding():
+    assert sniff_encoding(b'<meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-1">') == "iso8859-1"
+    assert sniff_encoding(b"<?xml version='1.0' encoding='utf-8'?><meta charset='koi8-r'>") == "koi8-r"
+    assert sniff_encoding(codecs.BOM_UTF8 + b"<html>") == "utf-8-sig"
+    assert sniff_encoding(b"<meta charset=nonsense>") == "utf-8"
+    assert sniff_encoding(b"<html>", default="cp1252") == "cp1252"
+
+
+# ---- EPUB ----
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+PACKAGE = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="c3" href="text/chapter%203.xhtml" media-type="application/xhtml+xml"/>
+    <item id="cover" href="cover.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c1" href="text/one.xhtml" media-type="application/xhtml+xml"/>
+    <item id="img" href="pic.png" media-type="image/png"/>
+    <item id="c2" href="two.xhtml" media-type="application/xhtml+xml"/>
+    <item id="gone" href="missing.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine>
+    <itemref idref="cover" linear="no"/>
+    <itemref idref="c1"/>
+    <itemref idref="img"/>
+    <itemref idref="gone"/>
+    <itemref idref="c2"/>
+    <itemref idref="c3"/>
+  </spine>
+</package>"""
+
+
+def chapter(title, text):
+    return f"<html><body><h1>{title}</h1><p>{text}</p></body></html>"
+
+
+def test_epub_follows_the_spine(tmp_path):
+    path = write_zip(tmp_path, "book.epub", {
+        "mimetype": "application/epub+zip",
+        "META-INF/container.xml": CONTAINER,
+        "OEBPS/content.opf": PACKAGE,
+        "OEBPS/cover.xhtml": chapter("Cover", "Not in the reading order."),
+        "OEBPS/text/chapter 3.xhtml": chapter("Three", "Third."),
+        "OEBPS/two.xhtml": "<html><body><p>Untitled second.</p></body></html>",
+        "OEBPS/text/one.xhtml": chapter("One", "First."),
+        "OEBPS/pic.png": b"\x89PNG",
+    })
+    assert list(iter_epub_chapters(path)) == [
+        ("One", ["One", "First."]),
+        (None, ["Untitled second."]),
+        ("Three", ["Three", "Third."]),
+    ]
+    assert list(iter_epub(path)) == ["One", "First.", "Untitled second.", "Three", "Third."]
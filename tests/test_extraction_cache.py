@@ -0,0 +1,53 @@
+import os
+import sqlite3
+
+from models.estimator import analyze_files
+from models.extraction_cache import ExtractionCache
+from utils.text_chunker import split_text
+
+PARAGRAPH = ("The committee met on Tuesday to review the budget. Several members raised concerns about the "
+             "timeline, and the chair agreed to circulate a revised schedule before the next meeting. ")
+
+
+def write_document(tmp_path, paragraphs=40):
+    path = tmp_path / "doc.txt"
+    path.write_text("\n\n".join(f"Section {i}. {PARAGRAPH * 3}" for i in range(paragraphs)), encoding="utf-8")
+    return path
+
+
+def test_chunks_are_counted_as_both_kinds_of_run_split_them(tmp_path):
+    path = write_document(tmp_path)
+    text = path.read_text(encoding="utf-8")
+    [result] = analyze_files([path], tmp_path / "cache", jobs=1)
+    assert result["chunks"] == len(split_text(text))
+    assert result["stable_chunks"] == len(split_text(text, stable=True))
+
+    [cached] = analyze_files([path], tmp_path / "cache", jobs=1)
+    assert cached["cached"]
+    assert cached["stable_chunks"] == result["stable_chunks"]
+
+
+def test_changed_file_is_analyzed_again(tmp_path):
+    path = write_document(tmp_path)
+    cache = ExtractionCache(tmp_path / "cache")
+    cache.put(path, path.read_text(encoding="utf-8"))
+    assert cache.summary(path) is not None
+
+    path.write_text("Short now.", encoding="utf-8")
+    os.utime(path, ns=(0, 0))
+    assert cache.summary(path) is None
+
+
+def test_outdated_cache_is_cleared(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    conn = sqlite3.connect(cache_dir / "extraction.db")
+    conn.execute("CREATE TABLE extractions (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, chars INTEGER, "
+                 "chunks INTEGER, text BLOB, extracted_at REAL)")
+    conn.commit()
+    conn.close()
+
+    path = write_document(tmp_path, paragraphs=2)
+    cache = ExtractionCache(cache_dir)
+    assert cache.put(path, path.read_text(encoding="utf-8"))["stable_chunks"] >= 1
+    assert cache.summary(path)["chars"] > 0
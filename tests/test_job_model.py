@@ -0,0 +1,174 @@
+"""SQLite job queue: claim order, leases, duplicates, retries, pausing and schema migration"""
+import sqlite3
+import subprocess
+import socket
+import sys
+import time
+
+import pytest
+
+from models import job_model
+from models.job_model import MAX_ATTEMPTS, SCHEMA, JobModel
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    model = JobModel(tmp_path / "jobs.db")
+    yield model
+    model.close()
+
+
+def prepare(jobs, chunks, worker="w:1"):
+    """Queue a job, claim it and add its chunks; returns the job id"""
+    job_id = jobs.add_job("in.txt", "out.mp3", "alloy", "tts-1")
+    work = jobs.claim_work(worker)
+    assert work["kind"] == "prepare" and work["job"]["id"] == job_id
+    assert jobs.add_chunks(job_id, chunks, worker)
+    return job_id
+
+
+def finish_chunk(jobs, work, worker="w:1"):
+    assert jobs.complete_chunk(work["chunk"], worker, f"part_{work['chunk']['seq']}.mp3", 10, time.time())
+
+
+def test_claim_prefers_stitching_then_chunks_then_preparing(jobs):
+    first = prepare(jobs, ["First chunk.", "Second chunk."])
+    second = jobs.add_job("other.txt", "other.mp3", "alloy", "tts-1")
+
+    for seq in range(2):
+        work = jobs.claim_work("w:1")
+        assert work["kind"] == "chunk" and work["chunk"]["job_id"] == first and work["chunk"]["seq"] == seq
+        finish_chunk(jobs, work)
+
+    work = jobs.claim_work("w:1")
+    assert work["kind"] == "stitch" and work["job"]["id"] == first
+    work = jobs.claim_work("w:1")
+    assert work["kind"] == "prepare" and work["job"]["id"] == second
+    assert jobs.claim_work("w:1") is None
+
+
+def test_expired_lease_is_requeued_and_late_result_discarded(tmp_path):
+    jobs = JobModel(tmp_path / "jobs.db", lease_seconds=0.05)
+    prepare(jobs, ["Only chunk."])
+    lost = jobs.claim_work("w:1")
+    time.sleep(0.1)
+
+    work = jobs.claim_work("w:2")
+    assert work["kind"] == "chunk" and work["chunk"]["id"] == lost["chunk"]["id"]
+    assert work["chunk"]["attempts"] == 2
+    assert not jobs.complete_chunk(lost["chunk"], "w:1", "late.mp3", 10, time.time())
+    assert jobs.complete_chunk(work["chunk"], "w:2", "part.mp3", 10, time.time())
+    jobs.close()
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    jobs = JobModel(tmp_path / "jobs.db", lease_seconds=0.2)
+    prepare(jobs, ["Only chunk."])
+    work = jobs.claim_work("w:1")
+    time.sleep(0.1)
+    assert jobs.heartbeat("w:1") == 1
+    time.sleep(0.15)
+    assert jobs.claim_work("w:2") is None
+    assert jobs.complete_chunk(work["chunk"], "w:1", "part.mp3", 10, time.time())
+    jobs.close()
+
+
+def test_recover_dead_workers_requeues_their_claims(jobs):
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    dead = f"{socket.gethostname()}:{process.pid}"
+    prepare(jobs, ["Only chunk."], worker=dead)
+    jobs.claim_work(dead)
+
+    assert jobs.claimants() == [dead]
+    assert jobs.recover_dead_workers() == 1
+    work = jobs.claim_work("other:1")
+    assert work["kind"] == "chunk"
+
+
+def test_duplicate_chunks_reuse_the_first_ones_audio(jobs):
+    job_id = prepare(jobs, ["Hello there.", "Something else.", "hello   THERE."])
+    rows = jobs._connection().execute(
+        "SELECT seq, status, duplicate_of FROM chunks WHERE job_id = ? ORDER BY seq", (job_id,)).fetchall()
+    assert [row["status"] for row in rows] == ["pending", "pending", "duplicate"]
+    job = jobs._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    assert job["chunk_count"] == 3 and job["chunks_remaining"] == 2
+
+    while (work := jobs.claim_work("w:1"))["kind"] == "chunk":
+        finish_chunk(jobs, work)
+    assert work["kind"] == "stitch"
+    assert jobs.get_chunk_outputs(job_id) == ["part_0.mp3", "part_1.mp3", "part_0.mp3"]
+
+
+def test_failed_chunk_is_retried_until_the_attempt_limit(jobs, monkeypatch):
+    monkeypatch.setattr(job_model, "RETRY_BACKOFF_SECONDS", 0.0)
+    job_id = prepare(jobs, ["Only chunk."])
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        work = jobs.claim_work("w:1")
+        assert work["kind"] == "chunk" and work["chunk"]["attempts"] == attempt
+        retried = jobs.fail_chunk(work["chunk"], "w:1", RuntimeError("boom"), time.time())
+        assert retried == (attempt < MAX_ATTEMPTS)
+
+    assert jobs.claim_work("w:1") is None
+    job = jobs._connection().execute("SELECT status, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    assert job["status"] == "failed" and "boom" in job["error"]
+    assert jobs.status_counts()["chunks"] == {"failed": 1}
+
+
+def test_retry_waits_for_its_backoff(jobs):
+    prepare(jobs, ["Only chunk."])
+    work = jobs.claim_work("w:1")
+    assert jobs.fail_chunk(work["chunk"], "w:1", "timeout", time.time())
+    assert jobs.claim_work("w:1") is None
+
+
+def test_paused_job_hands_out_no_chunks_until_resumed(jobs):
+    job_id = prepare(jobs, ["First chunk.", "Second chunk."])
+    running = jobs.claim_work("w:1")
+    assert jobs.pause_job(job_id)
+    assert jobs.claim_work("w:1") is None
+    assert not jobs.has_unfinished_jobs()
+    # A chunk that was already running still finishes
+    finish_chunk(jobs, running)
+
+    assert jobs.resume_jobs([job_id + 1]) == 0
+    assert jobs.resume_jobs([job_id]) == 1
+    work = jobs.claim_work("w:1")
+    assert work["kind"] == "chunk" and work["chunk"]["seq"] == 1
+    assert not jobs.pause_job(job_id + 1)
+
+
+def test_paused_job_with_every_chunk_done_is_still_stitched(jobs):
+    job_id = prepare(jobs, ["Only chunk."])
+    work = jobs.claim_work("w:1")
+    jobs.pause_job(job_id)
+    finish_chunk(jobs, work)
+    work = jobs.claim_work("w:1")
+    assert work["kind"] == "stitch" and work["job"]["id"] == job_id
+
+
+def test_old_database_is_migrated(tmp_path):
+    path = tmp_path / "old.db"
+    added = {column for _, column, _ in job_model.MIGRATIONS}
+    old_schema = "\n".join(line for line in SCHEMA.splitlines() if line.strip().split(" ")[0] not in added)
+    conn = sqlite3.connect(path)
+    conn.executescript(old_schema)
+    conn.execute("INSERT INTO jobs (source_path, output_path, voice, model, format, created_at) "
+                 "VALUES ('old.txt', 'old.mp3', 'alloy', 'tts-1', 'mp3', 0)")
+    conn.commit()
+    assert "formats" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    conn.close()
+
+    jobs = JobModel(path)
+    for table, column, _ in job_model.MIGRATIONS:
+        columns = {row["name"] for row in jobs._connection().execute(f"PRAGMA table_info({table})")}
+        assert column in columns
+    new_id = jobs.add_job("new.txt", "new.wav", "alloy", "tts-1", "wav", formats=["wav", "mp3"])
+    work = jobs.claim_work("w:1")
+    assert work["kind"] == "prepare" and work["job"]["source_path"] == "old.txt"
+    assert jobs.add_chunks(work["job"]["id"], ["Old job text.", "old JOB text."], "w:1")
+    row = jobs._connection().execute("SELECT formats FROM jobs WHERE id = ?", (new_id,)).fetchone()
+    assert row["formats"] == "wav,mp3"
+    jobs.close()
+    # Opening it again does not try to add the columns twice
+    JobModel(path).close()
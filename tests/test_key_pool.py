@@ -0,0 +1,157 @@
+import time
+
+import pytest
+
+from models import key_pool as key_pool_module
+from models.budget import BudgetPaused
+from models.key_pool import KeyPool, PooledKey, parse_api_keys
+from models.tts_model import TTSModel
+from offline_backend import OfflineSpeechClient
+from utils.audio_stitcher import AudioStitcher
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        super().__init__(f"HTTP {status_code}")
+
+
+class FailingClient(OfflineSpeechClient):
+    """Offline client whose requests fail with an HTTP status"""
+
+    def __init__(self, status_code):
+        super().__init__()
+        self.status_code = status_code
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        raise ApiError(self.status_code)
+
+
+def make_pool(count=2):
+    return KeyPool([PooledKey(f"sk-test-key{i}") for i in range(count)])
+
+
+def fail_request(pool, status_code):
+    with pytest.raises(ApiError):
+        with pool.acquire() as key:
+            raise ApiError(status_code)
+    return key
+
+
+def test_parse_api_keys():
+    assert parse_api_keys(" sk-a , sk-b:500,, sk-c: ") == [("sk-a", None), ("sk-b", 500.0), ("sk-c", None)]
+    assert parse_api_keys(None) == []
+
+
+def test_least_in_flight_key_is_chosen():
+    pool = make_pool(3)
+    with pool.acquire() as first, pool.acquire() as second, pool.acquire() as third:
+        assert len({first.label, second.label, third.label}) == 3
+        assert [key["in_flight"] for key in pool.status()] == [1, 1, 1]
+    with pool.acquire() as first:
+        # All idle: the key with the fewest requests so far goes next
+        with pool.acquire() as second:
+            assert second is not first
+    assert [key["in_flight"] for key in pool.status()] == [0, 0, 0]
+
+
+@pytest.mark.parametrize("status_code", [401, 403])
+def test_rejected_key_is_disabled(status_code):
+    pool = make_pool()
+    rejected = fail_request(pool, status_code)
+    assert rejected.disabled
+    for _ in range(3):
+        with pool.acquire() as key:
+            assert key is not rejected
+
+    fail_request(pool, status_code)
+    with pytest.raises(RuntimeError, match="All API keys are disabled"):
+        pool._checkout()
+
+
+def test_rate_limited_key_cools_down():
+    pool = make_pool()
+    limited = fail_request(pool, 429)
+    assert limited.cooldown_until - time.time() == pytest.approx(key_pool_module.RATE_LIMIT_COOLDOWN_SECONDS, abs=1)
+    with pool.acquire() as key:
+        assert key is not limited
+
+
+def test_repeated_rate_limits_lengthen_the_cooldown():
+    pool = make_pool(1)
+    limited = pool.keys[0]
+    for failures in (1, 2):
+        limited.cooldown_until = 0
+        fail_request(pool, 429)
+        assert limited.cooldown_until - time.time() == pytest.approx(
+            failures * key_pool_module.RATE_LIMIT_COOLDOWN_SECONDS, abs=1)
+
+    limited.consecutive_failures = 100
+    limited.cooldown_until = 0
+    fail_request(pool, 429)
+    assert limited.cooldown_until - time.time() == pytest.approx(key_pool_module.MAX_COOLDOWN_SECONDS, abs=1)
+
+
+def test_success_resets_the_failure_count():
+    pool = make_pool(1)
+    fail_request(pool, 500)
+    fail_request(pool, 500)
+    with pool.acquire():
+        pass
+    assert pool.keys[0].consecutive_failures == 0
+    assert pool.status()[0]["healthy"]
+
+
+def test_keys_resting_past_the_longest_cooldown_pause_the_work():
+    pool = make_pool()
+    for key in pool.keys:
+        pool.rest(key, key_pool_module.MAX_COOLDOWN_SECONDS + 60)
+    with pytest.raises(BudgetPaused):
+        pool._checkout()
+
+
+def test_short_cooldown_is_waited_out():
+    pool = make_pool(1)
+    pool.rest(pool.keys[0], 0.05)
+    with pool.acquire() as key:
+        assert key is pool.keys[0]
+
+
+@pytest.fixture
+def tts():
+    tts = TTSModel(api_key="sk-test")
+    yield tts
+    tts.scheduler.shutdown()
+
+
+def synthesize(tts, tmp_path):
+    with AudioStitcher(tmp_path / "out.wav", "wav") as stitcher:
+        return tts.synthesize_chunk("A short sentence to speak.", stitcher, "alloy", "tts-1", format="wav")
+
+
+def test_rate_limited_request_moves_to_another_key(tts, tmp_path):
+    limited, working = FailingClient(429), OfflineSpeechClient()
+    tts._key_pool = KeyPool([PooledKey("sk-test-aaaa", client=limited), PooledKey("sk-test-bbbb", client=working)])
+    stats = synthesize(tts, tmp_path)
+    assert stats["bytes"] > 0
+    assert limited.calls == 1
+    assert len(working.take_records()) == 1
+
+
+def test_request_fails_once_every_key_has_been_tried(tts, tmp_path):
+    clients = [FailingClient(429), FailingClient(429)]
+    tts._key_pool = KeyPool([PooledKey(f"sk-test-{i}", client=client) for i, client in enumerate(clients)])
+    with pytest.raises(ApiError):
+        synthesize(tts, tmp_path)
+    assert [client.calls for client in clients] == [1, 1]
+
+
+def test_other_errors_are_not_retried_on_another_key(tts, tmp_path):
+    failing, working = FailingClient(500), OfflineSpeechClient()
+    tts._key_pool = KeyPool([PooledKey("sk-test-aaaa", client=failing), PooledKey("sk-test-bbbb", client=working)])
+    with pytest.raises(ApiError):
+        synthesize(tts, tmp_path)
+    assert failing.calls == 1
+    assert working.take_records() == []
@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.loudness import DEFAULT_TARGET_DB, LOOKAHEAD_SECONDS, MAX_GAIN_DB, LoudnessNormalizer
+
+RATE = 24000
+
+
+def tone(seconds, level_db):
+    """Square wave whose RMS is level_db dBFS"""
+    amplitude = round(32768 * 10 ** (level_db / 20))
+    frames = round(seconds * RATE)
+    return np.where(np.arange(frames) % 2, amplitude, -amplitude).astype("<i2")
+
+
+def level_db(samples):
+    samples = samples.astype(np.float64)
+    return 10 * math.log10(np.mean(samples * samples) / 32768 ** 2)
+
+
+def normalize(samples, block_size=9600, normalizer=None):
+    normalizer = normalizer or LoudnessNormalizer()
+    normalizer.begin_segment()
+    audio = samples.tobytes()
+    out = b"".join(normalizer.process(audio[i:i + block_size]) for i in range(0, len(audio), block_size))
+    return np.frombuffer(out + normalizer.end_segment(), dtype="<i2")
+
+
+@pytest.mark.parametrize("level", [-30.0, -12.0])
+def test_chunks_are_brought_to_the_target_level(level):
+    out = normalize(tone(5.0, level))
+    assert out.size == round(5.0 * RATE)
+    assert level_db(out) == pytest.approx(DEFAULT_TARGET_DB, abs=0.1)
+
+
+def test_gain_is_limited():
+    out = normalize(tone(5.0, -40.0))
+    assert level_db(out) == pytest.approx(-40.0 + MAX_GAIN_DB, abs=0.1)
+
+
+def test_audio_below_the_gate_is_left_alone():
+    samples = tone(4.0, -60.0)
+    assert np.array_equal(normalize(samples), samples)
+
+
+def test_lookahead_is_held_back():
+    normalizer = LoudnessNormalizer()
+    normalizer.begin_segment()
+    start = tone(LOOKAHEAD_SECONDS - 0.5, -30.0).tobytes()
+    rest = tone(1.0, -30.0).tobytes()
+    assert normalizer.process(start) == b""
+    assert len(normalizer.process(rest)) == len(start) + len(rest)
+
+
+def test_gain_changes_are_ramped():
+    # The level rises after the lookahead, so the gain falls while blocks are released
+    samples = np.concatenate((tone(3.0, -30.0), tone(3.0, -20.0), tone(3.0, -10.0)))
+    out = normalize(samples)
+    gains = np.abs(out.astype(np.float64)) / np.abs(samples.astype(np.float64))
+    steps = np.abs(np.diff(gains))
+    # Apart from where the input itself jumps, no sample-to-sample gain step is audible
+    steps[[round(3.0 * RATE) - 1, round(6.0 * RATE) - 1]] = 0
+    assert steps.max() < 0.005
+    assert gains[-1] < gains[0]
+
+
+def test_peaks_are_clipped_not_wrapped():
+    # Quiet on average, with full-scale peaks: the gain pushes the peaks past full scale
+    samples = tone(4.0, -35.0)
+    samples[::1000] = 32000
+    samples[500::1000] = -32000
+    out = normalize(samples)
+    assert out[::1000].tolist() == [32767] * out[::1000].size
+    assert out[500::1000].tolist() == [-32768] * out[500::1000].size
+
+
+def test_incomplete_frame_at_the_end_is_passed_through():
+    normalizer = LoudnessNormalizer()
+    normalizer.begin_segment()
+    audio = tone(4.0, -30.0).tobytes() + b"\x01"
+    out = normalizer.process(audio[:5001]) + normalizer.process(audio[5001:]) + normalizer.end_segment()
+    assert len(out) == len(audio)
+    assert out[-1:] == b"\x01"
+
+
+def test_other_sample_widths_are_passed_through():
+    normalizer = LoudnessNormalizer()
+    normalizer.configure({"sample_rate": RATE, "channels": 1, "sample_width": 3})
+    assert normalizer.process(b"\x10" * 30) == b"\x10" * 30
+    assert normalizer.end_segment() == b""
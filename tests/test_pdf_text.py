@@ -0,0 +1,84 @@
+from utils.pdf_text import clean_pdf_pages, dehyphenate, strip_page_margins
+
+HEIGHT = 800
+
+
+def header(text):
+    return (72, 30, 500, 45, text)
+
+
+def footer(text):
+    return (280, 760, 320, 775, text)
+
+
+def body(text, top=200):
+    return (72, top, 500, top + 100, text)
+
+
+def page(*blocks):
+    return HEIGHT, list(blocks)
+
+
+def test_repeated_headers_and_page_numbers_are_stripped():
+    pages = [page(header(f"A Study of Speech — Chapter {n}"), body(f"Body text of page {n}."), footer(str(n)))
+             for n in range(1, 5)]
+    texts, stripped = strip_page_margins(pages)
+    assert texts == [f"Body text of page {n}.\n" for n in range(1, 5)]
+    # Each page loses its header and its page number
+    assert stripped == sum(len(f"A Study of Speech — Chapter {n}") + len(str(n)) for n in range(1, 5))
+
+
+def test_page_number_alone_is_stripped_without_repeats():
+    for number in ("Page 12", "- 7 -", "Page iv", "iv of 20", "3 / 20"):
+        texts, _ = strip_page_margins([page(body("Text."), footer(number))])
+        assert texts == ["Text.\n"], number
+
+
+def test_bare_words_at_the_edge_are_kept():
+    # "I" could be a roman page number and "mild" is made of numeral letters, but neither is one here
+    pages = [
+        page(body("The last line of a paragraph ends with"), footer("I")),
+        page(body("It was"), footer("mild")),
+        page(body("Nothing at the edge.")),
+    ]
+    texts, stripped = strip_page_margins(pages)
+    assert texts == ["The last line of a paragraph ends with\nI\n", "It was\nmild\n", "Nothing at the edge.\n"]
+    assert stripped == 0
+
+
+def test_bare_roman_numerals_are_stripped_where_page_numbers_recur():
+    pages = [page(body(f"Preface {n}."), footer(numeral)) for n, numeral in enumerate(["i", "ii", "I"], 1)]
+    pages += [page(body(f"Chapter {n}."), footer(str(n))) for n in range(1, 4)]
+    texts, _ = strip_page_margins(pages)
+    assert texts == [f"Preface {n}.\n" for n in range(1, 4)] + [f"Chapter {n}.\n" for n in range(1, 4)]
+
+
+def test_body_text_repeated_on_every_page_is_kept():
+    pages = [page(body("Continued on the next page.", top=700)) for _ in range(3)]
+    texts, stripped = strip_page_margins(pages)
+    assert texts == ["Continued on the next page.\n"] * 3
+    assert stripped == 0
+
+
+def test_pages_without_a_height_are_left_alone():
+    texts, stripped = strip_page_margins([(0, [footer("7")])])
+    assert texts == ["7\n"]
+    assert stripped == 0
+
+
+def test_dehyphenate():
+    assert dehyphenate("speech synthe-\nsis works") == "speech synthesis works"
+    assert dehyphenate("soft hy\u00ad\n  phen") == "soft hyphen"
+    assert dehyphenate("trailing spaces-  \n\tand tabs") == "trailing spacesand tabs"
+    # A capital or a digit after the break means the hyphen belongs there
+    assert dehyphenate("Franco-\nPrussian war") == "Franco-\nPrussian war"
+    assert dehyphenate("pages 10-\n20") == "pages 10-\n20"
+    assert dehyphenate("a dash -\nthen text") == "a dash -\nthen text"
+
+
+def test_clean_pdf_pages_joins_pages_and_words():
+    pages = [page(header("Running title"), body("The end of a hyphen-\nated"), footer("1")),
+             page(header("Running title"), body("word, and more."), footer("2"))]
+    text, stripped = clean_pdf_pages(pages)
+    assert text == "The end of a hyphenated\n\nword, and more.\n"
+    assert stripped == 2 * len("Running title") + 2
@@ -0,0 +1,51 @@
+"""The job profiler covers speech requests run on the scheduler's threads"""
+import pstats
+import threading
+
+from models.tts_model import TTSModel
+from utils.profiling import JobProfiler
+from offline_backend import OfflineSpeechClient
+
+TEXT = " ".join(["A sentence that is long enough to be spoken."] * 400)
+
+
+def make_model():
+    tts = TTSModel(api_key="sk-test")
+    tts.client = OfflineSpeechClient(0.0)
+    return tts
+
+
+def test_profiled_job_includes_scheduled_chunks(tmp_path):
+    tts = make_model()
+    profiler = JobProfiler(trace_memory=False).start()
+    with profiler.profile():
+        tts.generate_speech(TEXT, tmp_path / "out.wav", "alloy", "tts-1", format="wav")
+    prof_file, _ = profiler.finish(tmp_path / "report")
+
+    functions = {name for _, _, name in pstats.Stats(str(prof_file)).stats}
+    assert "synthesize_chunk" in functions
+    tts.scheduler.shutdown()
+
+
+def test_concurrent_profiled_jobs_complete(tmp_path):
+    # From Python 3.12 only one profiler can be active; a second job must still run
+    tts = make_model()
+    errors = []
+
+    def job(name):
+        profiler = JobProfiler(trace_memory=False).start()
+        try:
+            with profiler.profile():
+                tts.generate_speech(TEXT, tmp_path / f"{name}.wav", "alloy", "tts-1", format="wav")
+        except Exception as e:
+            errors.append(e)
+        profiler.finish(tmp_path / name)
+
+    threads = [threading.Thread(target=job, args=(f"job{i}",)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert (tmp_path / "job0.wav").exists() and (tmp_path / "job1.wav").exists()
+    tts.scheduler.shutdown()
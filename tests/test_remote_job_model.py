@@ -0,0 +1,55 @@
+import json
+import socket
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from models.job_model import JobModel
+from models.remote_job_model import RemoteJobModel, serve_job_store
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = serve_job_store(JobModel(tmp_path / "jobs.db"), 0, token="secret")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_remote_calls_reach_the_job_store(server):
+    remote = RemoteJobModel(url(server), token="secret")
+    job_id = remote.add_job("in.txt", "out.wav", "alloy", "tts-1", format="wav")
+    assert remote.claim_work("w:1")["job"]["id"] == job_id
+
+
+def test_wrong_token_is_refused(server):
+    with pytest.raises(RuntimeError, match=r"\(401\): Unauthorized"):
+        RemoteJobModel(url(server), token="wrong").status_counts()
+
+
+def test_errors_come_back_as_json(server):
+    request = Request(f"{url(server)}/call/heartbeat", data=b"not json", method="POST",
+                      headers={"Authorization": "Bearer secret"})
+    with pytest.raises(HTTPError) as error:
+        urlopen(request, timeout=5)
+    assert error.value.code == 500
+    assert "JSONDecodeError" in json.loads(error.value.read())["error"]
+
+
+def test_a_stalled_client_does_not_block_others(server):
+    # A client that sends headers but never its body holds its own thread only
+    stalled = socket.create_connection(server.server_address)
+    stalled.sendall(b"POST /call/status_counts HTTP/1.1\r\nAuthorization: Bearer secret\r\n"
+                    b"Content-Length: 100\r\n\r\n")
+    try:
+        assert RemoteJobModel(url(server), token="secret", timeout=5).status_counts() is not None
+    finally:
+        stalled.close()
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from utils.silence import DEFAULT_PAUSES, MARGIN_SECONDS, MAX_HELD_SECONDS, SilenceTrimmer, parse_pauses
+
+RATE = 24000
+MARGIN = round(MARGIN_SECONDS * RATE)
+
+
+def tone(seconds, amplitude=8000):
+    """Every sample at +/- amplitude, so every sample counts as speech"""
+    frames = round(seconds * RATE)
+    return np.where(np.arange(frames) % 2, amplitude, -amplitude).astype("<i2").tobytes()
+
+
+def silence(seconds):
+    return bytes(round(seconds * RATE) * 2)
+
+
+def frames(data):
+    return len(data) // 2
+
+
+def trim(audio, block_size=None, boundary=None, trimmer=None):
+    trimmer = trimmer or SilenceTrimmer()
+    trimmer.begin_segment()
+    trimmer.boundary = boundary
+    block_size = block_size or len(audio)
+    out = b"".join(trimmer.process(audio[i:i + block_size]) for i in range(0, len(audio), block_size))
+    return out + trimmer.end_segment()
+
+
+def test_edges_are_trimmed_to_the_margin():
+    out = trim(silence(1.0) + tone(0.5) + silence(1.0))
+    assert frames(out) == MARGIN + round(0.5 * RATE) + MARGIN
+
+
+@pytest.mark.parametrize("block_size", [999, 4096, 48000])
+def test_trimming_does_not_depend_on_block_boundaries(block_size):
+    audio = silence(1.0) + tone(0.5) + silence(0.3) + tone(0.2) + silence(1.0)
+    assert trim(audio, block_size, "sentence") == trim(audio, boundary="sentence")
+
+
+def test_silence_between_speech_is_kept():
+    out = trim(tone(0.2) + silence(0.5) + tone(0.2))
+    assert frames(out) == round(0.9 * RATE)
+
+
+def test_held_silence_is_bounded():
+    trimmer = SilenceTrimmer()
+    trimmer.begin_segment()
+    written = trimmer.process(tone(0.1))
+    for _ in range(15):
+        written += trimmer.process(silence(1.0))
+        assert len(trimmer._held) <= round(MAX_HELD_SECONDS * RATE) * 2
+    # Silence older than MAX_HELD_SECONDS was written before the chunk ended
+    assert frames(written) == round((0.1 + 15 - MAX_HELD_SECONDS) * RATE)
+    written += trimmer.process(tone(0.1))
+    assert frames(written) == round(15.2 * RATE)
+
+
+@pytest.mark.parametrize("boundary", [None, "sentence", "paragraph", "chapter"])
+def test_pause_after_a_chunk(boundary):
+    out = trim(tone(0.2) + silence(1.0), boundary=boundary)
+    pause = DEFAULT_PAUSES[boundary] if boundary else 0.0
+    # Trailing margin plus digital silence make up the pause, with the next chunk's leading margin
+    gap = MARGIN + max(0, round((pause - 2 * MARGIN_SECONDS) * RATE))
+    assert frames(out) == round(0.2 * RATE) + gap
+    assert not any(out[-gap * 2:])
+
+
+def test_silent_chunk_only_writes_the_pause():
+    out = trim(silence(2.0), boundary="paragraph")
+    assert frames(out) == round((DEFAULT_PAUSES["paragraph"] - 2 * MARGIN_SECONDS) * RATE)
+
+
+def test_incomplete_frames_are_carried_over_and_dropped_at_the_end():
+    trimmer = SilenceTrimmer()
+    trimmer.begin_segment()
+    audio = tone(0.2)
+    # Split mid-sample: the odd byte waits for the rest of its sample
+    out = trimmer.process(audio[:1001]) + trimmer.process(audio[1001:] + b"\x01")
+    out += trimmer.end_segment()
+    assert out == audio
+
+
+def test_stereo_frames_are_kept_whole():
+    trimmer = SilenceTrimmer()
+    trimmer.configure({"sample_rate": RATE, "channels": 2, "sample_width": 2})
+    stereo = np.repeat(np.frombuffer(silence(0.5) + tone(0.2) + silence(0.5), dtype="<i2"), 2).tobytes()
+    out = trim(stereo, block_size=1003, trimmer=trimmer)
+    assert len(out) % 4 == 0
+    assert len(out) // 4 == MARGIN + round(0.2 * RATE) + MARGIN
+
+
+def test_other_sample_widths_are_passed_through():
+    trimmer = SilenceTrimmer()
+    trimmer.configure({"sample_rate": RATE, "channels": 1, "sample_width": 3})
+    assert trimmer.process(b"\x00" * 30) == b"\x00" * 30
+    assert trimmer.end_segment() == b""
+
+
+def test_parse_pauses():
+    assert parse_pauses("sentence=0.2, chapter=3") == dict(DEFAULT_PAUSES, sentence=0.2, chapter=3.0)
+    for spec in ("word=1", "sentence", "sentence=long", "paragraph=-1"):
+        with pytest.raises(ValueError):
+            parse_pauses(spec)
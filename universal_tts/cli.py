@@ -0,0 +1,688 @@
+#!/usr/bin/env python3
+"""Command-line batch synthesis using the application models.
+
+Examples:
+    python cli.py input/ --output output --voice coral
+    python cli.py report.pdf --format wav --profile
+    python cli.py lecture.docx --subtitles vtt
+    python cli.py book.epub --hls
+    python cli.py book.epub --format wav --normalize-loudness
+    python cli.py book.epub --format wav --trim-silence "paragraph=1.2,chapter=3"
+    python cli.py book.epub --formats mp3,wav,opus
+
+Batch queue (jobs survive restarts; any number of workers can share the database):
+    python cli.py enqueue input/ --db tts_jobs.db --voice coral
+    python cli.py worker --db tts_jobs.db --threads 4
+    python cli.py status --db tts_jobs.db
+
+One audio file per chapter plus an index (only new or edited chapters are synthesized again):
+    python cli.py book.epub --chapters --chapter-threads 4
+    python cli.py book.epub --audiobook
+
+Remove cached audio that no document uses any more (see --incremental):
+    python cli.py prune-cache --min-age 48
+
+Estimate cost and duration without calling the API:
+    python cli.py estimate input/ --threads 8 --requests-per-minute 500
+
+Watch folders and synthesize documents as they arrive:
+    python cli.py watch input/ --db tts_jobs.db --threads 4
+
+Spend limits per job, per day and per API key (soft limits pause, hard limits cancel):
+    python cli.py worker --db tts_jobs.db --budget "job=500k,day=$20/$15"
+    python cli.py resume --db tts_jobs.db
+
+Workers on other machines reach the queue through a job store server:
+    python cli.py serve --db tts_jobs.db --host 0.0.0.0 --port 8765
+    python cli.py worker --db http://queue-host:8765 --follow
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+
+from controllers.chapter_controller import ChapterController
+from controllers.worker_controller import WorkerController
+from models import estimator
+from models.budget import BudgetExceeded, BudgetGuard, BudgetPaused, format_amount, parse_budget
+from models.file_model import FileModel
+from models.job_model import LEASE_SECONDS, JobModel
+from models.remote_job_model import RemoteJobModel, serve_job_store
+from models.scheduler import SpeechScheduler
+from models.segment_cache import DEFAULT_PRUNE_AGE_SECONDS, SegmentCache
+from models.settings_model import SettingsModel
+from models.tts_model import TTSModel
+from utils.audio_stitcher import PCM_FORMATS
+from utils.folder_watcher import FolderWatcher
+from utils.helpers import format_time_delta, truncate_text
+from utils.hls import DEFAULT_SEGMENT_SECONDS, HlsWriter
+from utils.logging_config import setup_logging
+from utils.loudness import DEFAULT_TARGET_DB
+from utils.profiling import JobProfiler
+from utils.silence import DEFAULT_PAUSES, parse_pauses
+from utils.subtitles import SUBTITLE_FORMATS, TIMED_FORMATS, SubtitleWriter
+from utils.transcoder import synthesis_format
+
+DEFAULT_INSTRUCTIONS = "Speak clearly, with a warm and narrative tone."
+FORMATS = ["mp3", "opus", "aac", "flac", "wav", "pcm"]
+MODELS = ["gpt-4o-mini-tts", "tts-1", "tts-1-hd"]
+COMMANDS = ["run", "enqueue", "worker", "status", "serve", "watch", "estimate", "resume", "prune-cache"]
+DEFAULT_DB = "tts_jobs.db"
+DEFAULT_QUEUE_PORT = 8765
+
+
+def collect_input_files(paths, file_model):
+    """Expand files and directories into the list of supported input files"""
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir()
+                                if p.is_file() and p.suffix.lower() in file_model.supported_extensions))
+        elif path.is_file():
+            files.append(path)
+        else:
+            logging.warning(f"Input not found: {path}")
+    return files
+
+
+def parse_formats(spec):
+    """Parse a comma-separated list of output formats"""
+    formats = [part.strip().lower() for part in spec.split(",") if part.strip()]
+    unknown = [format for format in formats if format not in FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"expected formats from {', '.join(FORMATS)}, got '{spec}'")
+    return list(dict.fromkeys(formats))
+
+
+def read_instructions(args):
+    """Return voice instructions from --instructions or --instructions-file"""
+    if args.instructions_file:
+        return Path(args.instructions_file).read_text(encoding="utf-8").strip()
+    return args.instructions
+
+
+def process_file(file_path, args, instructions, file_model, tts_model, segment_cache=None):
+    """Synthesize one input file; returns the output path (of the first format with --formats)"""
+    start_time = time.time()
+    text = file_model.read_for_synthesis(file_path)
+    if isinstance(text, str) and len(text.strip()) < 10:
+        raise ValueError("File is empty or too short")
+
+    output_dir = file_model.ensure_output_directory(args.output)
+    formats = args.formats or [args.format]
+    output_file = output_dir / file_model.generate_output_filename(
+        input_filename=file_path, voice=args.voice, format=formats[0]
+    )
+    output_files = {format: output_file.with_suffix(f".{format}") for format in formats}
+    subtitles = None
+    if args.subtitles:
+        subtitles = SubtitleWriter(output_file.with_suffix(f".{args.subtitles}"), args.subtitles)
+    taps = []
+    if args.hls:
+        hls = HlsWriter(output_file.with_name(f"{output_file.stem}_hls"), args.hls_segment_seconds)
+        logging.info(f"HLS playlist: {hls.playlist_path}")
+        taps.append(hls)
+    stats = {}
+    try:
+        tts_model.generate_formats(text, output_files, args.voice, args.model, instructions, args.speed, stats,
+                                   segment_cache=segment_cache, document_id=file_path.resolve(), subtitles=subtitles,
+                                   taps=taps, loudness=args.normalize_loudness, pauses=args.trim_silence)
+    finally:
+        if subtitles is not None:
+            subtitles.close()
+    # A failed render leaves the playlist open: it is not marked as complete
+    for tap in taps:
+        tap.close()
+    logging.info(f"{file_path.name}: {stats['characters']} characters in {format_time_delta(time.time() - start_time)}")
+    return output_file
+
+
+def process_chapters(file_path, args, instructions, file_model, tts_model, segment_cache=None):
+    """Synthesize one input file chapter by chapter; returns the chapter folder"""
+    start_time = time.time()
+    controller = ChapterController(file_model, tts_model, threads=args.chapter_threads, segment_cache=segment_cache,
+                                   subtitles=args.subtitles, loudness=args.normalize_loudness,
+                                   pauses=args.trim_silence)
+    index = controller.render(file_path, args.output, args.voice, args.model, instructions, args.format, args.speed,
+                              audiobook=args.audiobook)
+    book_dir = controller.book_dir(file_path, args.output, args.voice)
+    failed = [entry for entry in index["chapters"] if entry["status"] != "done"]
+    logging.info(f"{file_path.name}: {len(index['chapters'])} chapter(s) in "
+                 f"{format_time_delta(time.time() - start_time)}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(index['chapters'])} chapter(s) failed "
+                           f"(run again to retry them): {', '.join(str(e['number']) for e in failed)}")
+    if index.get("audiobook"):
+        return book_dir.parent / index["audiobook"]
+    return book_dir
+
+
+def open_job_store(db):
+    """Open a local queue database, or a served one when db is an http(s) URL"""
+    if db.startswith(("http://", "https://")):
+        return RemoteJobModel(db, token=os.environ.get("TTS_QUEUE_TOKEN"))
+    return JobModel(db)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert documents to speech with the OpenAI TTS API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    synthesis = argparse.ArgumentParser(add_help=False)
+    synthesis.add_argument("inputs", nargs="+",
+                           help="input files or directories (.txt, .docx, .pdf, .epub, .html, .md, .odt, .rtf)")
+    synthesis.add_argument("--output", default="output", help="output directory (default: output)")
+    synthesis.add_argument("--voice", default="alloy", help="voice name (default: alloy)")
+    synthesis.add_argument("--model", default="gpt-4o-mini-tts", choices=MODELS, help="TTS model")
+    synthesis.add_argument("--format", default="mp3", choices=FORMATS, help="output audio format")
+    synthesis.add_argument("--formats", type=parse_formats, metavar="FORMATS",
+                           help="write several formats from one synthesis instead of --format, e.g. 'mp3,wav'; "
+                                "compressed formats are encoded with ffmpeg from wav or pcm")
+    synthesis.add_argument("--speed", type=float, default=1.0, help="speech speed, tts-1 models only (0.25-4.0)")
+    synthesis.add_argument("--instructions", default=DEFAULT_INSTRUCTIONS, help="voice instructions")
+    synthesis.add_argument("--instructions-file", help="read voice instructions from a file")
+
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument("--db", default=DEFAULT_DB,
+                          help=f"job queue database or job store URL (default: {DEFAULT_DB})")
+
+    budget = argparse.ArgumentParser(add_help=False)
+    budget.add_argument("--budget", default=os.getenv("TTS_BUDGET"),
+                        help='spend limits as scope=hard[/soft] for job, day or key, in characters ("500k") or '
+                             'USD ("$20"), e.g. "job=500k,day=$20/$15"; soft defaults to 80%% of hard '
+                             "(default: TTS_BUDGET)")
+
+    run = subparsers.add_parser("run", parents=[synthesis, budget], help="synthesize files now (default command)")
+    run.add_argument("--profile", action="store_true",
+                     help="profile the job with cProfile and tracemalloc; results are written next to the output")
+    run.add_argument("--profile-top", type=int, default=25, help="functions and allocation sites in the profile summary")
+    run.add_argument("--incremental", action="store_true",
+                     help="reuse the audio of unchanged paragraphs from earlier runs (see --cache-dir)")
+    run.add_argument("--cache-dir", help="segment cache directory (default: TTS_CACHE_DIR or .tts_cache)")
+    run.add_argument("--chapters", action="store_true",
+                     help="write one file per chapter (EPUB spine, PDF outline, DOCX headings) plus an index; "
+                          "unchanged chapters are not synthesized again")
+    run.add_argument("--chapter-threads", type=int, default=4,
+                     help="chapters synthesized concurrently with --chapters (default: 4)")
+    run.add_argument("--audiobook", action="store_true",
+                     help="like --chapters, then join the chapters into one mp3 with chapter markers")
+    run.add_argument("--subtitles", choices=SUBTITLE_FORMATS,
+                     help="also write captions timed from the chunk durations (mp3, wav and pcm output)")
+    run.add_argument("--hls", action="store_true",
+                     help="also write HLS segments and a playlist as the audio arrives, for playback during "
+                          "long renders (mp3 output)")
+    run.add_argument("--hls-segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS,
+                     help=f"audio per HLS segment (default: {DEFAULT_SEGMENT_SECONDS:g})")
+    run.add_argument("--normalize-loudness", type=float, nargs="?", const=DEFAULT_TARGET_DB, metavar="DBFS",
+                     help=f"bring every chunk to the same speech level (wav and pcm output; "
+                          f"default target: {DEFAULT_TARGET_DB:g} dBFS)")
+    run.add_argument("--trim-silence", type=parse_pauses, nargs="?", const="", metavar="PAUSES",
+                     help="trim the silence around every chunk and insert set pauses instead (wav and pcm output); "
+                          "PAUSES overrides the defaults in seconds, e.g. 'sentence=0.3,paragraph=1' (default: "
+                          + ",".join(f"{kind}={seconds:g}" for kind, seconds in DEFAULT_PAUSES.items()) + ")")
+
+    subparsers.add_parser("enqueue", parents=[synthesis, database], help="add files to the persistent job queue")
+
+    worker_options = argparse.ArgumentParser(add_help=False)
+    worker_options.add_argument("--threads", type=int, default=2, help="concurrent chunk requests (default: 2)")
+    worker_options.add_argument("--poll-interval", type=float, default=2.0, help="seconds between polls when idle")
+    worker_options.add_argument("--requests-per-minute", type=float,
+                                help="limit speech requests started per minute "
+                                     "(default: TTS_REQUESTS_PER_MINUTE or none)")
+    worker_options.add_argument("--cache-dir",
+                                help="segment cache shared by all workers; chunks repeated across documents "
+                                     "are then synthesized once")
+
+    worker = subparsers.add_parser("worker", parents=[database, worker_options, budget], help="process queued jobs")
+    worker.add_argument("--follow", action="store_true", help="keep polling for new jobs instead of exiting when idle")
+
+    watch = subparsers.add_parser("watch", parents=[synthesis, database, worker_options, budget],
+                                  help="watch folders and synthesize new or changed documents")
+    watch.add_argument("--interval", type=float, default=5.0, help="seconds between folder scans (default: 5)")
+    watch.add_argument("--settle", type=float, default=10.0,
+                       help="seconds a file must stay unchanged before it is queued (default: 10)")
+    watch.add_argument("--recursive", action="store_true", help="also watch subfolders")
+    watch.add_argument("--state", default="tts_watch_state.json",
+                       help="file remembering processed documents across restarts (default: tts_watch_state.json)")
+    watch.add_argument("--no-worker", action="store_true", help="only queue documents; leave synthesis to workers")
+
+    resume = subparsers.add_parser("resume", parents=[database], help="return paused jobs to the queue")
+    resume.add_argument("jobs", nargs="*", type=int, help="job ids to resume (default: all paused jobs)")
+
+    status = subparsers.add_parser("status", parents=[database], help="show queue status and throughput")
+    status.add_argument("--hours", type=float, default=24, help="throughput window in hours (default: 24)")
+    status.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    estimate = subparsers.add_parser("estimate", help="dry run: report characters, requests, cost and duration")
+    estimate.add_argument("inputs", nargs="+",
+                          help="input files or directories (.txt, .docx, .pdf, .epub, .html, .md, .odt, .rtf)")
+    estimate.add_argument("--model", choices=MODELS, help="model to estimate the duration for (default: all)")
+    estimate.add_argument("--speed", type=float, default=1.0, help="speech speed (default: 1.0)")
+    estimate.add_argument("--threads", type=int, default=2, help="concurrent requests (default: 2)")
+    estimate.add_argument("--requests-per-minute", type=float, default=None,
+                          help="rate limit (default: TTS_REQUESTS_PER_MINUTE or none)")
+    estimate.add_argument("--ttfb", type=float, default=estimator.DEFAULT_TTFB_SECONDS,
+                          help=f"seconds to first audio byte per request (default: {estimator.DEFAULT_TTFB_SECONDS:g})")
+    estimate.add_argument("--realtime-factor", type=float, default=estimator.DEFAULT_REALTIME_FACTOR,
+                          help="seconds of audio received per second of streaming "
+                               f"(default: {estimator.DEFAULT_REALTIME_FACTOR:g})")
+    estimate.add_argument("--incremental", action="store_true",
+                          help="count requests as queue workers and run --incremental split the text, at "
+                               "content-defined boundaries")
+    estimate.add_argument("--jobs", type=int, help="extraction processes (default: number of CPUs)")
+    estimate.add_argument("--cache-dir", help="extraction cache directory (default: TTS_CACHE_DIR or .tts_cache)")
+    estimate.add_argument("--files", action="store_true", help="list every file, not only the totals")
+    estimate.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    prune = subparsers.add_parser("prune-cache",
+                                  help="remove cached segments no document manifest lists and not used recently")
+    prune.add_argument("--cache-dir", help="segment cache directory (default: TTS_CACHE_DIR or .tts_cache)")
+    prune.add_argument("--min-age", type=float, default=DEFAULT_PRUNE_AGE_SECONDS / 3600,
+                       help="hours since an unlisted segment was last written or used before it is removed "
+                            f"(default: {DEFAULT_PRUNE_AGE_SECONDS / 3600:g})")
+
+    serve = subparsers.add_parser("serve", parents=[database], help="serve the job queue to workers on other hosts")
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=DEFAULT_QUEUE_PORT,
+                       help=f"port to listen on (default: {DEFAULT_QUEUE_PORT})")
+    return parser
+
+
+def load_tts_model():
+    """Return a TTSModel with the stored API key, or None if there is no key"""
+    settings_model = SettingsModel()
+    tts_model = TTSModel(settings_model.load(), settings_model.extra_api_keys)
+    if not tts_model.api_key:
+        print("No API key found. Set OPENAI_API_KEY or configure a key in the GUI.")
+        return None
+    return tts_model
+
+
+def apply_budget(args, tts_model, ledger=None):
+    """Install a BudgetGuard for --budget on tts_model; returns an exit code or None"""
+    try:
+        limits = parse_budget(args.budget)
+    except ValueError as e:
+        print(f"Invalid --budget: {e}")
+        return 2
+    if limits:
+        tts_model.budget = BudgetGuard(limits, ledger)
+        logging.info(f"Budget limits: {', '.join(map(repr, limits))}")
+    return None
+
+
+def check_synthesis_args(args, tts_model):
+    """Validate speed and voice options; returns an exit code or None"""
+    if args.formats:
+        # The format requested from the API; options that depend on the format check this one
+        args.format = synthesis_format(args.formats)
+    if not 0.25 <= args.speed <= 4.0:
+        print(f"Speed {args.speed} is out of range (0.25-4.0)")
+        return 2
+    if not tts_model.is_voice_compatible(args.voice, args.model):
+        print(f"Voice '{args.voice}' is not compatible with model '{args.model}'")
+        return 2
+    return None
+
+
+def run_command(args):
+    """Synthesize the input files in this process"""
+    file_model = FileModel()
+    tts_model = load_tts_model()
+    if tts_model is None:
+        return 1
+    error = check_synthesis_args(args, tts_model) or apply_budget(args, tts_model)
+    if error:
+        return error
+    if args.audiobook and args.format != "mp3":
+        print("--audiobook writes mp3; use --format mp3")
+        return 2
+    if args.subtitles and args.format not in TIMED_FORMATS:
+        print(f"--subtitles needs {', '.join(TIMED_FORMATS)} output")
+        return 2
+    if args.hls and (args.format != "mp3" or args.chapters or args.audiobook):
+        print("--hls writes mp3 segments of a single output; use --format mp3 without --chapters")
+        return 2
+    if args.normalize_loudness is not None and args.format not in PCM_FORMATS:
+        print("--normalize-loudness needs wav or pcm output")
+        return 2
+    if args.trim_silence is not None and args.format not in PCM_FORMATS:
+        print("--trim-silence needs wav or pcm output")
+        return 2
+    numpy_options = [option for option, value in (("--normalize-loudness", args.normalize_loudness),
+                                                  ("--trim-silence", args.trim_silence)) if value is not None]
+    if numpy_options:
+        try:
+            import numpy  # imported by the processors once synthesis starts
+        except ImportError:
+            print(f"{' and '.join(numpy_options)} need{'s' if len(numpy_options) == 1 else ''} NumPy. "
+                  "Install it with: pip install numpy")
+            return 2
+    if args.formats and len(args.formats) > 1 and (args.chapters or args.audiobook):
+        print("--formats writes several formats of a single output; use --format with --chapters")
+        return 2
+    if args.hls_segment_seconds <= 0:
+        print("--hls-segment-seconds must be positive")
+        return 2
+
+    files = collect_input_files(args.inputs, file_model)
+    if not files:
+        print("No input files found")
+        return 1
+    instructions = read_instructions(args)
+
+    segment_cache = SegmentCache(args.cache_dir) if args.incremental else None
+    profiler = JobProfiler(top_n=args.profile_top).start() if args.profile else None
+    process = process_chapters if args.chapters or args.audiobook else process_file
+    outputs = []
+    failures = 0
+    batch_start = time.time()
+
+    for i, file_path in enumerate(files, 1):
+        print(f"[{i}/{len(files)}] {file_path.name}")
+        try:
+            with profiler.profile() if profiler else nullcontext():
+                output_file = process(file_path, args, instructions, file_model, tts_model, segment_cache)
+            outputs.append(output_file)
+            print(f"  saved {output_file}")
+        except BudgetPaused as e:
+            print(f"  {e}; {len(files) - i + 1} file(s) not started")
+            failures += len(files) - i + 1
+            break
+        except BudgetExceeded as e:
+            failures += 1
+            print(f"  cancelled: {e}")
+        except Exception as e:
+            failures += 1
+            logging.error(f"Error processing {file_path}: {e}", exc_info=True)
+            print(f"  error: {e}")
+
+    if profiler:
+        # A single job's profile sits next to its audio; a batch gets one profile in the output folder
+        if len(files) == 1 and outputs:
+            output_base = outputs[0].with_suffix("")
+        else:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_base = Path(args.output) / f"batch_{timestamp}"
+        _, summary_file = profiler.finish(output_base)
+        print(f"Profile summary: {summary_file}")
+
+    print(f"Processed {len(files)} file(s) in {format_time_delta(time.time() - batch_start)}, {failures} failed")
+    return 1 if failures else 0
+
+
+def enqueue_command(args):
+    """Add the input files to the job queue"""
+    file_model = FileModel()
+    error = check_synthesis_args(args, TTSModel())
+    if error:
+        return error
+
+    files = collect_input_files(args.inputs, file_model)
+    if not files:
+        print("No input files found")
+        return 1
+    instructions = read_instructions(args)
+
+    enqueue_files(open_job_store(args.db), files, args, instructions, file_model)
+    print(f"Queued {len(files)} job(s) in {args.db}")
+    return 0
+
+
+def enqueue_files(job_model, files, args, instructions, file_model):
+    """Add one job per file with the synthesis options in args"""
+    output_dir = file_model.ensure_output_directory(args.output).absolute()
+    for file_path in files:
+        output_file = output_dir / file_model.generate_output_filename(
+            input_filename=file_path, voice=args.voice, format=args.format
+        )
+        job_id = job_model.add_job(file_path.absolute(), output_file, args.voice, args.model, args.format,
+                                   args.speed, instructions, formats=args.formats)
+        targets = [output_file.with_suffix(f".{format}") for format in args.formats or [args.format]]
+        print(f"Job {job_id}: {file_path} -> {', '.join(str(target) for target in targets)}")
+
+
+def make_worker(args, job_model, tts_model):
+    """Return a WorkerController using the --threads and rate limit options"""
+    tts_model.scheduler = SpeechScheduler(max_workers=max(1, args.threads), interactive_workers=0,
+                                          requests_per_minute=args.requests_per_minute)
+    segment_cache = SegmentCache(args.cache_dir) if args.cache_dir else None
+    return WorkerController(job_model, FileModel(), tts_model, poll_interval=args.poll_interval,
+                            segment_cache=segment_cache)
+
+
+def worker_command(args):
+    """Process queued jobs until the queue is empty (or forever with --follow)"""
+    tts_model = load_tts_model()
+    if tts_model is None:
+        return 1
+    job_model = open_job_store(args.db)
+    # Budget totals live in the job store so every worker counts against the same limits
+    error = apply_budget(args, tts_model, job_model)
+    if error:
+        return error
+    worker = make_worker(args, job_model, tts_model)
+    start_time = time.time()
+    worker.run(threads=max(1, args.threads), follow=args.follow)
+
+    counts = job_model.status_counts()["jobs"]
+    print(f"Worker finished in {format_time_delta(time.time() - start_time)}: "
+          f"{counts.get('done', 0)} done, {counts.get('failed', 0)} failed, {counts.get('paused', 0)} paused in queue")
+    return 0
+
+
+def resume_command(args):
+    """Return paused jobs to the queue"""
+    resumed = open_job_store(args.db).resume_jobs(args.jobs)
+    print(f"Resumed {resumed} job(s)")
+    return 0
+
+
+def status_command(args):
+    """Print job counts, recent throughput and failed jobs"""
+    remote = args.db.startswith(("http://", "https://"))
+    if not remote and not Path(args.db).exists():
+        print(f"No job database at {args.db}")
+        return 1
+    job_model = open_job_store(args.db)
+    now = time.time()
+    report = {
+        "counts": job_model.status_counts(),
+        "workers": job_model.active_workers(now - 3 * LEASE_SECONDS),
+        "throughput": job_model.throughput(now - args.hours * 3600),
+        "failed": job_model.failed_jobs(),
+        "budget": job_model.budget_totals(f"day:{datetime.date.today().isoformat()}:"),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    for kind in ("jobs", "chunks"):
+        counts = report["counts"][kind]
+        print(f"{kind.capitalize()}: " + (", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "none"))
+
+    print(f"Active workers: {len(report['workers'])}")
+    for worker in report["workers"]:
+        print(f"  {worker['id']}: {worker['running']} chunk(s) running, {worker['threads']} thread(s), "
+              f"last seen {now - worker['last_seen']:.0f}s ago")
+
+    for scope, amount in report["budget"].items():
+        print(f"Spent today: {format_amount(amount, scope.rpartition(':')[2])}")
+
+    print(f"\nThroughput, last {args.hours:g} hours:")
+    print(f"  {'hour':<17}{'chunks':>8}{'errors':>8}{'chars':>10}{'MB':>8}{'avg s':>8}{'ttfb s':>8}")
+    for row in report["throughput"]:
+        hour = datetime.datetime.fromtimestamp(row["bucket"]).strftime("%Y-%m-%d %H:00")
+        print(f"  {hour:<17}{row['chunks']:>8}{row['errors']:>8}{row['chars']:>10}"
+              f"{row['bytes'] / (1024 * 1024):>8.1f}{row['avg_seconds']:>8.2f}{row['avg_ttfb'] or 0:>8.2f}")
+
+    if report["failed"]:
+        print("\nFailed jobs:")
+        for job in report["failed"]:
+            print(f"  {job['id']}: {job['source_path']}: {job['error']}")
+    return 0
+
+
+def watch_command(args):
+    """Queue new and changed documents from the watched folders until interrupted"""
+    file_model = FileModel()
+    tts_model = None
+    if not args.no_worker:
+        tts_model = load_tts_model()
+        if tts_model is None:
+            return 1
+    error = check_synthesis_args(args, tts_model or TTSModel())
+    if error:
+        return error
+    instructions = read_instructions(args)
+
+    job_model = open_job_store(args.db)
+    if tts_model:
+        error = apply_budget(args, tts_model, job_model)
+        if error:
+            return error
+    watcher = FolderWatcher(args.inputs, file_model.supported_extensions, settle_seconds=args.settle,
+                            recursive=args.recursive, state_file=args.state)
+    worker = worker_thread = None
+    if not args.no_worker:
+        # Synthesis runs alongside the scan loop, so outputs are written as soon as each job completes
+        worker = make_worker(args, job_model, tts_model)
+        worker_thread = threading.Thread(target=worker.run, kwargs={"threads": max(1, args.threads), "follow": True},
+                                         name="tts-watch-worker", daemon=True)
+        worker_thread.start()
+
+    print(f"Watching {', '.join(args.inputs)} every {args.interval:g}s (Ctrl+C to stop)")
+    try:
+        while True:
+            files = watcher.scan()
+            if files:
+                enqueue_files(job_model, files, args, instructions, file_model)
+                watcher.save_state()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("Stopping, waiting for running requests to finish")
+    finally:
+        if worker:
+            worker.stop()
+            worker_thread.join()
+    return 0
+
+
+def estimate_command(args):
+    """Report characters, chunks, requests, cost and duration without calling the API"""
+    file_model = FileModel()
+    files = collect_input_files(args.inputs, file_model)
+    if not files:
+        print("No input files found")
+        return 1
+
+    start_time = time.perf_counter()
+    results = estimator.analyze_files(files, args.cache_dir, args.jobs)
+    models = [args.model] if args.model else MODELS
+    rpm = args.requests_per_minute or float(os.getenv("TTS_REQUESTS_PER_MINUTE") or 0) or None
+    for result in results:
+        result["requests"] = result["stable_chunks"] if args.incremental else result["chunks"]
+        result["cost"] = {model: estimator.estimate_cost(model, result["chars"], args.speed) for model in models}
+
+    chars = sum(r["chars"] for r in results)
+    requests = sum(r["requests"] for r in results)
+    totals = {
+        "files": len(results),
+        "failed": sum(1 for r in results if r.get("error")),
+        "cached": sum(1 for r in results if r["cached"]),
+        "chars": chars,
+        "requests": requests,
+        "audio_hours": estimator.audio_minutes(chars, args.speed) / 60,
+        "cost": {model: estimator.estimate_cost(model, chars, args.speed) for model in models},
+        "wall_seconds": estimator.estimate_wall_seconds(requests, chars, args.threads, rpm, args.speed, args.ttfb,
+                                                        args.realtime_factor),
+        "threads": args.threads,
+        "requests_per_minute": rpm,
+        "analysis_seconds": time.perf_counter() - start_time,
+    }
+    if args.json:
+        print(json.dumps({"files": results, "totals": totals}, indent=2))
+        return 0
+
+    cost_header = "".join(f"{model:>17}" for model in models)
+    if args.files:
+        print(f"{'file':<40}{'chars':>11}{'requests':>10}{cost_header}")
+        for r in results:
+            name = truncate_text(Path(r["path"]).name, 36)
+            if r.get("error"):
+                print(f"{name:<40}  error: {r['error']}")
+                continue
+            costs = "".join(f"{'$' + format(r['cost'][model], ',.2f'):>17}" for model in models)
+            print(f"{name:<40}{r['chars']:>11,}{r['requests']:>10,}{costs}")
+        print()
+
+    print(f"Files:      {totals['files']:,} ({totals['cached']:,} from cache, {totals['failed']:,} unreadable)")
+    print(f"Characters: {chars:,}")
+    print(f"Requests:   {requests:,}")
+    print(f"Audio:      {totals['audio_hours']:,.1f} hours at speed {args.speed:g}")
+    for model in models:
+        print(f"Cost {model + ':':<17} ${totals['cost'][model]:,.2f}")
+    limit = f", {rpm:g} requests/minute" if rpm else ""
+    print(f"Duration:   {format_time_delta(totals['wall_seconds'])} with {args.threads} thread(s){limit}")
+    print(f"(analyzed in {totals['analysis_seconds']:.2f}s; prices in models/estimator.py)")
+    return 0
+
+
+def prune_cache_command(args):
+    """Remove unused segments from the segment cache"""
+    try:
+        removed, freed = SegmentCache(args.cache_dir).prune(args.min_age * 3600)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"Removed {removed} segment file(s), {freed / (1024 * 1024):.1f} MB")
+    return 0
+
+
+def serve_command(args):
+    """Serve the queue database over HTTP until interrupted"""
+    token = os.environ.get("TTS_QUEUE_TOKEN")
+    if args.host not in ("127.0.0.1", "localhost") and not token:
+        logging.warning("Serving the job queue on the network without TTS_QUEUE_TOKEN set")
+    server = serve_job_store(JobModel(args.db), args.port, args.host, token)
+    print(f"Serving {args.db} at http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Plain "cli.py <inputs>" keeps working as the run command
+    if argv and argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv.insert(0, "run")
+    args = build_parser().parse_args(argv)
+    setup_logging()
+
+    commands = {
+        "run": run_command,
+        "enqueue": enqueue_command,
+        "worker": worker_command,
+        "status": status_command,
+        "resume": resume_command,
+        "serve": serve_command,
+        "watch": watch_command,
+        "estimate": estimate_command,
+        "prune-cache": prune_cache_command,
+    }
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,13 +5,22 @@ from tkinter import filedialog, messagebox
 from pathlib import Path
 import datetime
 import threading
+from contextlib import nullcontext
 
 from models.tts_model import TTSModel
+from models.budget import BudgetGuard
 from models.file_model import FileModel
 from models.settings_model import SettingsModel
+from models.segment_cache import SegmentCache
 from views.main_view import MainView
 from controllers.settings_controller import SettingsController
 from utils.logging_config import setup_logging
+from utils.text_normalizer import normalize_text
+from utils.metrics import start_metrics_server
+from utils.profiling import JobProfiler
+
+# How often an action started during the background settings load checks whether it has finished
+SETTINGS_POLL_MS = 100
 
 class AppController:
     """Main application controller that coordinates models and views"""
@@ -23,24 +32,85 @@ class AppController:
         # Setup logging first
         self.setup_logging()
         
-        # Initialize models
+        # Initialize models (no I/O yet; see load_settings_async)
         self.settings_model = SettingsModel()
         self.file_model = FileModel()
-        self.tts_model = TTSModel(self.settings_model.api_key)
+        self.tts_model = TTSModel()
+        self.segment_cache = SegmentCache()
+        self.settings_ready = threading.Event()
+        self._waiting_for_settings = []
         
         # Initialize main view
         self.main_view = MainView(root, self)
         
-        # Log startup information
+        # Expose metrics over HTTP if requested
+        self.start_metrics_endpoint()
+        
+        # Look up the API key and build API clients once the window is shown
+        self.root.after_idle(self.load_settings_async)
+        
         logging.info("Application started successfully")
-        logging.info(f"API key available: {bool(self.settings_model.api_key)}")
+    
+    def load_settings_async(self):
+        """Load the API key and create API clients in a background thread"""
+        def load_settings():
+            try:
+                api_key = self.settings_model.load()
+                self.tts_model.extra_api_keys = self.settings_model.extra_api_keys
+                self.tts_model.set_api_key(api_key)
+                logging.info(f"API key available: {bool(api_key)}")
+                self.tts_model.prepare_clients()
+                # Spend limits from TTS_BUDGET, counted in this process
+                self.tts_model.budget = BudgetGuard.from_env()
+            except Exception as e:
+                logging.error(f"Error loading settings: {e}", exc_info=True)
+            finally:
+                self.settings_ready.set()
+        
+        threading.Thread(target=load_settings, daemon=True).start()
+    
+    def when_settings_ready(self, callback):
+        """Call callback on the main thread once the background settings load has finished.
+
+        Polls with root.after instead of waiting, so the window keeps
+        responding meanwhile. The load always ends by setting settings_ready,
+        also when it fails.
+        """
+        if self.settings_ready.is_set():
+            callback()
+            return
+        if callback in self._waiting_for_settings:
+            return  # pressed again while waiting
+        logging.info("Waiting for settings to finish loading")
+        self._waiting_for_settings.append(callback)
+
+        def poll():
+            if not self.settings_ready.is_set():
+                self.root.after(SETTINGS_POLL_MS, poll)
+                return
+            self._waiting_for_settings.remove(callback)
+            callback()
+        self.root.after(SETTINGS_POLL_MS, poll)
     
     def setup_logging(self):
         """Setup application logging"""
         setup_logging()
     
+    def start_metrics_endpoint(self):
+        """Start the metrics endpoint if TTS_METRICS_PORT is set"""
+        port = os.getenv("TTS_METRICS_PORT")
+        if not port:
+            return
+        try:
+            start_metrics_server(int(port))
+        except (ValueError, OSError) as e:
+            logging.warning(f"Could not start metrics endpoint on port {port}: {e}")
+    
     def show_settings_dialog(self):
         """Show the settings dialog"""
+        self.when_settings_ready(self._show_settings_dialog)
+
+    def _show_settings_dialog(self):
         settings_controller = SettingsController(
             self.root,
             self.settings_model,
@@ -54,6 +124,11 @@ class AppController:
             ("Text files", "*.txt"),
             ("Word documents", "*.docx"),
             ("PDF files", "*.pdf"),
+            ("E-books", "*.epub"),
+            ("Web pages", "*.html *.htm *.xhtml"),
+            ("Markdown files", "*.md *.markdown"),
+            ("OpenDocument text", "*.odt"),
+            ("Rich text", "*.rtf"),
             ("All files", "*.*")
         ]
         file_path = filedialog.askopenfilename(filetypes=filetypes)
@@ -121,7 +196,7 @@ class AppController:
         """Get the input text based on the selected tab"""
         current_tab = self.main_view.get_current_tab()
         if current_tab == 0:  # Text input tab
-            text = self.main_view.text_input_view.get_text()
+            text = normalize_text(self.main_view.text_input_view.get_text())
             if not text:
                 return None
             return text
@@ -141,6 +216,9 @@ class AppController:
 
     def preview_audio(self):
             """Preview audio directly without saving to file"""
+            if not self.settings_ready.is_set():
+                self.when_settings_ready(self.preview_audio)
+                return
             logging.info("Starting audio preview")
             if not self.tts_model.async_client:
                 logging.warning("No async API client available, requesting API key")
@@ -194,6 +272,9 @@ class AppController:
     
     def generate_speech(self):
         """Generate speech and save to file"""
+        if not self.settings_ready.is_set():
+            self.when_settings_ready(self.generate_speech)
+            return
         logging.info("Starting speech generation process")
         if not self.tts_model.client:
             logging.warning("No API client available, requesting API key")
@@ -212,19 +293,28 @@ class AppController:
             messagebox.showerror("Compatibility Error", error_msg)
             return
         
+        # Profile extraction and synthesis if requested
+        profiler = JobProfiler().start() if self.main_view.profile_var.get() else None
+        
         # Get input text
-        text = self.get_input_text()
+        with profiler.profile() if profiler else nullcontext():
+            text = self.get_input_text()
         if not text:
             logging.warning("No valid input text for speech generation")
             messagebox.showerror("Error", "Please enter valid text or select a file with content")
+            if profiler:
+                profiler.cancel()
             return
         
-        # Get the format for the output file
+        # Get the format for the output file, and any further formats written from the same synthesis
         format = self.main_view.format_var.get()
+        formats = [format] + [extra for extra, selected in self.main_view.extra_format_vars.items()
+                              if selected.get() and extra != format]
         
         # Generate output filename
         current_tab = self.main_view.get_current_tab()
         if current_tab == 0:  # Text input
+            document_id = "text input"
             output_filename = self.file_model.generate_output_filename(
                 voice=voice, 
                 format=format
@@ -232,6 +322,7 @@ class AppController:
             logging.info(f"Using direct text input, length: {len(text)} characters")
         else:  # File input
             file_path = self.main_view.file_input_view.get_selected_file()
+            document_id = Path(file_path).resolve()
             output_filename = self.file_model.generate_output_filename(
                 input_filename=file_path,
                 voice=voice, 
@@ -243,7 +334,8 @@ class AppController:
         output_dir = Path(self.main_view.output_path_var.get())
         output_dir.mkdir(exist_ok=True)
         output_file = output_dir / output_filename
-        logging.info(f"Output will be saved to: {output_file}")
+        output_files = {extra: output_file.with_suffix(f".{extra}") for extra in formats}
+        logging.info(f"Output will be saved to: {', '.join(str(path) for path in output_files.values())}")
         
         # Since we're using a timestamp, file should always be unique
         # But we'll keep the check just in case
@@ -251,12 +343,15 @@ class AppController:
             logging.info(f"Output file already exists: {output_file}")
             if not messagebox.askyesno("File Exists", f"File {output_filename} already exists. Overwrite?"):
                 logging.info("User chose not to overwrite existing file")
+                if profiler:
+                    profiler.cancel()
                 return
             logging.info("User chose to overwrite existing file")
         
         # Get remaining options
         speed = float(self.main_view.speed_var.get())
         instructions = self.main_view.instructions_text.get(1.0, tk.END).strip()
+        segment_cache = self.segment_cache if self.main_view.incremental_var.get() else None
         
         # Start processing in a separate thread
         self.main_view.start_progress("Generating speech...")
@@ -264,29 +359,39 @@ class AppController:
         
         thread = threading.Thread(
             target=self._generate_speech_thread, 
-            args=(text, output_file, voice, model, instructions, format, speed)
+            args=(text, output_files, voice, model, instructions, speed, profiler, segment_cache, document_id)
         )
         thread.daemon = True
         thread.start()
     
-    def _generate_speech_thread(self, text, output_file, voice, model, instructions, format, speed):
+    def _generate_speech_thread(self, text, output_files, voice, model, instructions, speed, profiler=None,
+                                segment_cache=None, document_id=None):
         """Run the speech generation in a separate thread"""
+        # The first format is the one selected; the success dialog shows that file
+        output_file = next(iter(output_files.values()))
         try:
-            output_file = self.tts_model.generate_speech(
-                text, 
-                output_file, 
-                voice, 
-                model, 
-                instructions, 
-                format, 
-                speed
-            )
+            with profiler.profile() if profiler else nullcontext():
+                self.tts_model.generate_formats(
+                    text, 
+                    output_files, 
+                    voice, 
+                    model, 
+                    instructions, 
+                    speed,
+                    segment_cache=segment_cache,
+                    document_id=document_id
+                )
+            if profiler:
+                # Write the profile next to the audio file
+                profiler.finish(Path(output_file).with_suffix(""))
             
             # Update UI on the main thread
             self.root.after(0, self._processing_complete, True, output_file)
         except Exception as e:
             error_msg = f"Error generating speech: {str(e)}"
             logging.error(error_msg, exc_info=True)
+            if profiler:
+                profiler.finish(Path(output_file).with_suffix(""))
             # Update UI on the main thread
             self.root.after(0, self._processing_complete, False, error_msg)
     
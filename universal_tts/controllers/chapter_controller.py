@@ -0,0 +1,259 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from models.budget import BudgetPaused
+from utils.audiobook import package_mp3
+from utils.fingerprint import fingerprint
+from utils.mp3_frames import mp3_duration
+from utils.profiling import profiled
+from utils.subtitles import SubtitleWriter
+from utils.metrics import registry
+
+INDEX_NAME = "index.json"
+PLAYLIST_NAME = "playlist.m3u"
+
+# Longest chapter title kept in a file name
+MAX_TITLE_CHARS = 60
+
+UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+chapters_total = registry.counter(
+    "tts_chapters_total", "Chapters processed in chapter mode, by result (rendered, unchanged, failed)")
+chapter_seconds = registry.histogram(
+    "tts_chapter_seconds", "Time spent synthesizing one chapter")
+
+
+def chapter_filename(number, title, format, width=2):
+    """Return the file name of a chapter, e.g. "03 The Storm.mp3" """
+    name = " ".join(UNSAFE_FILENAME.sub(" ", title or "").split())[:MAX_TITLE_CHARS].rstrip(" .")
+    return f"{number:0{width}d} {name or 'Chapter ' + str(number)}.{format}"
+
+
+def load_index(book_dir):
+    """Return the index of a chapter folder, or None if there is none"""
+    try:
+        with open(Path(book_dir) / INDEX_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ChapterController:
+    """Controller that synthesizes a document chapter by chapter.
+
+    Chapters (see FileModel.read_chapters) are synthesized concurrently,
+    each to its own audio file in a folder named after the document, next
+    to an index.json describing them and an M3U playlist. A chapter whose
+    text and voice options are unchanged since the index was written, and
+    whose file is still there, is not synthesized again; a failed chapter
+    does not stop the others, so running the document again only renders
+    what is missing or edited.
+
+    With subtitles, each chapter also gets a caption file timed from its
+    chunk durations. With audiobook, the finished MP3 chapters are also joined into a single
+    file with ID3 chapter markers, placed at offsets computed from the
+    chapter durations counted while they were synthesized.
+    """
+
+    def __init__(self, file_model, tts_model, threads=2, segment_cache=None, subtitles=None, loudness=None,
+                 pauses=None):
+        self.file_model = file_model
+        self.tts_model = tts_model
+        self.threads = max(1, threads)
+        self.segment_cache = segment_cache
+        # Caption format ("srt" or "vtt") written next to each chapter, or None
+        self.subtitles = subtitles
+        # Target speech level in dBFS for loudness normalization (pcm and wav), or None
+        self.loudness = loudness
+        # Pauses by boundary kind when trimming silence (pcm and wav), or None; chapters end with the chapter pause
+        self.pauses = pauses
+
+    def book_dir(self, file_path, output_dir, voice):
+        """Return the folder a document's chapters are written to"""
+        voice = voice.replace(" *", "")
+        return Path(output_dir) / f"{Path(file_path).stem}_{voice}"
+
+    def render(self, file_path, output_dir, voice, model, instructions=None, format="mp3", speed=1.0,
+               audiobook=False):
+        """Synthesize the chapters of a document; returns the index written to its folder"""
+        if audiobook and format != "mp3":
+            raise ValueError("Audiobooks with chapter markers are written as mp3")
+        file_path = Path(file_path)
+        chapters = self.file_model.read_chapters(file_path)
+        if not chapters:
+            raise ValueError("File is empty")
+        book_dir = self.book_dir(file_path, output_dir, voice)
+        book_dir.mkdir(parents=True, exist_ok=True)
+
+        options = {"voice": voice, "model": model, "format": format, "speed": speed,
+                   "instructions": instructions}
+        if self.loudness is not None:
+            options["loudness"] = self.loudness
+        if self.pauses is not None:
+            options["pauses"] = self.pauses
+        previous = load_index(book_dir)
+        unchanged = {}
+        if previous and previous.get("options") == options:
+            unchanged = {entry["fingerprint"]: entry for entry in previous["chapters"]
+                         if entry.get("status") == "done" and (book_dir / entry["file"]).exists()
+                         and self._has_captions(book_dir, entry)}
+
+        width = max(2, len(str(len(chapters))))
+        entries = []
+        pending = []
+        moves = []
+        for number, (title, text) in enumerate(chapters, 1):
+            entry = {
+                "number": number,
+                "title": title,
+                "file": chapter_filename(number, title, format, width),
+                "chars": len(text),
+                "fingerprint": fingerprint(text),
+            }
+            if self.subtitles:
+                entry["captions"] = Path(entry["file"]).with_suffix(f".{self.subtitles}").name
+            old = unchanged.pop(entry["fingerprint"], None)
+            if old is not None:
+                # Chapters may have been added or removed before it: the audio is kept under its new number
+                moves.append((old["file"], entry["file"]))
+                if self.subtitles:
+                    moves.append((old["captions"], entry["captions"]))
+                entry.update(status="done", bytes=old.get("bytes"), duration=old.get("duration"),
+                             seconds=old.get("seconds"))
+                chapters_total.inc(result="unchanged")
+            else:
+                entry["status"] = "pending"
+                pending.append((entry, text))
+            entries.append(entry)
+        if previous:
+            previous_files = [name for entry in previous.get("chapters", [])
+                              for name in (entry["file"], entry.get("captions")) if name]
+            self._reuse_files(book_dir, moves, previous_files)
+        index = {
+            "source": str(file_path.absolute()),
+            "options": options,
+            "updated_at": time.time(),
+            "chapters": entries,
+        }
+        # Written before and after every chapter, so an interrupted run leaves a usable index
+        self._write_index(book_dir, index)
+
+        logging.info(f"{file_path.name}: {len(chapters)} chapter(s), {len(pending)} to synthesize "
+                     f"with {min(self.threads, len(pending) or 1)} thread(s)")
+        # One budget job for the whole document, so a job limit applies to the book
+        job_id = uuid.uuid4().hex[:12]
+        paused = None
+        # Chapter threads are profiled along with the job, if it is being profiled
+        render_chapter = profiled(self._render_chapter)
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="tts-chapter") as pool:
+            futures = {
+                pool.submit(render_chapter, text, book_dir / entry["file"], voice, model, instructions,
+                            format, speed, job_id): entry
+                for entry, text in pending
+            }
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                entry = futures[future]
+                try:
+                    entry.update(status="done", **future.result())
+                    chapters_total.inc(result="rendered")
+                    logging.info(f"Chapter {entry['number']} done: {entry['file']}")
+                except Exception as e:
+                    entry.update(status="failed", error=str(e))
+                    chapters_total.inc(result="failed")
+                    if isinstance(e, BudgetPaused):
+                        paused = e
+                        for other in futures:
+                            other.cancel()
+                    else:
+                        logging.error(f"Chapter {entry['number']} of {file_path.name} failed: {e}")
+                index["updated_at"] = time.time()
+                self._write_index(book_dir, index)
+
+        if paused is not None:
+            raise paused
+        if audiobook and all(entry["status"] == "done" for entry in entries):
+            index["audiobook"] = self.package(book_dir, index, file_path.stem).name
+            self._write_index(book_dir, index)
+        return index
+
+    def package(self, book_dir, index, title=None):
+        """Join the chapters listed in an index into one MP3 with chapter markers; returns its path"""
+        parts = []
+        for entry in index["chapters"]:
+            path = book_dir / entry["file"]
+            if entry.get("duration") is None:
+                # Chapters from before durations were recorded: walk the frame headers once
+                entry["duration"] = round(mp3_duration(path), 3)
+            parts.append((entry["title"] or f"Chapter {entry['number']}", path, entry["duration"]))
+        output_file = book_dir.with_name(f"{book_dir.name}.mp3")
+        part_file = output_file.with_name(output_file.name + ".part")
+        package_mp3(part_file, parts, title)
+        os.replace(part_file, output_file)
+        return output_file
+
+    def _has_captions(self, book_dir, entry):
+        if not self.subtitles:
+            return True
+        captions = entry.get("captions")
+        return bool(captions) and captions.endswith(f".{self.subtitles}") and (book_dir / captions).exists()
+
+    def _render_chapter(self, text, output_file, voice, model, instructions, format, speed, job_id):
+        start = time.perf_counter()
+        # A chapter interrupted mid-way never looks finished to the next run
+        part_file = output_file.with_name(output_file.name + ".part")
+        stats = {}
+        subtitles = None
+        if self.subtitles:
+            subtitles = SubtitleWriter(output_file.with_suffix(f".{self.subtitles}"), self.subtitles)
+        try:
+            self.tts_model.generate_speech(text, part_file, voice, model, instructions, format, speed,
+                                           segment_cache=self.segment_cache, job_id=job_id, stats=stats,
+                                           subtitles=subtitles, loudness=self.loudness,
+                                           pauses=self.pauses, boundary="chapter")
+        except BaseException:
+            part_file.unlink(missing_ok=True)
+            raise
+        finally:
+            if subtitles is not None:
+                subtitles.close()
+        os.replace(part_file, output_file)
+        seconds = time.perf_counter() - start
+        chapter_seconds.observe(seconds)
+        duration = stats.get("duration")
+        return {"bytes": stats["bytes"], "duration": round(duration, 3) if duration is not None else None,
+                "seconds": round(seconds, 1)}
+
+    def _reuse_files(self, book_dir, moves, previous_files):
+        """Rename the audio of unchanged chapters and delete that of edited or removed ones"""
+        # Reused files are set aside first, so one can take over the name of another
+        staged = []
+        for old, new in moves:
+            staged_file = book_dir / f"{old}.moving"
+            os.replace(book_dir / old, staged_file)
+            staged.append((staged_file, new))
+        for name in previous_files:
+            (book_dir / name).unlink(missing_ok=True)
+        for staged_file, new in staged:
+            os.replace(staged_file, book_dir / new)
+
+    def _write_index(self, book_dir, index):
+        tmp = book_dir / f"{INDEX_NAME}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, book_dir / INDEX_NAME)
+
+        lines = ["#EXTM3U"]
+        for entry in index["chapters"]:
+            if entry["status"] == "done":
+                duration = round(entry["duration"]) if entry.get("duration") is not None else -1
+                lines.append(f"#EXTINF:{duration},{entry['title'] or 'Chapter ' + str(entry['number'])}")
+                lines.append(entry["file"])
+        (book_dir / PLAYLIST_NAME).write_text("\n".join(lines) + "\n", encoding="utf-8")
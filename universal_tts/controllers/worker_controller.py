@@ -0,0 +1,245 @@
+import time
+import shutil
+import logging
+import threading
+from pathlib import Path
+
+from models.budget import BudgetExceeded, BudgetPaused
+from models.job_model import LEASE_SECONDS, make_worker_id
+from models.tts_model import stitch_seconds
+from utils.audio_stitcher import AudioStitcher, read_blocks
+from utils.metrics import registry
+from utils.text_chunker import split_text
+from utils.transcoder import Transcoder
+
+queue_wait_seconds = registry.histogram(
+    "tts_queue_wait_seconds", "Time a queued chunk waits before a worker claims it")
+retries_total = registry.counter(
+    "tts_retries_total", "Chunk requests that failed and were scheduled for another attempt")
+
+
+class WorkerController:
+    """Controller that processes work claimed from the persistent job queue.
+
+    Each worker thread repeatedly claims the next unit of work from the
+    JobModel: preparing a job (extract and chunk its text), synthesizing
+    one chunk to a part file, or stitching a finished job's parts into its
+    output file. A heartbeat thread renews the leases on claimed work, so
+    workers on several hosts can share one job store (a JobModel, or a
+    RemoteJobModel pointing at a served one).
+
+    With a budget guard on the TTS model, a job that crosses its soft limit
+    (or finds every API key over its budget) is paused, a request that would
+    cross a hard limit cancels its job, and no new work is claimed once the
+    daily soft limit has been reached.
+
+    A job with several formats is synthesized once, in wav or pcm, and the
+    other formats are written from the stitched audio as it is stitched.
+
+    Repeated chunks within a job are synthesized once. With a SegmentCache
+    (on storage all workers share), chunk audio is also reused across jobs,
+    so boilerplate repeated over a corpus is only paid for once.
+    """
+
+    def __init__(self, job_model, file_model, tts_model, worker_id=None, poll_interval=2.0,
+                 heartbeat_interval=LEASE_SECONDS / 3, segment_cache=None):
+        self.job_model = job_model
+        self.file_model = file_model
+        self.tts_model = tts_model
+        self.segment_cache = segment_cache
+        self.worker_id = worker_id or make_worker_id()
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+
+    def run(self, threads=1, follow=False):
+        """Process work until the queue is drained, or until stop() when follow is set"""
+        recovered = self.job_model.recover_dead_workers()
+        if recovered:
+            logging.info(f"Recovered {recovered} item(s) from exited workers")
+        logging.info(f"Worker {self.worker_id} starting with {threads} thread(s)")
+        self.job_model.heartbeat(self.worker_id, threads)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(threads,), name="tts-heartbeat",
+                                     daemon=True)
+        heartbeat.start()
+
+        workers = [
+            threading.Thread(target=self._work_loop, args=(follow,), name=f"tts-worker-{i}", daemon=True)
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            logging.info("Interrupted, finishing current work")
+            self.stop()
+            for worker in workers:
+                worker.join()
+            # Anything still claimed goes back to the queue for the next worker
+            self.job_model.requeue_worker(self.worker_id)
+        finally:
+            self._finished.set()
+            heartbeat.join()
+
+    def _heartbeat_loop(self, threads):
+        while not self._finished.wait(self.heartbeat_interval):
+            try:
+                self.job_model.heartbeat(self.worker_id, threads)
+            except Exception as e:
+                # Claims survive a missed beat or two; the lease is three intervals long
+                logging.warning(f"Heartbeat failed: {e}")
+
+    def stop(self):
+        """Ask all worker threads to stop after their current unit of work"""
+        self._stop.set()
+
+    def _budget_paused(self):
+        budget = self.tts_model.budget
+        return budget is not None and budget.day_paused()
+
+    def _work_loop(self, follow):
+        while not self._stop.is_set():
+            if self._budget_paused():
+                # Queued work stays where it is until the budget allows it again (e.g. tomorrow)
+                if not follow:
+                    logging.warning("Daily soft budget limit reached, leaving the remaining work queued")
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            try:
+                work = self.job_model.claim_work(self.worker_id)
+            except Exception as e:
+                logging.error(f"Error claiming work: {e}", exc_info=True)
+                self._stop.wait(self.poll_interval)
+                continue
+
+            if work is None:
+                if not follow and not self.job_model.has_unfinished_jobs():
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(work)
+
+    def process(self, work):
+        """Run one unit of work returned by JobModel.claim_work"""
+        handlers = {"prepare": self._prepare, "chunk": self._synthesize, "stitch": self._stitch}
+        handlers[work["kind"]](work)
+
+    def _parts_dir(self, job):
+        return Path(job["output_path"]).parent / ".parts" / f"job_{job['id']}"
+
+    def _prepare(self, work):
+        job = work["job"]
+        try:
+            text = self.file_model.read_for_synthesis(job["source_path"])
+            # Content-defined boundaries make repeated sections produce identical chunks across documents
+            chunks = split_text(text, stable=True) if text else []
+            if not chunks:
+                raise ValueError("File is empty")
+        except Exception as e:
+            logging.error(f"Job {job['id']}: cannot read {job['source_path']}: {e}")
+            self.job_model.fail_job(job["id"], e, self.worker_id)
+            return
+        if not self.job_model.add_chunks(job["id"], chunks, self.worker_id):
+            return
+        logging.info(f"Job {job['id']}: {len(chunks)} chunk(s) from {job['source_path']}")
+
+    def _synthesize(self, work):
+        chunk, job = work["chunk"], work["job"]
+        queue_wait_seconds.observe(max(0.0, chunk["claimed_at"] - chunk["created_at"]))
+
+        started_at = time.time()
+        try:
+            if self.segment_cache is not None:
+                part_file, stats = self._synthesize_cached(chunk, job)
+            else:
+                # The attempt number keeps a worker that lost its lease from overwriting the new holder's file
+                part_file = self._parts_dir(job) / f"chunk_{chunk['seq']:05d}_{chunk['attempts']}.{job['format']}"
+                part_file.parent.mkdir(parents=True, exist_ok=True)
+                stats = self._run_request(chunk, job, part_file)
+        except BudgetPaused as e:
+            # No key may send it now: keep the chunk and pause its job until it is resumed
+            self.job_model.release_chunk(chunk, self.worker_id)
+            self.job_model.pause_job(job["id"])
+            logging.warning(f"Job {job['id']}: {e}")
+            return
+        except BudgetExceeded as e:
+            # Retrying cannot help: cancel the job
+            self.job_model.fail_chunk(chunk, self.worker_id, e, started_at, max_attempts=0)
+            logging.error(f"Job {job['id']} cancelled: {e}")
+            return
+        except Exception as e:
+            retry = self.job_model.fail_chunk(chunk, self.worker_id, e, started_at)
+            if retry:
+                retries_total.inc()
+            logging.warning(f"Job {job['id']} chunk {chunk['seq']} attempt {chunk['attempts']} failed"
+                            f"{', will retry' if retry else ''}: {e}")
+            return
+        self.job_model.complete_chunk(chunk, self.worker_id, part_file, stats["bytes"], started_at, stats["ttfb"])
+        budget = self.tts_model.budget
+        if budget is not None and budget.job_paused(job["id"]):
+            self.job_model.pause_job(job["id"])
+            # Once resumed, the job runs on until its hard limit
+            budget.clear_job_pause(job["id"])
+
+    def _run_request(self, chunk, job, part_file):
+        return self.tts_model.scheduler.run(
+            "bulk", self.tts_model._synthesize_file, chunk["text"], part_file, job["voice"], job["model"],
+            job["instructions"], job["format"], job["speed"], job["id"]
+        )
+
+    def _synthesize_cached(self, chunk, job):
+        """Serve a chunk from the segment cache, synthesizing it into the cache on a miss"""
+        key = self.segment_cache.key(chunk["text"], job["voice"], job["model"], job["instructions"], job["format"],
+                                     job["speed"])
+        segment = self.segment_cache.get(key, job["format"])
+        if segment is not None:
+            logging.debug(f"Job {job['id']} chunk {chunk['seq']}: reusing cached audio {segment}")
+            return segment, {"bytes": segment.stat().st_size, "ttfb": None}
+        with self.segment_cache.writer(key, job["format"]) as part_file:
+            stats = self._run_request(chunk, job, part_file)
+        return self.segment_cache.path(key, job["format"]), stats
+
+    def _stitch(self, work):
+        job = work["job"]
+        output_file = Path(job["output_path"])
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        formats = job["formats"].split(",") if job.get("formats") else [job["format"]]
+        transcoder = None
+        outputs = []
+        try:
+            others = {format: output_file.with_suffix(f".{format}") for format in formats if format != job["format"]}
+            transcoder = Transcoder(others) if others else None
+            with AudioStitcher(output_file, job["format"], [transcoder] if transcoder else None) as stitcher:
+                for part_file in self.job_model.get_chunk_outputs(job["id"]):
+                    stitcher.add_segment(read_blocks(part_file))
+            if transcoder is not None:
+                outputs = [(str(path), format, path.stat().st_size) for format, path in transcoder.close().items()]
+        except Exception as e:
+            logging.error(f"Job {job['id']}: stitching failed: {e}", exc_info=True)
+            if transcoder is not None:
+                transcoder.abort()
+            self.job_model.fail_job(job["id"], e, self.worker_id)
+            return
+        stitch_seconds.observe(stitcher.stitch_seconds, format=job["format"])
+        kept = job["format"] in formats
+        if not kept:
+            # Synthesized only to write the other formats from
+            output_file.unlink(missing_ok=True)
+        if not self.job_model.complete_job(job["id"], output_file if kept else None, job["format"],
+                                           stitcher.bytes_written, self.worker_id, outputs=outputs):
+            return
+        parts_dir = self._parts_dir(job)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        try:
+            parts_dir.parent.rmdir()
+        except OSError:
+            pass  # other jobs still have parts in progress
+        if kept:
+            logging.info(f"Job {job['id']}: saved {output_file} ({stitcher.bytes_written} bytes)")
+        for path, format, size in outputs:
+            logging.info(f"Job {job['id']}: saved {path} ({size} bytes)")
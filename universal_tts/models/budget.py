@@ -0,0 +1,223 @@
+import os
+import re
+import logging
+import datetime
+import threading
+
+from models.estimator import estimate_cost
+from utils.metrics import registry
+
+SCOPES = ["job", "day", "key"]
+
+# Soft limit as a fraction of the hard limit when none is given
+DEFAULT_SOFT_RATIO = 0.8
+
+budget_rejections_total = registry.counter(
+    "tts_budget_rejections_total", "Speech requests refused by a hard budget limit, by scope")
+budget_soft_limits_total = registry.counter(
+    "tts_budget_soft_limits_total", "Requests that crossed a soft budget limit, by scope")
+budget_spent = registry.gauge(
+    "tts_budget_spent", "Budget used in the current period, by scope and unit")
+
+_AMOUNT = re.compile(r"^\s*(\$)?\s*([0-9]*\.?[0-9]+)\s*(k|m|usd)?\s*$", re.IGNORECASE)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a request would cross a hard budget limit"""
+
+    def __init__(self, scope, limit, unit, retry_after=None):
+        self.scope = scope
+        self.limit = limit
+        self.unit = unit
+        # For key limits: seconds until the key may be used again, so the request can move to another key
+        self.key_retry_after = retry_after if scope == "key" else None
+        super().__init__(f"Request would exceed the {scope} budget of {format_amount(limit, unit)}")
+
+
+class BudgetPaused(Exception):
+    """Raised when new work may not start because a soft budget limit was crossed"""
+
+
+def format_amount(amount, unit):
+    return f"${amount:,.2f}" if unit == "usd" else f"{amount:,.0f} characters"
+
+
+def _parse_amount(text):
+    """Parse "$50", "50usd", "2M" or "500000"; returns (amount, unit)"""
+    match = _AMOUNT.match(text)
+    if not match:
+        raise ValueError(f"Invalid budget amount '{text}'")
+    dollar, number, suffix = match.groups()
+    suffix = (suffix or "").lower()
+    if dollar or suffix == "usd":
+        return float(number), "usd"
+    return float(number) * {"k": 1_000, "m": 1_000_000}.get(suffix, 1), "chars"
+
+
+class BudgetLimit:
+    """A hard (and soft) limit on characters or USD for one scope: job, day or key"""
+
+    def __init__(self, scope, hard, soft=None, unit="chars"):
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown budget scope '{scope}', expected one of {', '.join(SCOPES)}")
+        self.scope = scope
+        self.hard = hard
+        self.soft = soft if soft is not None else hard * DEFAULT_SOFT_RATIO
+        self.unit = unit
+
+    def __repr__(self):
+        return (f"BudgetLimit({self.scope}: soft {format_amount(self.soft, self.unit)}, "
+                f"hard {format_amount(self.hard, self.unit)})")
+
+
+def parse_budget(spec):
+    """Parse limits like "job=2M,day=$50/$40,key=$20" (scope=hard[/soft]) into BudgetLimits"""
+    limits = []
+    for entry in (spec or "").split(","):
+        if not entry.strip():
+            continue
+        scope, _, amounts = entry.partition("=")
+        hard_text, _, soft_text = amounts.partition("/")
+        hard, unit = _parse_amount(hard_text)
+        soft = None
+        if soft_text:
+            soft, soft_unit = _parse_amount(soft_text)
+            if soft_unit != unit:
+                raise ValueError(f"Soft and hard limits of '{entry}' use different units")
+        limits.append(BudgetLimit(scope.strip().lower(), hard, soft, unit))
+    return limits
+
+
+class MemoryLedger:
+    """Budget totals kept in this process"""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def reserve_budget(self, scope, amount, limit=None):
+        """Add amount to a scope unless that would exceed limit; returns the new total or None"""
+        with self._lock:
+            total = self._totals.get(scope, 0.0) + amount
+            if limit is not None and total > limit:
+                return None
+            self._totals[scope] = total
+            return total
+
+    def release_budget(self, scope, amount):
+        with self._lock:
+            self._totals[scope] = self._totals.get(scope, 0.0) - amount
+
+
+class Reservation:
+    """Budget taken for one request; released again if the request fails"""
+
+    def __init__(self, entries, soft_crossed):
+        self.entries = entries
+        self.soft_crossed = soft_crossed
+
+
+def seconds_until_midnight():
+    now = datetime.datetime.now()
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return (tomorrow - now).total_seconds()
+
+
+class BudgetGuard:
+    """Enforces spend limits per job, per day and per API key.
+
+    reserve() is called for every speech request before it is sent. Each
+    scope is checked and updated atomically in the ledger (a MemoryLedger,
+    or the shared job store so that all workers count against the same
+    totals). Only the ledger update is locked, never the request itself. A
+    request that would cross a hard limit is refused with BudgetExceeded;
+    one that crosses a soft limit goes ahead and marks its scope as paused,
+    which callers use to stop starting new work in that scope. Days and
+    keys stay paused while their total is over the soft limit; a job is
+    only paused by the request that crosses it, so a resumed job goes on
+    until its hard limit.
+    """
+
+    def __init__(self, limits, ledger=None):
+        self.limits = list(limits)
+        self.ledger = ledger or MemoryLedger()
+        self._paused = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, ledger=None):
+        """Build a guard from TTS_BUDGET, or return None if it is not set"""
+        limits = parse_budget(os.getenv("TTS_BUDGET"))
+        return cls(limits, ledger) if limits else None
+
+    def _scope_key(self, limit, job_id, key_label):
+        today = datetime.date.today().isoformat()
+        if limit.scope == "job":
+            if job_id is None:
+                return None
+            return f"job:{job_id}:{limit.unit}"
+        if limit.scope == "day":
+            return f"day:{today}:{limit.unit}"
+        if key_label is None:
+            return None
+        return f"key:{key_label}:{today}:{limit.unit}"
+
+    def reserve(self, chars, model, speed=1.0, job_id=None, key_label=None):
+        """Take budget for one request; raises BudgetExceeded if a hard limit would be crossed"""
+        cost = None
+        entries = []
+        soft_crossed = []
+        for limit in self.limits:
+            scope_key = self._scope_key(limit, job_id, key_label)
+            if scope_key is None:
+                continue
+            if limit.unit == "usd":
+                if cost is None:
+                    cost = estimate_cost(model, chars, speed)
+                amount = cost
+            else:
+                amount = chars
+
+            total = self.ledger.reserve_budget(scope_key, amount, limit.hard)
+            if total is None:
+                self.release(Reservation(entries, []))
+                budget_rejections_total.inc(scope=limit.scope)
+                retry_after = seconds_until_midnight() if limit.scope == "key" else None
+                raise BudgetExceeded(limit.scope, limit.hard, limit.unit, retry_after)
+            entries.append((scope_key, amount))
+            if limit.scope != "job":
+                budget_spent.set(total, scope=limit.scope, unit=limit.unit)
+
+            # A job pauses on the request that crosses its soft limit only, so that resuming it lets it go on
+            crossed = total - amount < limit.soft <= total
+            if crossed or (limit.scope != "job" and total >= limit.soft):
+                soft_crossed.append(limit.scope)
+                with self._lock:
+                    first = scope_key not in self._paused
+                    self._paused.add(scope_key)
+                if first:
+                    budget_soft_limits_total.inc(scope=limit.scope)
+                    logging.warning(f"Soft {limit.scope} budget reached: {format_amount(total, limit.unit)} of "
+                                    f"{format_amount(limit.hard, limit.unit)}")
+        return Reservation(entries, soft_crossed)
+
+    def release(self, reservation):
+        """Give back the budget of a request that failed"""
+        for scope_key, amount in reservation.entries:
+            self.ledger.release_budget(scope_key, amount)
+
+    def job_paused(self, job_id):
+        """True once a job has crossed its soft limit"""
+        with self._lock:
+            return any(key.startswith(f"job:{job_id}:") for key in self._paused)
+
+    def clear_job_pause(self, job_id):
+        """Forget that a job crossed its soft limit, once it has been paused"""
+        with self._lock:
+            self._paused = {key for key in self._paused if not key.startswith(f"job:{job_id}:")}
+
+    def day_paused(self):
+        """True once today's soft limit has been crossed"""
+        prefix = f"day:{datetime.date.today().isoformat()}:"
+        with self._lock:
+            return any(key.startswith(prefix) for key in self._paused)
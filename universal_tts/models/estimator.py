@@ -0,0 +1,87 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from models.extraction_cache import ExtractionCache, file_signature
+
+# Published USD prices; check https://openai.com/api/pricing before relying on the estimates
+PRICES = {
+    "tts-1": {"per_million_chars": 15.0},
+    "tts-1-hd": {"per_million_chars": 30.0},
+    "gpt-4o-mini-tts": {"per_audio_minute": 0.015},
+}
+
+# Typical narration rate at speed 1.0
+SPOKEN_CHARS_PER_MINUTE = 900
+
+# Defaults for the wall-clock estimate of one request
+DEFAULT_TTFB_SECONDS = 1.0
+DEFAULT_REALTIME_FACTOR = 4.0  # seconds of audio streamed per second
+
+
+def audio_minutes(chars, speed=1.0):
+    """Estimate the length of the speech for a number of characters"""
+    return chars / SPOKEN_CHARS_PER_MINUTE / speed
+
+
+def estimate_cost(model, chars, speed=1.0):
+    """Estimate the cost in USD of synthesizing chars characters with a model"""
+    price = PRICES[model]
+    if "per_million_chars" in price:
+        return chars / 1_000_000 * price["per_million_chars"]
+    return audio_minutes(chars, speed) * price["per_audio_minute"]
+
+
+def estimate_wall_seconds(requests, chars, concurrency, requests_per_minute=None, speed=1.0,
+                          ttfb=DEFAULT_TTFB_SECONDS, realtime_factor=DEFAULT_REALTIME_FACTOR):
+    """Estimate how long a batch takes with concurrent requests and an optional rate limit"""
+    if not requests:
+        return 0.0
+    request_seconds = requests * ttfb + audio_minutes(chars, speed) * 60 / realtime_factor
+    seconds = request_seconds / max(1, concurrency)
+    if requests_per_minute:
+        seconds = max(seconds, requests / requests_per_minute * 60)
+    return seconds
+
+
+def _analyze(path, cache_dir):
+    """Extract one file into the cache; runs in a worker process"""
+    from models.file_model import FileModel
+
+    cache = ExtractionCache(cache_dir)
+    try:
+        signature = file_signature(path)
+        text = FileModel().read_file(path)
+        return dict(cache.put(path, text, signature), path=str(path), cached=False)
+    except Exception as e:
+        return {"path": str(path), "chars": 0, "chunks": 0, "stable_chunks": 0, "cached": False, "error": str(e)}
+
+
+def analyze_files(files, cache_dir=None, jobs=None):
+    """Return {"path", "chars", "chunks", "stable_chunks", "cached"[, "error"]} for each file.
+
+    Cached extractions are used for unchanged files; the others are
+    extracted in parallel worker processes and added to the cache.
+    """
+    cache = ExtractionCache(cache_dir)
+    results = {}
+    misses = []
+    for path in files:
+        summary = cache.summary(path)
+        if summary:
+            results[str(path)] = dict(summary, path=str(path), cached=True)
+        else:
+            misses.append(path)
+
+    if misses:
+        jobs = jobs or os.cpu_count() or 1
+        logging.info(f"Extracting {len(misses)} file(s) with {jobs} process(es), {len(results)} cached")
+        if jobs == 1 or len(misses) == 1:
+            analyzed = [_analyze(path, cache.cache_dir) for path in misses]
+        else:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(misses))) as executor:
+                analyzed = list(executor.map(_analyze, misses, [cache.cache_dir] * len(misses),
+                                             chunksize=max(1, len(misses) // (jobs * 4))))
+        for result in analyzed:
+            results[result["path"]] = result
+    return [results[str(path)] for path in files]
@@ -0,0 +1,92 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+from models.segment_cache import DEFAULT_CACHE_DIR
+from utils.metrics import registry
+from utils.text_chunker import split_text
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    chunks INTEGER NOT NULL,
+    stable_chunks INTEGER NOT NULL,
+    extracted_at REAL NOT NULL
+);
+"""
+
+cache_requests_total = registry.counter(
+    "tts_extraction_cache_requests_total", "Extraction cache lookups, by result (hit or miss)")
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) of a file; a cached extraction is valid while it is unchanged"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ExtractionCache:
+    """SQLite cache of the character and chunk counts of extracted documents.
+
+    Entries are keyed by absolute path and invalidated when the file's
+    modification time or size changes. Chunks are counted both ways the
+    text is split for synthesis: plainly (run) and at content-defined
+    boundaries (queue workers and run --incremental).
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv("TTS_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(self.cache_dir / "extraction.db")
+        self._local = threading.local()
+        conn = self._connection()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(extractions)")}
+        if columns and "stable_chunks" not in columns:
+            # Written by an older version; it is only a cache, so start again
+            logging.info(f"Clearing outdated extraction cache {self.db_path}")
+            conn.execute("DROP TABLE extractions")
+        conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _lookup(self, path, columns):
+        path = Path(path).absolute()
+        row = self._connection().execute(
+            f"SELECT mtime_ns, size, {columns} FROM extractions WHERE path = ?", (str(path),)).fetchone()
+        if row is not None and (row["mtime_ns"], row["size"]) == file_signature(path):
+            cache_requests_total.inc(result="hit")
+            return row
+        cache_requests_total.inc(result="miss")
+        return None
+
+    def summary(self, path):
+        """Return {"chars", "chunks", "stable_chunks"} for a cached, unchanged file, or None"""
+        row = self._lookup(path, "chars, chunks, stable_chunks")
+        return {"chars": row["chars"], "chunks": row["chunks"], "stable_chunks": row["stable_chunks"]} if row else None
+
+    def put(self, path, text, signature=None):
+        """Store the counts of the text extracted from a file; returns its summary"""
+        path = Path(path).absolute()
+        mtime_ns, size = signature or file_signature(path)
+        summary = {"chars": len(text), "chunks": len(split_text(text)),
+                   "stable_chunks": len(split_text(text, stable=True))}
+        self._connection().execute(
+            "INSERT OR REPLACE INTO extractions (path, mtime_ns, size, chars, chunks, stable_chunks, extracted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(path), mtime_ns, size, summary["chars"], summary["chunks"], summary["stable_chunks"], time.time()),
+        )
+        return summary
@@ -1,8 +1,30 @@
 import logging
 from pathlib import Path
 import datetime
-from docx import Document
-import fitz  # PyMuPDF
+import time
+
+from utils.metrics import registry
+from utils.pdf_text import clean_pdf_pages, dehyphenate, strip_page_margins
+from utils.text_normalizer import normalize_text
+
+extraction_seconds = registry.histogram(
+    "tts_extraction_seconds", "Time spent extracting text from input files, by file type")
+normalization_seconds = registry.histogram(
+    "tts_normalization_seconds", "Time spent normalizing extracted text")
+extracted_chars = registry.counter(
+    "tts_extracted_chars_total", "Characters extracted from input files, by file type")
+
+# Formats read paragraph by paragraph by utils.document_readers, which is imported on first use
+STREAMED_READERS = {
+    ".epub": "iter_epub",
+    ".html": "iter_html",
+    ".htm": "iter_html",
+    ".xhtml": "iter_html",
+    ".md": "iter_markdown",
+    ".markdown": "iter_markdown",
+    ".odt": "iter_odt",
+    ".rtf": "iter_rtf",
+}
 
 class FileModel:
     """Model for handling file operations"""
@@ -10,7 +32,11 @@ class FileModel:
     def __init__(self):
         # Default output directory
         self.default_output_dir = str(Path("output"))
-        self.supported_extensions = [".txt", ".docx", ".pdf"]
+        self.supported_extensions = [".txt", ".docx", ".pdf", *STREAMED_READERS]
+        # Leave out running headers, footers and page numbers of PDFs and rejoin hyphenated words
+        self.clean_pdf_text = True
+        # Clean up whitespace, line wraps and unspeakable characters in all extracted text
+        self.normalize = True
     
     def read_txt(self, file_path):
         """Read content from a text file"""
@@ -21,29 +47,190 @@ class FileModel:
     def read_docx(self, file_path):
         """Read content from a Word document"""
         logging.info(f"Reading DOCX file: {file_path}")
+        from docx import Document
         doc = Document(file_path)
         return "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
 
+    def _pdf_pages(self, doc):
+        # Text blocks only (type 0), in the same order as page.get_text()
+        return [(page.rect.height, [block[:5] for block in page.get_text("blocks") if block[6] == 0])
+                for page in doc]
+
     def read_pdf(self, file_path):
         """Read content from a PDF file"""
         logging.info(f"Reading PDF file: {file_path}")
-        doc = fitz.open(file_path)
-        return "\n".join([page.get_text() for page in doc])
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as doc:
+            if not self.clean_pdf_text:
+                return "\n".join([page.get_text() for page in doc])
+            pages = self._pdf_pages(doc)
+        text, stripped = clean_pdf_pages(pages)
+        if stripped:
+            logging.info(f"Left out {stripped} characters of headers, footers and page numbers")
+        return text
+
+    def _stream_reader(self, file_path):
+        from utils import document_readers
+        return getattr(document_readers, STREAMED_READERS[Path(file_path).suffix.lower()])
+
+    def iter_paragraphs(self, file_path):
+        """Yield the paragraphs of an EPUB, HTML, Markdown, ODT or RTF file as they are extracted.
+
+        The result can be fed straight to text_chunker.iter_chunks, so a
+        large document is never held in memory as one string.
+        """
+        file_type = Path(file_path).suffix.lower().lstrip(".")
+        logging.info(f"Streaming {file_type.upper()} file: {file_path}")
+        paragraphs = iter(self._stream_reader(file_path)(file_path))
+        extracting = normalizing = 0.0
+        chars = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                paragraph = next(paragraphs, None)
+                extracting += time.perf_counter() - start
+                if paragraph is None:
+                    break
+                if self.normalize:
+                    start = time.perf_counter()
+                    paragraph = normalize_text(paragraph)
+                    normalizing += time.perf_counter() - start
+                if paragraph:
+                    chars += len(paragraph)
+                    yield paragraph
+        finally:
+            # Time spent by the consumer between paragraphs is not counted
+            extraction_seconds.observe(extracting, file_type=file_type)
+            if self.normalize:
+                normalization_seconds.observe(normalizing)
+            extracted_chars.inc(chars, file_type=file_type)
+
+    def read_for_synthesis(self, file_path):
+        """Return the text of a file to pass to TTSModel.generate_speech.
+
+        Formats with a streaming reader are returned as a generator of
+        paragraphs (iter_paragraphs), so they go to the chunker without ever
+        being joined into one string; others are read with read_file.
+        """
+        if Path(file_path).suffix.lower() in STREAMED_READERS:
+            return self.iter_paragraphs(file_path)
+        return self.read_file(file_path)
+
+    def read_streamed(self, file_path):
+        """Read content from an EPUB, HTML, Markdown, ODT or RTF file"""
+        logging.info(f"Reading {Path(file_path).suffix.lstrip('.').upper()} file: {file_path}")
+        # Blank lines keep paragraphs apart through normalization
+        return "\n\n".join(self._stream_reader(file_path)(file_path))
 
     def read_file(self, file_path):
         """Read content from a file based on its extension"""
         file_path = Path(file_path)
+        start = time.perf_counter()
         if file_path.suffix.lower() == ".txt":
-            return self.read_txt(file_path)
+            text = self.read_txt(file_path)
         elif file_path.suffix.lower() == ".docx":
-            return self.read_docx(file_path)
+            text = self.read_docx(file_path)
         elif file_path.suffix.lower() == ".pdf":
-            return self.read_pdf(file_path)
+            text = self.read_pdf(file_path)
+        elif file_path.suffix.lower() in STREAMED_READERS:
+            text = self.read_streamed(file_path)
         else:
             error_msg = f"Unsupported file type: {file_path.suffix}"
             logging.error(error_msg)
             raise ValueError(error_msg)
+        
+        file_type = file_path.suffix.lower().lstrip(".")
+        extraction_seconds.observe(time.perf_counter() - start, file_type=file_type)
+        if self.normalize:
+            start = time.perf_counter()
+            text = normalize_text(text)
+            normalization_seconds.observe(time.perf_counter() - start)
+        extracted_chars.inc(len(text), file_type=file_type)
+        return text
     
+    def read_chapters(self, file_path):
+        """Read a document as a list of (title, text) chapters.
+
+        Chapters come from the EPUB spine, the top-level outline of a PDF or
+        the highest heading style used more than once in a Word document.
+        Other files, and documents without such structure, are one chapter
+        with the title None.
+        """
+        file_path = Path(file_path)
+        suffix = file_path.suffix.lower()
+        start = time.perf_counter()
+        if suffix == ".epub":
+            from utils.document_readers import iter_epub_chapters
+            logging.info(f"Reading EPUB chapters: {file_path}")
+            chapters = [(title, "\n\n".join(paragraphs)) for title, paragraphs in iter_epub_chapters(file_path)]
+        elif suffix == ".docx":
+            chapters = self._docx_chapters(file_path)
+        elif suffix == ".pdf":
+            chapters = self._pdf_chapters(file_path)
+        else:
+            return [(None, self.read_file(file_path))]
+        extraction_seconds.observe(time.perf_counter() - start, file_type=suffix.lstrip("."))
+
+        if self.normalize:
+            chapters = [(title, normalize_text(text)) for title, text in chapters]
+        chapters = [(title, text) for title, text in chapters if text.strip()]
+        extracted_chars.inc(sum(len(text) for _, text in chapters), file_type=suffix.lstrip("."))
+        logging.info(f"Found {len(chapters)} chapter(s) in {file_path.name}")
+        return chapters
+
+    def _docx_chapters(self, file_path):
+        logging.info(f"Reading DOCX chapters: {file_path}")
+        from docx import Document
+        paragraphs = []
+        for p in Document(file_path).paragraphs:
+            if not p.text.strip():
+                continue
+            name = p.style.name if p.style is not None else ""
+            level = None
+            if name == "Title":
+                level = 0
+            elif name.startswith("Heading ") and name[8:].isdigit():
+                level = int(name[8:])
+            paragraphs.append((level, p.text))
+
+        levels = [level for level, _ in paragraphs if level is not None]
+        split_level = next((level for level in sorted(set(levels)) if levels.count(level) > 1), None)
+        chapters = []
+        for level, text in paragraphs:
+            if level == split_level or not chapters:
+                chapters.append((text if level == split_level else None, []))
+            chapters[-1][1].append(text)
+        return [(title, "\n".join(texts)) for title, texts in chapters]
+
+    def _pdf_chapters(self, file_path):
+        logging.info(f"Reading PDF chapters: {file_path}")
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as doc:
+            toc = doc.get_toc(simple=True)
+            if self.clean_pdf_text:
+                page_texts, _ = strip_page_margins(self._pdf_pages(doc))
+            else:
+                page_texts = [page.get_text() for page in doc]
+
+        # Chapters start at the entries of the highest outline level used more than once
+        levels = [level for level, _, page in toc if page >= 1]
+        split_level = next((level for level in sorted(set(levels)) if levels.count(level) > 1), None)
+        starts = []
+        for level, title, page in toc:
+            # A chapter needs a page of its own; entries sharing a start page are one chapter
+            if level == split_level and page >= 1 and (not starts or page - 1 > starts[-1][1]):
+                starts.append((title.strip() or None, page - 1))
+        if not starts:
+            return [(None, dehyphenate("\n".join(page_texts)))]
+
+        chapters = []
+        if starts[0][1] > 0:
+            chapters.append((None, dehyphenate("\n".join(page_texts[:starts[0][1]]))))
+        for i, (title, first_page) in enumerate(starts):
+            last_page = starts[i + 1][1] if i + 1 < len(starts) else len(page_texts)
+            chapters.append((title, dehyphenate("\n".join(page_texts[first_page:last_page]))))
+        return chapters
+
     def ensure_output_directory(self, directory_path):
         """Ensure the output directory exists"""
         output_dir = Path(directory_path)
@@ -0,0 +1,575 @@
+import os
+import time
+import socket
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.fingerprint import find_duplicates
+from utils.metrics import registry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    source_path TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    model TEXT NOT NULL,
+    format TEXT NOT NULL,
+    speed REAL NOT NULL DEFAULT 1.0,
+    instructions TEXT,
+    formats TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    chars INTEGER,
+    chunk_count INTEGER,
+    chunks_remaining INTEGER,
+    claimed_by TEXT,
+    lease_expires REAL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, chunks_remaining);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    seq INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    audio_path TEXT,
+    bytes INTEGER,
+    claimed_by TEXT,
+    claimed_at REAL,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT,
+    fingerprint TEXT,
+    duplicate_of INTEGER REFERENCES chunks(id),
+    UNIQUE(job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS chunks_status ON chunks(status, job_id, seq);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    chunk_id INTEGER NOT NULL REFERENCES chunks(id),
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    worker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    chars INTEGER,
+    bytes INTEGER,
+    ttfb REAL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS attempts_finished ON attempts(finished_at);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    path TEXT NOT NULL,
+    format TEXT NOT NULL,
+    bytes INTEGER,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    threads INTEGER,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS budget (
+    scope TEXT PRIMARY KEY,
+    amount REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first version of the schema: (table, column, definition)
+MIGRATIONS = [
+    ("jobs", "lease_expires", "REAL"),
+    ("chunks", "lease_expires", "REAL"),
+    ("chunks", "fingerprint", "TEXT"),
+    ("chunks", "duplicate_of", "INTEGER REFERENCES chunks(id)"),
+    ("jobs", "formats", "TEXT"),
+]
+
+# Attempts per chunk before its job is marked as failed
+MAX_ATTEMPTS = 3
+
+# Delay before a failed chunk is retried, multiplied by the attempt number
+RETRY_BACKOFF_SECONDS = 5.0
+
+# How long a claim is valid without a heartbeat; workers renew at a third of this
+LEASE_SECONDS = 60.0
+
+lease_reclaims_total = registry.counter(
+    "tts_lease_reclaims_total", "Chunks and jobs returned to the queue after their lease expired")
+
+
+def make_worker_id():
+    """Return an identifier for this worker process: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def dead_local_workers(claimants, host=None):
+    """Return the worker ids among claimants that were processes on this host and have exited"""
+    host = host or socket.gethostname()
+    dead = []
+    for worker_id in claimants:
+        if not worker_id or ":" not in worker_id:
+            continue
+        worker_host, _, pid = worker_id.rpartition(":")
+        if worker_host == host and pid.isdigit() and not _process_alive(int(pid)):
+            dead.append(worker_id)
+    return dead
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class JobModel:
+    """Model for the persistent batch job queue, stored in SQLite (WAL mode).
+
+    A job moves through pending -> preparing -> ready -> stitching -> done
+    (or failed); a ready job can be paused and resumed. A worker claims a pending job to extract and chunk its text;
+    the chunks are then claimed and synthesized independently, and once the
+    last one is done a worker claims the job again to stitch the output.
+    Every claim is a single IMMEDIATE transaction, so any number of worker
+    threads and processes can share one database file.
+
+    Claims are leases: a worker renews them with heartbeat() while it works,
+    and anything whose lease has expired (a crashed or partitioned worker)
+    is put back in the queue by the next claim_work() call. Results from a
+    worker that lost its lease are discarded.
+    """
+
+    def __init__(self, db_path, lease_seconds=LEASE_SECONDS):
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        """Add columns missing from databases created by older versions"""
+        for table, column, definition in MIGRATIONS:
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _transaction(self):
+        """Run the with-block in a write transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- Producers ----
+
+    def add_job(self, source_path, output_path, voice, model, format="mp3", speed=1.0, instructions=None,
+                formats=None):
+        """Queue a document for synthesis and return the job id.
+
+        format is the format synthesized into output_path. With formats,
+        every one of them is written from that audio when the job is
+        stitched, next to output_path.
+        """
+        formats = ",".join(formats) if formats and list(formats) != [format] else None
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (source_path, output_path, voice, model, format, speed, instructions, formats, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(source_path), str(output_path), voice, model, format, speed, instructions, formats, time.time()),
+            )
+            return cursor.lastrowid
+
+    # ---- Workers ----
+
+    def claim_work(self, worker_id):
+        """Atomically claim the next unit of work.
+
+        Finishing jobs is preferred over starting new ones: stitching first,
+        then chunk synthesis, then preparing a pending job. Returns a dict
+        with a "kind" key ("stitch", "chunk" or "prepare") or None.
+        """
+        now = time.time()
+        lease_expires = now + self.lease_seconds
+        with self._transaction() as conn:
+            reclaimed = self._requeue(conn, "lease_expires < ?", (now,))
+            if reclaimed:
+                lease_reclaims_total.inc(reclaimed)
+                logging.warning(f"Reclaimed {reclaimed} item(s) with expired leases")
+
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('ready', 'paused') AND chunks_remaining = 0 ORDER BY id LIMIT 1"
+            ).fetchone()
+            if job:
+                conn.execute("UPDATE jobs SET status = 'stitching', claimed_by = ?, lease_expires = ? WHERE id = ?",
+                             (worker_id, lease_expires, job["id"]))
+                return {"kind": "stitch", "job": dict(job, claimed_by=worker_id)}
+
+            chunk = conn.execute(
+                "SELECT chunks.* FROM chunks JOIN jobs ON jobs.id = chunks.job_id "
+                "WHERE chunks.status = 'pending' AND chunks.not_before <= ? AND jobs.status = 'ready' "
+                "ORDER BY chunks.job_id, chunks.seq LIMIT 1",
+                (now,),
+            ).fetchone()
+            if chunk:
+                conn.execute(
+                    "UPDATE chunks SET status = 'running', claimed_by = ?, claimed_at = ?, lease_expires = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker_id, now, lease_expires, chunk["id"]),
+                )
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (chunk["job_id"],)).fetchone()
+                chunk = dict(chunk, attempts=chunk["attempts"] + 1, claimed_by=worker_id, claimed_at=now)
+                return {"kind": "chunk", "chunk": chunk, "job": dict(job)}
+
+            job = conn.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if job:
+                conn.execute(
+                    "UPDATE jobs SET status = 'preparing', claimed_by = ?, started_at = ?, lease_expires = ? "
+                    "WHERE id = ?",
+                    (worker_id, now, lease_expires, job["id"]),
+                )
+                return {"kind": "prepare", "job": dict(job, claimed_by=worker_id)}
+        return None
+
+    def heartbeat(self, worker_id, threads=None):
+        """Record that a worker is alive and renew the leases of everything it has claimed.
+
+        Returns the number of leases renewed.
+        """
+        now = time.time()
+        lease_expires = now + self.lease_seconds
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO workers (id, host, threads, started_at, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_seen = excluded.last_seen, "
+                "threads = COALESCE(excluded.threads, threads)",
+                (worker_id, worker_id.rpartition(":")[0] or worker_id, threads, now, now),
+            )
+            renewed = conn.execute(
+                "UPDATE chunks SET lease_expires = ? WHERE status = 'running' AND claimed_by = ?",
+                (lease_expires, worker_id)).rowcount
+            renewed += conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE status IN ('preparing', 'stitching') AND claimed_by = ?",
+                (lease_expires, worker_id)).rowcount
+        return renewed
+
+    def add_chunks(self, job_id, chunks, worker_id=None):
+        """Store the text chunks of a prepared job and make them claimable.
+
+        With worker_id, nothing is stored unless that worker still holds the
+        job; returns True if the chunks were added.
+        """
+        now = time.time()
+        # A chunk repeating an earlier one of the job (up to whitespace and case) reuses its audio
+        fingerprints, first = find_duplicates(chunks)
+        unique = sum(1 for seq in range(len(chunks)) if first[seq] == seq)
+        with self._transaction() as conn:
+            if worker_id and not self._holds_job(conn, job_id, "preparing", worker_id):
+                logging.warning(f"Job {job_id}: lease lost by {worker_id}, discarding its chunks")
+                return False
+            ids = []
+            for seq, text in enumerate(chunks):
+                original = first[seq]
+                cursor = conn.execute(
+                    "INSERT INTO chunks (job_id, seq, text, status, fingerprint, duplicate_of, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, seq, text, "pending" if original == seq else "duplicate", fingerprints[seq],
+                     None if original == seq else ids[original], now),
+                )
+                ids.append(cursor.lastrowid)
+            conn.execute(
+                "UPDATE jobs SET status = 'ready', claimed_by = NULL, chars = ?, chunk_count = ?, "
+                "chunks_remaining = ? WHERE id = ?",
+                (sum(len(c) for c in chunks), len(chunks), unique, job_id),
+            )
+        if unique < len(chunks):
+            logging.info(f"Job {job_id}: {len(chunks) - unique} repeated chunk(s) will reuse earlier audio")
+        return True
+
+    def _holds_job(self, conn, job_id, status, worker_id):
+        row = conn.execute("SELECT 1 FROM jobs WHERE id = ? AND status = ? AND claimed_by = ?",
+                           (job_id, status, worker_id)).fetchone()
+        return row is not None
+
+    def _holds_chunk(self, conn, chunk, worker_id):
+        row = conn.execute(
+            "SELECT 1 FROM chunks WHERE id = ? AND status = 'running' AND claimed_by = ? AND attempts = ?",
+            (chunk["id"], worker_id, chunk["attempts"])).fetchone()
+        return row is not None
+
+    def complete_chunk(self, chunk, worker_id, audio_path, bytes_written, started_at, ttfb=None):
+        """Record a synthesized chunk; returns False if the worker's lease was lost"""
+        now = time.time()
+        with self._transaction() as conn:
+            if not self._holds_chunk(conn, chunk, worker_id):
+                logging.warning(f"Chunk {chunk['id']}: lease lost by {worker_id}, discarding its audio")
+                self._record_attempt(conn, chunk, worker_id, "lost", bytes_written, ttfb, started_at, now)
+                return False
+            conn.execute(
+                "UPDATE chunks SET status = 'done', audio_path = ?, bytes = ?, finished_at = ?, error = NULL, "
+                "lease_expires = NULL WHERE id = ?",
+                (str(audio_path), bytes_written, now, chunk["id"]),
+            )
+            conn.execute("UPDATE jobs SET chunks_remaining = chunks_remaining - 1 WHERE id = ?",
+                         (chunk["job_id"],))
+            self._record_attempt(conn, chunk, worker_id, "ok", bytes_written, ttfb, started_at, now)
+        return True
+
+    def fail_chunk(self, chunk, worker_id, error, started_at, max_attempts=MAX_ATTEMPTS):
+        """Record a failed chunk attempt; returns True if the chunk will be retried"""
+        now = time.time()
+        retry = chunk["attempts"] < max_attempts
+        with self._transaction() as conn:
+            if not self._holds_chunk(conn, chunk, worker_id):
+                # The chunk was already reclaimed; whoever holds it now decides
+                self._record_attempt(conn, chunk, worker_id, "lost", None, None, started_at, now, str(error))
+                return False
+            if retry:
+                conn.execute(
+                    "UPDATE chunks SET status = 'pending', claimed_by = NULL, lease_expires = NULL, not_before = ?, "
+                    "error = ? WHERE id = ?",
+                    (now + RETRY_BACKOFF_SECONDS * chunk["attempts"], str(error), chunk["id"]),
+                )
+            else:
+                conn.execute("UPDATE chunks SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                             (now, str(error), chunk["id"]))
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (f"Chunk {chunk['seq']} failed after {chunk['attempts']} attempts: {error}", now,
+                     chunk["job_id"]),
+                )
+            self._record_attempt(conn, chunk, worker_id, "error", None, None, started_at, now, str(error))
+        return retry
+
+    def release_chunk(self, chunk, worker_id):
+        """Return a claimed chunk to the queue without counting the attempt"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE chunks SET status = 'pending', claimed_by = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                (chunk["id"], worker_id),
+            ).rowcount > 0
+
+    def _record_attempt(self, conn, chunk, worker_id, status, bytes_written, ttfb, started_at, finished_at,
+                        error=None):
+        conn.execute(
+            "INSERT INTO attempts (chunk_id, job_id, worker, status, chars, bytes, ttfb, started_at, finished_at, "
+            "error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (chunk["id"], chunk["job_id"], worker_id, status, len(chunk["text"]), bytes_written, ttfb,
+             started_at, finished_at, error),
+        )
+
+    def get_chunk_outputs(self, job_id):
+        """Return the audio paths of a job's chunks in order"""
+        rows = self._connection().execute(
+            "SELECT COALESCE(original.audio_path, chunks.audio_path) AS audio_path FROM chunks "
+            "LEFT JOIN chunks AS original ON original.id = chunks.duplicate_of "
+            "WHERE chunks.job_id = ? ORDER BY chunks.seq", (job_id,)
+        ).fetchall()
+        return [row["audio_path"] for row in rows]
+
+    def complete_job(self, job_id, output_path, format, bytes_written, worker_id=None, outputs=None):
+        """Mark a job as done and record its output file.
+
+        outputs lists further (path, format, bytes) written from the same
+        audio; output_path is None when the synthesized file was not kept.
+        With worker_id, the job is only completed if that worker still holds
+        it; returns True if it was completed.
+        """
+        records = [(output_path, format, bytes_written)] if output_path is not None else []
+        records.extend(tuple(output) for output in outputs or [])
+        now = time.time()
+        with self._transaction() as conn:
+            if worker_id and not self._holds_job(conn, job_id, "stitching", worker_id):
+                logging.warning(f"Job {job_id}: lease lost by {worker_id}, not recording its output")
+                return False
+            conn.execute(
+                "UPDATE jobs SET status = 'done', claimed_by = NULL, finished_at = ? WHERE id = ?", (now, job_id))
+            conn.executemany(
+                "INSERT INTO outputs (job_id, path, format, bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, str(path), output_format, size, now) for path, output_format, size in records],
+            )
+        return True
+
+    def fail_job(self, job_id, error, worker_id=None):
+        """Mark a job as failed; with worker_id, only while that worker still holds it"""
+        query = "UPDATE jobs SET status = 'failed', claimed_by = NULL, error = ?, finished_at = ? WHERE id = ?"
+        params = (str(error), time.time(), job_id)
+        if worker_id:
+            query += " AND claimed_by = ? AND status IN ('preparing', 'stitching')"
+            params += (worker_id,)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount > 0
+
+    def has_unfinished_jobs(self):
+        """Return True while any job is not yet done, failed or paused"""
+        row = self._connection().execute(
+            "SELECT 1 FROM jobs WHERE status NOT IN ('done', 'failed', 'paused') LIMIT 1").fetchone()
+        return row is not None
+
+    def pause_job(self, job_id):
+        """Stop handing out a ready job's chunks; chunks already running still finish"""
+        with self._transaction() as conn:
+            paused = conn.execute(
+                "UPDATE jobs SET status = 'paused' WHERE id = ? AND status = 'ready'", (job_id,)).rowcount > 0
+        if paused:
+            logging.warning(f"Job {job_id} paused")
+        return paused
+
+    def resume_jobs(self, job_ids=None):
+        """Return paused jobs (all of them, or the given ids) to the queue; returns how many"""
+        query = "UPDATE jobs SET status = 'ready' WHERE status = 'paused'"
+        params = ()
+        if job_ids:
+            query += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            params = tuple(job_ids)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    # ---- Budget ----
+
+    def reserve_budget(self, scope, amount, limit=None):
+        """Add amount to a budget scope unless that would exceed limit; returns the new total or None"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT amount FROM budget WHERE scope = ?", (scope,)).fetchone()
+            total = (row["amount"] if row else 0.0) + amount
+            if limit is not None and total > limit:
+                return None
+            conn.execute(
+                "INSERT INTO budget (scope, amount, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(scope) DO UPDATE SET amount = excluded.amount, updated_at = excluded.updated_at",
+                (scope, total, time.time()),
+            )
+        return total
+
+    def release_budget(self, scope, amount):
+        """Give back budget reserved for a request that failed"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE budget SET amount = amount - ?, updated_at = ? WHERE scope = ?",
+                         (amount, time.time(), scope))
+
+    def budget_totals(self, prefix=""):
+        """Return {scope: amount} for budget scopes starting with prefix"""
+        rows = self._connection().execute(
+            "SELECT scope, amount FROM budget WHERE scope LIKE ? ORDER BY scope", (prefix + "%",)).fetchall()
+        return {row["scope"]: row["amount"] for row in rows}
+
+    def claimants(self):
+        """Return the ids of workers that currently hold claims"""
+        rows = self._connection().execute(
+            "SELECT DISTINCT claimed_by FROM chunks WHERE status = 'running' "
+            "UNION SELECT DISTINCT claimed_by FROM jobs WHERE status IN ('preparing', 'stitching')")
+        return [row["claimed_by"] for row in rows if row["claimed_by"]]
+
+    def recover_dead_workers(self):
+        """Requeue work claimed by worker processes on this host that no longer exist.
+
+        This does not wait for their leases to expire. Returns the number of
+        chunks and jobs requeued.
+        """
+        return sum(self.requeue_worker(worker_id) for worker_id in dead_local_workers(self.claimants()))
+
+    def requeue_worker(self, worker_id):
+        """Return everything claimed by worker_id to the queue; returns the number of items requeued"""
+        with self._transaction() as conn:
+            total = self._requeue(conn, "claimed_by = ?", (worker_id,))
+        if total:
+            logging.warning(f"Requeued {total} item(s) claimed by {worker_id}")
+        return total
+
+    def _requeue(self, conn, where, params):
+        """Return claimed chunks and jobs matching a WHERE clause to the queue"""
+        chunks = conn.execute(
+            "UPDATE chunks SET status = 'pending', claimed_by = NULL, lease_expires = NULL "
+            f"WHERE status = 'running' AND {where}", params).rowcount
+        prepared = conn.execute(
+            "UPDATE jobs SET status = 'pending', claimed_by = NULL, lease_expires = NULL "
+            f"WHERE status = 'preparing' AND {where}", params).rowcount
+        stitched = conn.execute(
+            "UPDATE jobs SET status = 'ready', claimed_by = NULL, lease_expires = NULL "
+            f"WHERE status = 'stitching' AND {where}", params).rowcount
+        return chunks + prepared + stitched
+
+    # ---- Reporting ----
+
+    def status_counts(self):
+        """Return job and chunk counts by status"""
+        conn = self._connection()
+        return {
+            "jobs": {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")},
+            "chunks": {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM chunks GROUP BY status")},
+        }
+
+    def throughput(self, since, bucket_seconds=3600):
+        """Return per-bucket totals of finished chunk attempts since a timestamp"""
+        rows = self._connection().execute(
+            "SELECT CAST(finished_at / ? AS INTEGER) * ? AS bucket, "
+            "SUM(status = 'ok') AS chunks, SUM(status != 'ok') AS errors, "
+            "SUM(CASE WHEN status = 'ok' THEN chars ELSE 0 END) AS chars, "
+            "SUM(COALESCE(bytes, 0)) AS bytes, AVG(finished_at - started_at) AS avg_seconds, "
+            "AVG(ttfb) AS avg_ttfb "
+            "FROM attempts WHERE finished_at >= ? GROUP BY bucket ORDER BY bucket",
+            (bucket_seconds, bucket_seconds, since),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def active_workers(self, since):
+        """Return the workers that have sent a heartbeat since a timestamp"""
+        rows = self._connection().execute(
+            "SELECT workers.*, (SELECT COUNT(*) FROM chunks WHERE chunks.status = 'running' "
+            "AND chunks.claimed_by = workers.id) AS running FROM workers WHERE last_seen >= ? ORDER BY id",
+            (since,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def failed_jobs(self, limit=20):
+        """Return the most recent failed jobs"""
+        rows = self._connection().execute(
+            "SELECT id, source_path, error FROM jobs WHERE status = 'failed' ORDER BY finished_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,223 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from models.budget import BudgetExceeded, BudgetPaused
+from models.scheduler import RateLimiter
+from utils.metrics import registry
+
+# Cooldown after a rate-limit response, multiplied by consecutive failures
+RATE_LIMIT_COOLDOWN_SECONDS = 20.0
+
+# Cooldown after repeated server or network errors
+ERROR_COOLDOWN_SECONDS = 10.0
+
+# Consecutive server or network errors before a key is cooled down
+MAX_CONSECUTIVE_ERRORS = 3
+
+MAX_COOLDOWN_SECONDS = 300.0
+
+key_requests_total = registry.counter(
+    "tts_key_requests_total", "Speech requests by API key and outcome")
+key_in_flight = registry.gauge(
+    "tts_key_in_flight", "Speech requests currently running on each API key")
+key_healthy = registry.gauge(
+    "tts_key_healthy", "1 if an API key is accepting requests, 0 while cooling down or disabled")
+
+
+def parse_api_keys(value):
+    """Parse a comma-separated OPENAI_API_KEYS value into (key, requests per minute) pairs.
+
+    Each entry is a key, optionally followed by ":<requests per minute>".
+    """
+    keys = []
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, _, rpm = entry.partition(":")
+        keys.append((key.strip(), float(rpm) if rpm.strip() else None))
+    return keys
+
+
+def mask_key(api_key):
+    """Return a short label for a key that is safe to log"""
+    if not api_key:
+        return "custom"
+    return f"...{api_key[-4:]}"
+
+
+class PooledKey:
+    """One API key with its own clients, rate limit and health state"""
+
+    def __init__(self, api_key, requests_per_minute=None, client=None):
+        self.api_key = api_key
+        self.label = mask_key(api_key)
+        self.rate_limiter = RateLimiter(requests_per_minute / 60) if requests_per_minute else None
+        self.in_flight = 0
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.disabled = False
+        self._client = client
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Synchronous OpenAI client for this key, created on first use"""
+        if self._client is None and self.api_key:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def async_client(self):
+        """Asynchronous OpenAI client for this key, created on first use"""
+        if self._async_client is None and self.api_key:
+            with self._lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+                    self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, client):
+        self._async_client = client
+
+    def is_healthy(self, now):
+        return not self.disabled and now >= self.cooldown_until
+
+
+class KeyPool:
+    """Pool of API keys that spreads requests over the least-loaded healthy key.
+
+    acquire() picks the healthy key with the fewest requests in flight whose
+    rate limit allows another request, waiting if none does. Rate-limit
+    responses put a key in a cooldown that grows with repeated failures,
+    repeated server errors cool it down briefly, and authentication errors
+    disable it.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self._lock = threading.Lock()
+        for key in self.keys:
+            key_healthy.set(1, key=key.label)
+
+    @classmethod
+    def from_api_keys(cls, api_keys):
+        """Build a pool from (key, requests per minute) pairs"""
+        return cls(PooledKey(api_key, rpm) for api_key, rpm in api_keys)
+
+    @property
+    def primary(self):
+        """The first key, used where one fixed client is needed"""
+        return self.keys[0] if self.keys else None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _checkout(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                candidates = sorted((key for key in self.keys if key.is_healthy(now)),
+                                    key=lambda key: (key.in_flight, key.requests))
+                delays = []
+                for key in candidates:
+                    if key.rate_limiter:
+                        taken, delay = key.rate_limiter.try_acquire()
+                        if not taken:
+                            delays.append(delay)
+                            continue
+                    key.in_flight += 1
+                    key.requests += 1
+                    key_in_flight.set(key.in_flight, key=key.label)
+                    return key
+
+                if not candidates:
+                    enabled = [key for key in self.keys if not key.disabled]
+                    if not enabled:
+                        raise RuntimeError("All API keys are disabled; check that they are valid")
+                    wait = min(key.cooldown_until for key in enabled) - now
+                    if wait > MAX_COOLDOWN_SECONDS:
+                        # Only keys rested for their budget cool down this long; don't block until it resets
+                        raise BudgetPaused(f"All API keys have reached their budgets; the next is available "
+                                           f"in {wait / 3600:.1f} hours")
+                    delays.append(wait)
+            time.sleep(max(0.01, min(delays)))
+
+    def _release(self, key, error=None):
+        now = time.time()
+        with self._lock:
+            key.in_flight -= 1
+            key_in_flight.set(key.in_flight, key=key.label)
+            if error is None:
+                key.consecutive_failures = 0
+                key_requests_total.inc(key=key.label, status="ok")
+                return
+
+            if isinstance(error, BudgetExceeded):
+                # Not the key's fault; if its own budget is used up, rest it until the budget resets
+                key_requests_total.inc(key=key.label, status="over_budget")
+                if error.key_retry_after is not None:
+                    key.cooldown_until = now + error.key_retry_after
+                    key_healthy.set(0, key=key.label)
+                    logging.warning(f"API key {key.label} reached its budget, resting it for "
+                                    f"{error.key_retry_after:.0f}s")
+                return
+
+            key.consecutive_failures += 1
+            status_code = getattr(error, "status_code", None)
+            if status_code in (401, 403):
+                key.disabled = True
+                logging.error(f"API key {key.label} rejected ({status_code}), removing it from the pool")
+            elif status_code == 429:
+                cooldown = min(MAX_COOLDOWN_SECONDS, RATE_LIMIT_COOLDOWN_SECONDS * key.consecutive_failures)
+                key.cooldown_until = now + cooldown
+                logging.warning(f"API key {key.label} rate limited, cooling down for {cooldown:.0f}s")
+            elif key.consecutive_failures >= MAX_CONSECUTIVE_ERRORS:
+                key.cooldown_until = now + ERROR_COOLDOWN_SECONDS
+                logging.warning(f"API key {key.label} failed {key.consecutive_failures} times in a row, "
+                                f"cooling down for {ERROR_COOLDOWN_SECONDS:.0f}s")
+            key_requests_total.inc(key=key.label, status="rate_limited" if status_code == 429 else "error")
+            key_healthy.set(int(key.is_healthy(now)), key=key.label)
+
+    @contextmanager
+    def acquire(self):
+        """Check out a key for one request; failures in the with-block update its health"""
+        key = self._checkout()
+        key_healthy.set(1, key=key.label)
+        try:
+            yield key
+        except Exception as e:
+            self._release(key, e)
+            raise
+        self._release(key)
+
+    def rest(self, key, seconds):
+        """Stop handing out a key for a while, e.g. once it has crossed a soft budget limit"""
+        with self._lock:
+            key.cooldown_until = max(key.cooldown_until, time.time() + seconds)
+            key_healthy.set(0, key=key.label)
+
+    def status(self):
+        """Return the state of every key, for logging and reports"""
+        now = time.time()
+        with self._lock:
+            return [{
+                "key": key.label,
+                "healthy": key.is_healthy(now),
+                "disabled": key.disabled,
+                "in_flight": key.in_flight,
+                "requests": key.requests,
+                "cooldown_seconds": max(0.0, key.cooldown_until - now),
+            } for key in self.keys]
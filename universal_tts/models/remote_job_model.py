@@ -0,0 +1,109 @@
+import hmac
+import json
+import logging
+
+from models.job_model import dead_local_workers
+
+# JobModel methods that remote workers and tools may call
+REMOTE_METHODS = {
+    "add_job", "claim_work", "heartbeat", "add_chunks", "complete_chunk", "fail_chunk", "get_chunk_outputs",
+    "complete_job", "fail_job", "has_unfinished_jobs", "claimants", "requeue_worker", "status_counts",
+    "throughput", "active_workers", "failed_jobs", "pause_job", "resume_jobs", "reserve_budget", "release_budget",
+    "budget_totals", "release_chunk",
+}
+
+
+class RemoteJobModel:
+    """Client for a job store served by serve_job_store on another host.
+
+    Exposes the JobModel methods used by workers and the CLI, so worker
+    processes on any machine can share one queue. Audio part files are
+    written next to each job's output path, so that path must be on storage
+    every worker can reach (e.g. a network share mounted at the same path).
+    """
+
+    def __init__(self, url, token=None, timeout=30):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _call(self, method, *args, **kwargs):
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError
+
+        body = json.dumps({"args": args, "kwargs": kwargs}, default=str).encode("utf-8")
+        request = Request(f"{self.url}/call/{method}", data=body, method="POST",
+                          headers={"Content-Type": "application/json"})
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())["result"]
+        except HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")
+            try:
+                detail = json.loads(detail)["error"]
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise RuntimeError(f"Job store {method} failed ({e.code}): {detail}") from e
+
+    def __getattr__(self, name):
+        if name not in REMOTE_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def recover_dead_workers(self):
+        """Requeue work claimed by exited worker processes on this host"""
+        # Process liveness can only be checked here, not on the server
+        return sum(self.requeue_worker(worker_id) for worker_id in dead_local_workers(self.claimants()))
+
+    def close(self):
+        pass
+
+
+def serve_job_store(job_model, port, host="127.0.0.1", token=None):
+    """Serve a JobModel over HTTP for workers on other hosts.
+
+    Each POST /call/<method> runs one JobModel method with the JSON body's
+    args and kwargs, and answers {"result": ...} or {"error": "..."}. Each
+    request has its own thread (and SQLite connection), so a slow or stalled
+    client never holds up the claims and heartbeats of other workers.
+    Returns the server; call serve_forever() on it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    expected = f"Bearer {token}".encode("utf-8") if token else None
+
+    class JobStoreHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if expected and not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), expected):
+                self._send_json(401, {"error": "Unauthorized"})
+                return
+            method = self.path[len("/call/"):] if self.path.startswith("/call/") else None
+            if method not in REMOTE_METHODS:
+                self._send_json(404, {"error": f"Unknown method {method}"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                result = getattr(job_model, method)(*request.get("args", []), **request.get("kwargs", {}))
+                body = {"result": result}
+            except Exception as e:
+                logging.error(f"Job store {method} failed: {e}", exc_info=True)
+                self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send_json(200, body)
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("Job store: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), JobStoreHandler)
+    logging.info(f"Job store {job_model.db_path} served at http://{host}:{server.server_address[1]}")
+    return server
@@ -0,0 +1,173 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from utils.metrics import registry
+from utils.profiling import profiled
+
+# Priority classes, highest first
+PRIORITIES = ["interactive", "normal", "bulk"]
+
+DEFAULT_MAX_WORKERS = 4
+
+queue_depth = registry.gauge(
+    "tts_scheduler_queue_depth", "Speech requests waiting for a scheduler slot, by priority")
+wait_seconds = registry.histogram(
+    "tts_scheduler_wait_seconds", "Time a speech request waits for a scheduler slot, by priority")
+tasks_total = registry.counter(
+    "tts_scheduler_tasks_total", "Speech requests run by the scheduler, by priority and outcome")
+
+
+class RateLimiter:
+    """Token bucket limiting how many requests may start per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; returns (taken, seconds until the next token)"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True, 0.0
+            return False, (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Take a token, waiting until one is available"""
+        while True:
+            taken, delay = self.try_acquire()
+            if taken:
+                return
+            time.sleep(delay)
+
+    def refund(self):
+        """Return a token that was acquired but not used"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class SpeechScheduler:
+    """Priority scheduler for speech API requests.
+
+    Requests are queued per priority class (interactive, normal, bulk) and
+    run by a shared pool of worker threads, which always take the oldest
+    request of the highest class waiting. Rate-limit tokens are taken
+    before a request is picked, so a request submitted while the pool waits
+    for a token still goes ahead of lower classes. interactive_workers
+    extra threads only run interactive requests, so a preview never waits
+    for a long bulk request to finish.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, interactive_workers=1, requests_per_minute=None):
+        if requests_per_minute is None and os.getenv("TTS_REQUESTS_PER_MINUTE"):
+            requests_per_minute = float(os.getenv("TTS_REQUESTS_PER_MINUTE"))
+        self.max_workers = max_workers
+        self.interactive_workers = interactive_workers
+        self.rate_limiter = RateLimiter(requests_per_minute / 60) if requests_per_minute else None
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._condition = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+
+    def _start_threads(self):
+        pools = [(PRIORITIES, self.max_workers), (["interactive"], self.interactive_workers)]
+        for priorities, count in pools:
+            for _ in range(count):
+                thread = threading.Thread(target=self._worker, args=(priorities,),
+                                          name=f"tts-scheduler-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, priority, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) in a priority class; returns a Future.
+
+        If the calling thread is being profiled, fn is profiled by the same
+        JobProfiler in the worker thread that runs it.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {', '.join(PRIORITIES)}")
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+            if not self._threads:
+                self._start_threads()
+            self._queues[priority].append((future, profiled(fn), args, kwargs, time.perf_counter()))
+            queue_depth.set(len(self._queues[priority]), priority=priority)
+            self._condition.notify_all()
+        return future
+
+    def run(self, priority, fn, *args, **kwargs):
+        """Run fn through the scheduler and wait for its result"""
+        return self.submit(priority, fn, *args, **kwargs).result()
+
+    def pending(self):
+        """Return the number of queued requests per priority class"""
+        with self._condition:
+            return {priority: len(queue) for priority, queue in self._queues.items()}
+
+    def _has_work(self, priorities):
+        return any(self._queues[priority] for priority in priorities)
+
+    def _pop(self, priorities):
+        for priority in priorities:
+            queue = self._queues[priority]
+            if queue:
+                task = queue.popleft()
+                queue_depth.set(len(queue), priority=priority)
+                return priority, task
+        return None, None
+
+    def _worker(self, priorities):
+        while True:
+            with self._condition:
+                while not self._has_work(priorities) and not self._shutdown:
+                    self._condition.wait()
+                if self._shutdown and not self._has_work(priorities):
+                    return
+
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            with self._condition:
+                priority, task = self._pop(priorities)
+            if task is None:
+                # Another thread took the request while this one waited for a token
+                if self.rate_limiter:
+                    self.rate_limiter.refund()
+                continue
+
+            future, fn, args, kwargs, queued_at = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            wait_seconds.observe(time.perf_counter() - queued_at, priority=priority)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                tasks_total.inc(priority=priority, status="error")
+                future.set_exception(e)
+            else:
+                tasks_total.inc(priority=priority, status="ok")
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        """Stop accepting requests; queued requests still run"""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        logging.debug("Speech scheduler shut down")
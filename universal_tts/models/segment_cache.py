@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils.fingerprint import fingerprint
+from utils.metrics import registry
+
+DEFAULT_CACHE_DIR = ".tts_cache"
+
+# Segments no manifest lists are kept for this long after they were last written or used, so that
+# generations still running (which save their manifest at the end) and queue workers keep theirs
+DEFAULT_PRUNE_AGE_SECONDS = 24 * 3600
+
+cache_requests_total = registry.counter(
+    "tts_segment_cache_requests_total", "Segment cache lookups, by result (hit or miss)")
+
+
+def _digest(*parts):
+    data = json.dumps(parts, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SegmentCache:
+    """On-disk cache of synthesized chunk audio with per-document manifests.
+
+    Segments are stored under segments/ by a hash of the chunk text and
+    every synthesis option, so an unchanged or duplicated chunk is never
+    sent to the API twice. Lookups are a single stat of a path derived from
+    the key, which stays fast with millions of segments. A manifest per
+    document (and voice/model/format) lists the segments of its last
+    generation. Segments are never removed while generating, as other
+    documents and concurrent readers may use them; prune() removes those
+    that no manifest lists and that have not been used for a while.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or os.getenv("TTS_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.segments_dir = self.cache_dir / "segments"
+        self.manifests_dir = self.cache_dir / "manifests"
+
+    def key(self, text, voice, model, instructions=None, format="mp3", speed=1.0):
+        """Return the cache key of a chunk synthesized with the given options.
+
+        The text is fingerprinted up to whitespace and case, so repeated
+        boilerplate is served from one segment across chunks and documents.
+        """
+        return _digest(fingerprint(text), voice, model, instructions or "", format, float(speed))
+
+    def path(self, key, format):
+        return self.segments_dir / key[:2] / f"{key}.{format}"
+
+    def get(self, key, format):
+        """Return the path of a cached segment, or None"""
+        path = self.path(key, format)
+        try:
+            # A hit marks the segment as used, so prune() keeps it
+            os.utime(path)
+        except FileNotFoundError:
+            cache_requests_total.inc(result="miss")
+            return None
+        cache_requests_total.inc(result="hit")
+        return path
+
+    @contextmanager
+    def writer(self, key, format):
+        """Yield a temporary path to write a segment to; it is stored if the with-block succeeds"""
+        path = self.path(key, format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.parent / f".{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            yield temp_path
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def _manifest_path(self, document_id, voice, model, format):
+        return self.manifests_dir / f"{_digest(str(document_id), voice, model, format)}.json"
+
+    def load_manifest(self, document_id, voice, model, format):
+        """Return the manifest of a document's last generation, or None"""
+        path = self._manifest_path(document_id, voice, model, format)
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable manifest {path}: {e}")
+            return None
+
+    def save_manifest(self, document_id, voice, model, format, output_file, keys):
+        """Record the segments of a generation, replacing the document's previous manifest"""
+        manifest = {
+            "document": str(document_id),
+            "voice": voice,
+            "model": model,
+            "format": format,
+            "output": str(output_file),
+            "created_at": time.time(),
+            "segments": keys,
+        }
+        path = self._manifest_path(document_id, voice, model, format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+        os.replace(temp_path, path)
+        return manifest
+
+    def prune(self, min_age_seconds=DEFAULT_PRUNE_AGE_SECONDS):
+        """Remove segments that no manifest lists and that were not written or used in the last min_age_seconds.
+
+        Left-over temporary files of interrupted writes are removed after the
+        same time. Nothing is removed if a manifest cannot be read, as its
+        segments would look unused. Returns (files removed, bytes freed).
+        """
+        referenced = set()
+        for path in self.manifests_dir.glob("*.json"):
+            try:
+                referenced.update(json.loads(path.read_text(encoding="utf-8"))["segments"])
+            except FileNotFoundError:
+                # Deleted while listing
+                continue
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"Cannot read manifest {path}, not pruning: {e}")
+        cutoff = time.time() - min_age_seconds
+        removed = freed = 0
+        for path in self.segments_dir.glob("*/*"):
+            key = path.name.split(".")[0]
+            if key and key in referenced:
+                continue
+            try:
+                stat = path.stat()
+                if stat.st_mtime >= cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        logging.info(f"Pruned {removed} unused segment file(s), {freed} bytes, from {self.segments_dir}")
+        return removed, freed
@@ -1,30 +1,70 @@
 import os
 import logging
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Add support for system credential manager
-try:
-    import keyring
+from models.key_pool import parse_api_keys
+
+SERVICE_NAME = "OpenAI-TTS-App"
+
+# Imported on first use, see _get_keyring()
+_keyring = None
+_keyring_checked = False
+_env_loaded = False
+
+
+def _get_keyring():
+    """Import the system credential manager on first use; returns None if unavailable"""
+    global _keyring, _keyring_checked
+    if not _keyring_checked:
+        _keyring_checked = True
+        try:
+            import keyring
+            _keyring = keyring
+        except ImportError:
+            logging.warning("keyring package not available. Install with: pip install keyring")
+    return _keyring
+
+
+def _get_username():
     import getpass
-    KEYRING_AVAILABLE = True
-    SERVICE_NAME = "OpenAI-TTS-App"
-    USERNAME = getpass.getuser()
-except ImportError:
-    KEYRING_AVAILABLE = False
-    SERVICE_NAME = None
-    USERNAME = None
-    logging.warning("keyring package not available. Install with: pip install keyring")
+    return getpass.getuser()
+
+
+def _load_env_file():
+    """Load the .env file into the environment once"""
+    global _env_loaded
+    if not _env_loaded:
+        _env_loaded = True
+        from dotenv import load_dotenv
+        load_dotenv()
 
-# Load .env file
-load_dotenv()
 
 class SettingsModel:
-    """Model for managing API keys and application settings"""
+    """Model for managing API keys and application settings.
+
+    Construction does no I/O; call load() (typically from a background
+    thread) to look the API key up in the environment, .env file and
+    system credential manager.
+    """
     
     def __init__(self):
+        self.api_key = None
+        self.api_key_source = None
+        # Extra (key, requests per minute) pairs from OPENAI_API_KEYS, pooled with api_key
+        self.extra_api_keys = []
+        self.loaded = False
+    
+    def load(self):
+        """Look up the API key from all sources"""
+        _load_env_file()
+        self.extra_api_keys = parse_api_keys(os.getenv("OPENAI_API_KEYS"))
         self.api_key = self.get_api_key_from_sources()
+        if not self.api_key and self.extra_api_keys:
+            self.api_key = self.extra_api_keys[0][0]
+            logging.info("Using the first key from OPENAI_API_KEYS as the primary key")
         self.api_key_source = self._determine_api_key_source()
+        self.loaded = True
+        return self.api_key
     
     def get_api_key_from_sources(self):
         """Try different sources to obtain API key in order of security."""
@@ -35,9 +75,10 @@ class SettingsModel:
             return api_key
             
         # 2. Try system credential manager if available
-        if KEYRING_AVAILABLE:
+        keyring = _get_keyring()
+        if keyring:
             try:
-                api_key = keyring.get_password(SERVICE_NAME, USERNAME)
+                api_key = keyring.get_password(SERVICE_NAME, _get_username())
                 if api_key:
                     logging.info("API key found in system credential manager")
                     return api_key
@@ -45,7 +86,7 @@ class SettingsModel:
                 logging.warning(f"Error accessing system credentials: {e}")
         
         # 3. Fallback: try .env file (less secure)
-        # load_dotenv() was already called at the beginning
+        # _load_env_file() was already called by load()
         
         logging.info("No API key found in any secure storage")
         return None
@@ -70,9 +111,10 @@ class SettingsModel:
             return "current session only"
         
         # Check if key is in keyring
-        if KEYRING_AVAILABLE:
+        keyring = _get_keyring()
+        if keyring:
             try:
-                keyring_key = keyring.get_password(SERVICE_NAME, USERNAME)
+                keyring_key = keyring.get_password(SERVICE_NAME, _get_username())
                 if keyring_key == self.api_key:
                     return "system credential manager"
             except Exception:
@@ -90,9 +132,10 @@ class SettingsModel:
         self.api_key = key
         
         # Store based on selected method
-        if storage_method == "system" and KEYRING_AVAILABLE:
+        keyring = _get_keyring()
+        if storage_method == "system" and keyring:
             try:
-                keyring.set_password(SERVICE_NAME, USERNAME, key)
+                keyring.set_password(SERVICE_NAME, _get_username(), key)
                 self.api_key_source = "system credential manager"
                 logging.info("API Key saved to system credential manager")
                 return True
@@ -165,10 +208,11 @@ class SettingsModel:
             logging.info("API Key removed from current session")
         
         # 2. Remove from system credential manager
-        if KEYRING_AVAILABLE:
+        keyring = _get_keyring()
+        if keyring:
             try:
                 # keyring.delete_password raises an exception if key not found
-                keyring.delete_password(SERVICE_NAME, USERNAME)
+                keyring.delete_password(SERVICE_NAME, _get_username())
                 success_messages.append("• Removed from system credential manager")
                 logging.info("API Key removed from system credential manager")
             except Exception as e:
@@ -202,4 +246,4 @@ class SettingsModel:
     
     def is_keyring_available(self):
         """Check if keyring is available"""
-        return KEYRING_AVAILABLE
\ No newline at end of file
+        return _get_keyring() is not None
\ No newline at end of file
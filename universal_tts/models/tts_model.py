@@ -1,18 +1,52 @@
-import json
+import os
 import logging
 from pathlib import Path
-from openai import OpenAI, AsyncOpenAI
-from openai.helpers import LocalAudioPlayer
-import asyncio
 import threading
+import time
+import uuid
+import shutil
+import tempfile
+
+from models.budget import BudgetPaused, seconds_until_midnight
+from models.key_pool import KeyPool, PooledKey
+from models.scheduler import SpeechScheduler
+from utils.audio_stitcher import PCM_FORMATS, AudioStitcher, read_blocks
+from utils.fingerprint import find_duplicates
+from utils.logging_config import LazyJSON
+from utils.loudness import LoudnessNormalizer
+from utils.metrics import registry, THROUGHPUT_BUCKETS
+from utils.silence import SilenceTrimmer
+from utils.subtitles import TIMED_FORMATS
+from utils.text_chunker import chunk_boundaries, split_text
+from utils.transcoder import Transcoder, synthesis_format
+
+requests_total = registry.counter(
+    "tts_requests_total", "Speech API requests, by model and outcome")
+ttfb_seconds = registry.histogram(
+    "tts_ttfb_seconds", "Time from sending a speech request to its first audio byte")
+stream_seconds = registry.histogram(
+    "tts_stream_seconds", "Time from the first to the last audio byte of a speech response")
+stream_bytes_per_second = registry.histogram(
+    "tts_stream_bytes_per_second", "Download rate of speech responses", buckets=THROUGHPUT_BUCKETS)
+audio_bytes_total = registry.counter(
+    "tts_audio_bytes_total", "Audio bytes received from the speech API, by format")
+duplicate_chunks_total = registry.counter(
+    "tts_duplicate_chunks_total", "Chunks served from the audio of an identical earlier chunk")
+stitch_seconds = registry.histogram(
+    "tts_stitch_seconds", "Time spent writing and finalizing stitched output files, by format")
 
 class TTSModel:
     """Model for handling TTS API operations and data"""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, extra_api_keys=None):
         self.api_key = api_key
-        self.client = None
-        self.async_client = None
+        # Additional (key, requests per minute) pairs, e.g. from OPENAI_API_KEYS
+        self.extra_api_keys = list(extra_api_keys or [])
+        # Optional BudgetGuard checked before every speech request
+        self.budget = None
+        self._key_pool = None
+        self._scheduler = None
+        self._client_lock = threading.Lock()
         
         # Define voice details
         self.common_voices = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
@@ -28,13 +62,72 @@ class TTSModel:
         # Initialize clients if API key is provided
         self.update_clients()
 
+    @property
+    def key_pool(self):
+        """Pool of API keys and their clients, built on first use"""
+        if self._key_pool is None:
+            with self._client_lock:
+                if self._key_pool is None:
+                    self._key_pool = KeyPool.from_api_keys(self.get_api_keys())
+                    if len(self._key_pool) > 1:
+                        logging.info(f"Spreading requests over {len(self._key_pool)} API keys")
+        return self._key_pool
+
+    def get_api_keys(self):
+        """Return the (key, requests per minute) pairs to use, primary key first"""
+        keys = [(self.api_key, None)] if self.api_key else []
+        for api_key, rpm in self.extra_api_keys:
+            if api_key == self.api_key:
+                keys[0] = (api_key, rpm)
+            elif api_key not in (k for k, _ in keys):
+                keys.append((api_key, rpm))
+        return keys
+
+    @property
+    def client(self):
+        """Synchronous OpenAI client of the primary key, created on first use"""
+        primary = self.key_pool.primary
+        return primary.client if primary else None
+
+    @client.setter
+    def client(self, client):
+        # Replaces the pool with a single pre-built client (used by benchmarks)
+        self._key_pool = KeyPool([PooledKey(None, client=client)])
+
+    @property
+    def async_client(self):
+        """Asynchronous OpenAI client of the primary key, created on first use"""
+        primary = self.key_pool.primary
+        return primary.async_client if primary else None
+
+    @async_client.setter
+    def async_client(self, client):
+        if self.key_pool.primary is None:
+            self._key_pool = KeyPool([PooledKey(None)])
+        self.key_pool.primary.async_client = client
+
+    @property
+    def scheduler(self):
+        """Priority scheduler shared by previews, generation and batch work, created on first use"""
+        if self._scheduler is None:
+            with self._client_lock:
+                if self._scheduler is None:
+                    self._scheduler = SpeechScheduler()
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, scheduler):
+        self._scheduler = scheduler
+
     def update_clients(self):
-        """Update OpenAI clients with current API key"""
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-            self.async_client = AsyncOpenAI(api_key=self.api_key)
-            return True
-        return False
+        """Reset the key pool so clients are rebuilt with the current API keys"""
+        self._key_pool = None
+        return bool(self.api_key)
+
+    def prepare_clients(self):
+        """Create the OpenAI clients of every key ahead of first use (e.g. from a background thread)"""
+        keys = self.key_pool.keys
+        return bool(keys) and all(key.client is not None and key.async_client is not None for key in keys)
 
     def set_api_key(self, api_key):
         """Set API key and reinitialize clients"""
@@ -52,12 +145,8 @@ class TTSModel:
             voice = voice.replace(" *", "")
         return voice in self.voice_model_map.get(model, [])
 
-    def generate_speech(self, text, output_file, voice, model, instructions=None, format="mp3", speed=1.0):
-        """Generate speech and save to file"""
-        if not self.client:
-            logging.error("No API client available")
-            raise ValueError("API client not initialized. Check API key.")
-        
+    def _build_api_params(self, text, voice, model, instructions=None, format="mp3", speed=1.0):
+        """Build the parameters for a speech API call"""
         # Remove asterisk if present
         if " *" in voice:
             voice = voice.replace(" *", "")
@@ -77,31 +166,301 @@ class TTSModel:
         # Add speed parameter only for compatible models
         if model in ["tts-1", "tts-1-hd"]:
             api_params["speed"] = speed
-            logging.info(f"Using speed {speed} with compatible model {model}")
+            logging.debug("Using speed %s with compatible model %s", speed, model)
         else:
-            logging.info(f"Speed parameter ignored for model {model} (only works with tts-1 and tts-1-hd)")
+            logging.debug("Speed parameter ignored for model %s (only works with tts-1 and tts-1-hd)", model)
+        
+        return api_params
+
+    def generate_speech(self, text, output_file, voice, model, instructions=None, format="mp3", speed=1.0,
+                        priority="normal", segment_cache=None, document_id=None, job_id=None, stats=None,
+                        subtitles=None, taps=None, loudness=None, pauses=None, boundary=None,
+                        transcode=None):
+        """Generate speech and save to file.
+
+        Text longer than the API input limit is split into chunks which are
+        synthesized in order and stitched into a single output file. Each
+        chunk request goes through the scheduler in the given priority class.
+        text may also be an iterable of paragraphs, such as
+        FileModel.iter_paragraphs, which is packed into chunks as it is read.
+
+        With a SegmentCache, chunk boundaries are content-defined and only
+        chunks without cached audio are synthesized, so generating an edited
+        document again only pays for the changed paragraphs. document_id
+        (e.g. the source file path) names the manifest of the document.
+
+        Chunks that repeat within the document (up to whitespace and case)
+        are synthesized once; with a SegmentCache this extends to every
+        document generated with the same options.
+
+        With a budget guard, job_id names the job its limits apply to; a new
+        document is not started once the daily soft limit has been crossed.
+
+        A stats dict, if given, receives the output size in bytes, its
+        duration in seconds (None where it is unknown without decoding) and
+        the number of characters synthesized.
+        A SubtitleWriter, if given, captions each chunk as soon as its audio
+        is stitched (mp3, wav and pcm only). taps (e.g. an HlsWriter) are
+        passed to the AudioStitcher and receive the audio as it is written.
+        With loudness (a target level in dBFS), every chunk is brought to that
+        speech level as it is stitched (pcm and wav only).
+
+        With pauses (seconds by boundary kind, see utils.silence), the leading
+        and trailing silence of every chunk is trimmed and replaced by the
+        pause for the boundary after it: "sentence" or "paragraph" between
+        chunks, and boundary (e.g. "chapter") after the last one (pcm and wav
+        only).
+
+        transcode ({format: path}) also encodes the pcm or wav output to
+        other formats with local encoders fed as the audio is stitched, so
+        one synthesis yields every format; stats then receives "outputs".
+        If an encoder fails, output_file is removed along with the partial
+        outputs, and the error is raised.
+        """
+        if not self.client:
+            logging.error("No API client available")
+            raise ValueError("API client not initialized. Check API key.")
+        
+        if self.budget is not None:
+            if self.budget.day_paused():
+                raise BudgetPaused("Daily soft budget limit reached; not starting new documents today")
+            job_id = job_id or uuid.uuid4().hex[:12]
         
-        logging.info(f"API call parameters: {json.dumps(api_params, indent=2)}")
+        paragraph_ends = set()
+        chunks = split_text(text, stable=segment_cache is not None, paragraph_ends=paragraph_ends)
+        if not chunks:
+            raise ValueError("No text to synthesize")
+        if subtitles is not None and format not in TIMED_FORMATS:
+            raise ValueError(f"Subtitles need mp3, wav or pcm output, not {format}")
+        if loudness is not None and format not in PCM_FORMATS:
+            raise ValueError(f"Loudness normalization needs wav or pcm output, not {format}")
+        if pauses is not None and format not in PCM_FORMATS:
+            raise ValueError(f"Silence trimming needs wav or pcm output, not {format}")
+        if transcode and format not in PCM_FORMATS:
+            raise ValueError(f"Transcoding needs wav or pcm output, not {format}")
+        characters = sum(len(chunk) for chunk in chunks)
+        logging.info(f"Synthesizing {characters} characters in {len(chunks)} chunk(s)")
         
+        fingerprints, first = find_duplicates(chunks)
+        repeated = {fingerprints[i] for i in range(len(chunks)) if first[i] != i}
+        duplicates_dir = None
+        duplicates = {}
+        
+        processors = []
+        trimmer = None
+        if pauses is not None:
+            trimmer = SilenceTrimmer(pauses)
+            processors.append(trimmer)
+            boundaries = chunk_boundaries(paragraph_ends, chunks)
+            boundaries[-1] = boundary
+        if loudness is not None:
+            processors.append(LoudnessNormalizer(loudness))
+        transcoder = None
+        if transcode:
+            transcoder = Transcoder(transcode)
+            taps = list(taps or []) + [transcoder]
+        stitcher = AudioStitcher(output_file, format, taps, processors)
+        keys = []
+        reused = 0
+        outputs = {}
+        transcoded = transcoder is None
         try:
-            # Using the recommended streaming approach
-            with self.client.audio.speech.with_streaming_response.create(**api_params) as response:
-                # Log response headers
-                logging.info(f"Response received. Status: {response.status_code}")
-                
-                # Save the streaming response to file
-                bytes_written = 0
-                with open(str(output_file), 'wb') as f:
-                    for chunk in response.iter_bytes():
-                        bytes_written += len(chunk)
-                        f.write(chunk)
+            for index, chunk in enumerate(chunks, 1):
+                if subtitles is not None and index > 1:
+                    # The previous chunk is stitched: caption it up to the current end of the audio
+                    subtitles.add(chunks[index - 2], stitcher.duration_seconds)
+                if trimmer is not None:
+                    trimmer.boundary = boundaries[index - 1]
+                if segment_cache is None and fingerprints[index - 1] in repeated:
+                    # Keep the audio of a repeated chunk in a temporary file to stitch it again later
+                    fp = fingerprints[index - 1]
+                    segment = duplicates.get(fp)
+                    if segment is None:
+                        duplicates_dir = duplicates_dir or Path(tempfile.mkdtemp(prefix="tts_duplicates_"))
+                        segment = duplicates_dir / f"{fp}.{format}"
+                        self.scheduler.run(priority, self._synthesize_file, chunk, segment, voice, model,
+                                           instructions, format, speed, job_id)
+                        duplicates[fp] = segment
+                    else:
+                        reused += 1
+                        duplicate_chunks_total.inc()
+                        logging.debug("Chunk %d/%d repeats an earlier chunk, reusing its audio", index, len(chunks))
+                    stitcher.add_segment(read_blocks(segment))
+                    continue
+                if segment_cache is None:
+                    chunk_stats = self.scheduler.run(priority, self.synthesize_chunk, chunk, stitcher, voice, model,
+                                                     instructions, format, speed, job_id)
+                    logging.debug("Chunk %d/%d written: %d bytes", index, len(chunks), chunk_stats["bytes"])
+                    continue
                 
-                logging.info(f"Audio file saved: {output_file}, Size: {bytes_written} bytes")
-                return output_file
+                key = segment_cache.key(chunk, voice, model, instructions, format, speed)
+                keys.append(key)
+                segment = segment_cache.get(key, format)
+                if segment is None:
+                    segment = self.scheduler.run(priority, self._synthesize_segment, chunk, segment_cache, key,
+                                                 voice, model, instructions, format, speed, job_id)
+                else:
+                    reused += 1
+                    if fingerprints[index - 1] in repeated:
+                        duplicate_chunks_total.inc()
+                    logging.debug("Chunk %d/%d unchanged, reusing %s", index, len(chunks), segment)
+                stitcher.add_segment(read_blocks(segment))
+            if subtitles is not None:
+                subtitles.add(chunks[-1], stitcher.duration_seconds)
+            stitcher.close()
+
+            if segment_cache is not None:
+                logging.info(f"Reused {reused} of {len(chunks)} chunk(s) from the segment cache")
+                if document_id is not None:
+                    segment_cache.save_manifest(document_id, voice, model, format, output_file, keys)
+            elif reused:
+                logging.info(f"Reused audio for {reused} repeated chunk(s)")
+            if transcoder is not None:
+                try:
+                    outputs = transcoder.close()
+                except RuntimeError:
+                    # The formats are written as a set: without all of them the document has failed
+                    Path(output_file).unlink(missing_ok=True)
+                    logging.error(f"Removed {output_file}, as its other formats could not be written")
+                    raise
+                transcoded = True
         except Exception as e:
             error_msg = f"Error generating speech: {str(e)}"
             logging.error(error_msg, exc_info=True)
             raise
+        finally:
+            stitcher.close()
+            if not transcoded:
+                # Also on KeyboardInterrupt: encoders must not outlive the document
+                transcoder.abort()
+            stitch_seconds.observe(stitcher.stitch_seconds, format=format)
+            if duplicates_dir is not None:
+                shutil.rmtree(duplicates_dir, ignore_errors=True)
+
+        if stats is not None:
+            stats.update(bytes=stitcher.bytes_written, duration=stitcher.duration_seconds, characters=characters)
+            if outputs:
+                stats["outputs"] = outputs
+        logging.info(f"Audio file saved: {output_file}, Size: {stitcher.bytes_written} bytes")
+        for path in outputs.values():
+            logging.info(f"Transcoded file saved: {path}")
+        return output_file
+
+    def generate_formats(self, text, output_files, voice, model, instructions=None, speed=1.0, stats=None, **options):
+        """Synthesize text once and write it in every format of output_files ({format: path}).
+
+        The API is called for a single format only (see synthesis_format);
+        the other files are written from the same stream as it is stitched,
+        instead of synthesizing the document once per format. If neither wav
+        nor pcm is wanted, the pcm that was requested is not kept. Other
+        options are passed to generate_speech. Returns output_files.
+        """
+        format = synthesis_format(list(output_files))
+        output_file = output_files.get(format)
+        temporary = output_file is None
+        if temporary:
+            first = Path(next(iter(output_files.values())))
+            fd, output_file = tempfile.mkstemp(prefix=f"{first.stem}_", suffix=f".{format}", dir=first.parent)
+            os.close(fd)
+        transcode = {other: path for other, path in output_files.items() if other != format}
+        try:
+            self.generate_speech(text, output_file, voice, model, instructions, format, speed, stats=stats,
+                                 transcode=transcode or None, **options)
+        finally:
+            if temporary:
+                Path(output_file).unlink(missing_ok=True)
+        if stats is not None:
+            stats["outputs"] = dict(output_files)
+        return output_files
+
+    def _synthesize_segment(self, text, segment_cache, key, voice, model, instructions, format, speed, job_id=None):
+        """Synthesize a chunk into the segment cache; returns the segment path"""
+        with segment_cache.writer(key, format) as part_file:
+            self._synthesize_file(text, part_file, voice, model, instructions, format, speed, job_id)
+        return segment_cache.path(key, format)
+
+    def _synthesize_file(self, text, path, voice, model, instructions, format, speed, job_id=None):
+        """Synthesize a chunk into its own audio file"""
+        with AudioStitcher(path, format) as part:
+            return self.synthesize_chunk(text, part, voice, model, instructions, format, speed, job_id)
+
+    def synthesize_chunk(self, text, stitcher, voice, model, instructions=None, format="mp3", speed=1.0,
+                         job_id=None):
+        """Synthesize one chunk of text (at most MAX_INPUT_CHARS) and append its audio to stitcher.
+
+        Returns a dict with the bytes written, time-to-first-byte and total
+        request time in seconds. With a budget guard, the request is charged
+        to job_id, today and the key it is sent with before it starts;
+        BudgetExceeded is raised if that would cross a hard limit.
+        """
+        if not self.client:
+            logging.error("No API client available")
+            raise ValueError("API client not initialized. Check API key.")
+        
+        api_params = self._build_api_params(text, voice, model, instructions, format, speed)
+        logging.debug("API call parameters: %s", LazyJSON(api_params))
+        
+        stats = {"bytes": 0, "ttfb": None, "seconds": None}
+        request_start = time.perf_counter()
+        # A rate-limited request is tried once on each key in the pool
+        for attempt in range(1, len(self.key_pool) + 1):
+            try:
+                # Each request uses the least-loaded healthy key in the pool
+                with self.key_pool.acquire() as key:
+                    reservation = None
+                    if self.budget is not None:
+                        reservation = self.budget.reserve(len(text), model, speed, job_id, key.label)
+                    try:
+                        # Using the recommended streaming approach
+                        with key.client.audio.speech.with_streaming_response.create(**api_params) as response:
+                            # Log response headers
+                            logging.debug("Response received on key %s. Status: %s", key.label, response.status_code)
+                            
+                            # Append the streaming response to the output file
+                            blocks = self._timed_blocks(response.iter_bytes(), request_start, format, stats)
+                            stats["bytes"] = stitcher.add_segment(blocks)
+                    except Exception:
+                        # A request that never produced audio is not charged
+                        if reservation is not None and stats["ttfb"] is None:
+                            self.budget.release(reservation)
+                        raise
+                    if reservation is not None and "key" in reservation.soft_crossed:
+                        self.key_pool.rest(key, seconds_until_midnight())
+                break
+            except Exception as e:
+                # Only retry if nothing was streamed into the output yet
+                if stats["ttfb"] is None and attempt < len(self.key_pool):
+                    if getattr(e, "status_code", None) == 429:
+                        requests_total.inc(model=model, status="rate_limited")
+                        logging.warning(f"Key {key.label} rate limited, retrying on another key")
+                        continue
+                    if getattr(e, "key_retry_after", None) is not None:
+                        logging.warning(f"Key {key.label} is over its budget, retrying on another key")
+                        continue
+                requests_total.inc(model=model, status="error")
+                raise
+        requests_total.inc(model=model, status="ok")
+        stats["seconds"] = time.perf_counter() - request_start
+        return stats
+
+    def _timed_blocks(self, blocks, request_start, format, stats):
+        """Pass through response blocks while recording streaming metrics"""
+        first_byte_at = None
+        received = 0
+        for block in blocks:
+            if first_byte_at is None:
+                first_byte_at = time.perf_counter()
+                stats["ttfb"] = first_byte_at - request_start
+                ttfb_seconds.observe(stats["ttfb"])
+            received += len(block)
+            yield block
+        
+        if first_byte_at is not None:
+            duration = time.perf_counter() - first_byte_at
+            stream_seconds.observe(duration)
+            if duration > 0:
+                stream_bytes_per_second.observe(received / duration)
+        audio_bytes_total.inc(received, format=format)
 
     async def preview_audio_async(self, text, voice, model, instructions=None, speed=1.0):
         """Async function to preview audio"""
@@ -109,45 +468,28 @@ class TTSModel:
             logging.error("No async API client available")
             raise ValueError("Async API client not initialized. Check API key.")
         
-        # Remove asterisk if present
-        if " *" in voice:
-            voice = voice.replace(" *", "")
-
-        # Create API parameters
-        api_params = {
-            "model": model,
-            "voice": voice,
-            "input": text,
-            "response_format": "pcm"  # Keep pcm for preview
-        }
-        
-        # Add instructions if provided
-        if instructions:
-            api_params["instructions"] = instructions
-        
-        # Add speed parameter only for compatible models
-        if model in ["tts-1", "tts-1-hd"]:
-            api_params["speed"] = speed
-            logging.info(f"Using speed {speed} with compatible model {model}")
-        else:
-            logging.info(f"Speed parameter ignored for model {model} (only works with tts-1 and tts-1-hd)")
+        # Keep pcm for preview
+        api_params = self._build_api_params(text, voice, model, instructions, "pcm", speed)
         
-        logging.info(f"Preview API call parameters: {json.dumps(api_params, indent=2)}")
+        logging.debug("Preview API call parameters: %s", LazyJSON(api_params))
         
         try:
-            async with self.async_client.audio.speech.with_streaming_response.create(**api_params) as response:
-                logging.info(f"Preview response received. Status: {response.status_code}")
-                await LocalAudioPlayer().play(response)
-                logging.info("Audio preview completed")
-                return True
+            from openai.helpers import LocalAudioPlayer
+            with self.key_pool.acquire() as key:
+                async with key.async_client.audio.speech.with_streaming_response.create(**api_params) as response:
+                    logging.info(f"Preview response received. Status: {response.status_code}")
+                    await LocalAudioPlayer().play(response)
+                    logging.info("Audio preview completed")
+                    return True
         except Exception as e:
             logging.error(f"Error in async audio preview: {str(e)}", exc_info=True)
             raise
 
     def preview_audio(self, text, voice, model, instructions=None, speed=1.0, callback=None):
-        """Run the async preview in a separate thread"""
+        """Run the async preview as an interactive request on the scheduler"""
         def run_preview():
             try:
+                import asyncio
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
                 loop.run_until_complete(self.preview_audio_async(text, voice, model, instructions, speed))
@@ -160,5 +502,5 @@ class TTSModel:
                 if callback:
                     callback(False, error_msg)
         
-        # Start preview in a separate thread
-        threading.Thread(target=run_preview, daemon=True).start()
\ No newline at end of file
+        # Previews go ahead of any queued generation or batch requests
+        self.scheduler.submit("interactive", run_preview)
\ No newline at end of file
@@ -0,0 +1,250 @@
+import logging
+import struct
+import time
+
+from utils.mp3_frames import Mp3FrameCounter
+
+# Layout of the raw PCM returned by the speech endpoint (24kHz, 16-bit, mono)
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+
+# Output formats whose samples can be processed while stitching
+PCM_FORMATS = ["pcm", "wav"]
+
+# Block size used when copying audio files into a stitched output
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def read_blocks(path, block_size=READ_BLOCK_SIZE):
+    """Yield the contents of a file in blocks, e.g. to pass a stored segment to add_segment()"""
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def build_wav_header(audio_format, data_size):
+    """Return a 44-byte WAV header for data_size bytes of PCM audio in audio_format"""
+    channels = audio_format["channels"]
+    sample_width = audio_format["sample_width"]
+    sample_rate = audio_format["sample_rate"]
+    data_size = min(data_size, 0xFFFFFFFF - 36)
+    return (b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * channels * sample_width,
+                                    channels * sample_width, sample_width * 8)
+            + b"data" + struct.pack("<I", data_size))
+
+
+def parse_wav_header(data):
+    """Parse a RIFF/WAVE header.
+
+    Returns a tuple (header_length, fmt) where header_length is the offset of
+    the first audio byte and fmt is a dict with sample_rate, channels and
+    sample_width, or None if data does not yet contain the complete header.
+    Raises ValueError if data is not a WAV stream.
+    """
+    if len(data) < 12:
+        return None
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("Not a WAV stream")
+
+    fmt = {
+        "sample_rate": PCM_SAMPLE_RATE,
+        "channels": PCM_CHANNELS,
+        "sample_width": PCM_SAMPLE_WIDTH,
+    }
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        if chunk_id == b"data":
+            return pos + 8, fmt
+        if pos + 8 + chunk_size > len(data):
+            return None
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            channels, sample_rate = struct.unpack("<HI", data[pos + 10:pos + 16])
+            bits = struct.unpack("<H", data[pos + 22:pos + 24])[0]
+            fmt = {
+                "sample_rate": sample_rate,
+                "channels": channels,
+                "sample_width": bits // 8,
+            }
+        # Chunks are padded to an even number of bytes
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+class AudioStitcher:
+    """Stream the audio of consecutive chunk responses into a single output file.
+
+    Compressed formats (mp3, aac, opus) are stitched by concatenation. For wav
+    only the first response's header is kept and its size fields are patched
+    when the stitcher is closed; pcm has no header at all.
+
+    Taps receive the audio as it is written (wav without its header) through
+    begin_segment(), write() and end_segment(), and its sample layout through
+    configure() once a wav header has been read, e.g. to publish it while the
+    rest of the document is still being synthesized. They are not closed by
+    the stitcher. Processors (e.g. a SilenceTrimmer and a LoudnessNormalizer,
+    for pcm and wav) transform the audio of each response in turn before it
+    is written.
+    """
+
+    def __init__(self, output_file, format="mp3", taps=None, processors=None):
+        self.output_file = output_file
+        self.format = format
+        self.taps = list(taps or [])
+        self.processors = list(processors or [])
+        self.bytes_written = 0
+        self.stitch_seconds = 0.0
+        self.segment_sizes = []
+        # Duration of each segment where it is known without decoding (pcm, wav and mp3)
+        self.segment_durations = []
+        self.audio_format = {
+            "sample_rate": PCM_SAMPLE_RATE,
+            "channels": PCM_CHANNELS,
+            "sample_width": PCM_SAMPLE_WIDTH,
+        }
+
+        self._file = open(str(output_file), "wb")
+        self._segment_bytes = 0
+        self._audio_bytes = 0
+        self._pending = b""
+        self._in_header = False
+        self._header_length = None
+        self._segment_start = 0.0
+        # MP3 frames are counted as they are written, so the duration is known when stitching ends
+        self._mp3_frames = Mp3FrameCounter() if format == "mp3" else None
+
+        if format == "flac":
+            logging.warning("FLAC chunks are concatenated as separate streams; some players only play the first one")
+
+    def begin_segment(self):
+        """Start a new chunk response"""
+        self._segment_bytes = 0
+        self._pending = b""
+        self._in_header = self.format == "wav"
+        self._segment_start = self.duration_seconds or 0.0
+        if self._mp3_frames is not None:
+            self._mp3_frames.start_stream()
+        for processor in self.processors:
+            processor.begin_segment()
+        for tap in self.taps:
+            tap.begin_segment()
+
+    def write(self, data):
+        """Write a block of the current chunk response"""
+        start = time.perf_counter()
+        if self._in_header:
+            data = self._consume_wav_header(data)
+        for processor in self.processors:
+            if not data:
+                break
+            data = processor.process(data)
+        self._write_audio(data, start)
+
+    def _write_audio(self, data, start):
+        if data:
+            self._file.write(data)
+            if self._mp3_frames is not None:
+                self._mp3_frames.feed(data)
+            for tap in self.taps:
+                tap.write(data)
+        self.stitch_seconds += time.perf_counter() - start
+        self.bytes_written += len(data)
+        self._segment_bytes += len(data)
+        self._audio_bytes += len(data)
+
+    def end_segment(self):
+        """Finish the current chunk response and return its size in bytes"""
+        if self._in_header and self._pending:
+            # Response ended before a complete header was seen; keep the raw bytes
+            logging.warning("Incomplete WAV header in chunk response, writing raw bytes")
+            self._in_header = False
+            self.write(self._pending)
+        if self.processors:
+            # Audio the processors held back until the end of the response, passed down the chain
+            start = time.perf_counter()
+            data = b""
+            for processor in self.processors:
+                data = (processor.process(data) if data else b"") + processor.end_segment()
+            self._write_audio(data, start)
+        self.segment_sizes.append(self._segment_bytes)
+        duration = self.duration_seconds
+        if duration is not None:
+            self.segment_durations.append(duration - self._segment_start)
+        for tap in self.taps:
+            tap.end_segment()
+        return self._segment_bytes
+
+    def add_segment(self, blocks):
+        """Write a complete chunk response from an iterable of byte blocks"""
+        self.begin_segment()
+        for data in blocks:
+            self.write(data)
+        return self.end_segment()
+
+    @property
+    def duration_seconds(self):
+        """Duration of the stitched audio, or None for compressed formats other than mp3"""
+        if self._mp3_frames is not None:
+            return self._mp3_frames.seconds
+        if self.format not in ("pcm", "wav"):
+            return None
+        fmt = self.audio_format
+        bytes_per_second = fmt["sample_rate"] * fmt["channels"] * fmt["sample_width"]
+        return self._audio_bytes / bytes_per_second if bytes_per_second else None
+
+    def close(self):
+        """Finalize headers and close the output file"""
+        if self._file.closed:
+            return
+        start = time.perf_counter()
+        if self.format == "wav" and self._header_length is not None:
+            riff_size = min(self.bytes_written - 8, 0xFFFFFFFF)
+            data_size = min(self._audio_bytes, 0xFFFFFFFF)
+            self._file.seek(4)
+            self._file.write(struct.pack("<I", riff_size))
+            self._file.seek(self._header_length - 4)
+            self._file.write(struct.pack("<I", data_size))
+        self._file.close()
+        self.stitch_seconds += time.perf_counter() - start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _consume_wav_header(self, data):
+        """Buffer data until the WAV header is complete, returning the audio that follows it"""
+        self._pending += data
+        try:
+            parsed = parse_wav_header(self._pending)
+        except ValueError:
+            logging.warning("Chunk response is not a WAV stream, writing raw bytes")
+            self._in_header = False
+            data, self._pending = self._pending, b""
+            return data
+        if parsed is None:
+            return b""
+
+        header_length, fmt = parsed
+        header, audio = self._pending[:header_length], self._pending[header_length:]
+        self._pending = b""
+        self._in_header = False
+
+        if self._header_length is None:
+            # Keep the first header; its size fields are patched in close()
+            self._header_length = header_length
+            self.audio_format = fmt
+            for processor in self.processors + self.taps:
+                processor.configure(fmt)
+            self._file.write(header)
+            self.bytes_written += len(header)
+            self._segment_bytes += len(header)
+        return audio
@@ -0,0 +1,74 @@
+import time
+import struct
+import logging
+
+from utils.audio_stitcher import read_blocks
+from utils.metrics import registry
+from utils.mp3_frames import id3_frame, id3_tag
+
+# A CTOC frame lists at most this many chapters; later CHAP frames are still written
+MAX_TOC_ENTRIES = 255
+
+# CHAP byte offsets are optional; this value marks them as unused
+NO_OFFSET = 0xFFFFFFFF
+
+package_seconds = registry.histogram(
+    "tts_package_seconds", "Time spent packaging chapter files into a single audiobook")
+
+
+def _text_frame(frame_id, text):
+    # Encoding 3 is UTF-8 in ID3v2.4
+    return id3_frame(frame_id, b"\x03" + text.encode("utf-8"))
+
+
+def chapter_tag(chapters, title=None):
+    """Build an ID3v2.4 tag with a table of contents and a CHAP frame per chapter.
+
+    chapters is a list of (title, start_seconds, end_seconds) tuples in
+    playback order; title may be None.
+    """
+    frames = []
+    if title:
+        frames.append(_text_frame("TIT2", title))
+        frames.append(_text_frame("TALB", title))
+
+    element_ids = [f"ch{number}".encode("ascii") for number in range(1, len(chapters) + 1)]
+    if len(element_ids) > MAX_TOC_ENTRIES:
+        logging.warning(f"{len(element_ids)} chapters; the table of contents lists the first {MAX_TOC_ENTRIES}")
+    listed = element_ids[:MAX_TOC_ENTRIES]
+    # Flags: top-level table of contents, entries in order
+    toc = b"toc\x00" + b"\x03" + bytes([len(listed)]) + b"".join(element_id + b"\x00" for element_id in listed)
+    frames.append(id3_frame("CTOC", toc))
+
+    for element_id, (name, start, end) in zip(element_ids, chapters):
+        body = element_id + b"\x00" + struct.pack(">IIII", round(start * 1000), round(end * 1000), NO_OFFSET,
+                                                  NO_OFFSET)
+        if name:
+            body += _text_frame("TIT2", name)
+        frames.append(id3_frame("CHAP", body))
+
+    return id3_tag(frames)
+
+
+def package_mp3(output_file, parts, title=None):
+    """Join MP3 files into one audiobook with a chapter marker at the start of each.
+
+    parts is a list of (title, path, duration_seconds). Chapter times are
+    the running sum of the durations, so the audio is copied once and never
+    decoded. Returns the list of (title, start, end) chapter markers.
+    """
+    start_time = time.perf_counter()
+    chapters = []
+    position = 0.0
+    for name, _, duration in parts:
+        chapters.append((name, position, position + duration))
+        position += duration
+
+    with open(output_file, "wb") as out:
+        out.write(chapter_tag(chapters, title))
+        for _, path, _ in parts:
+            for block in read_blocks(path):
+                out.write(block)
+    package_seconds.observe(time.perf_counter() - start_time)
+    logging.info(f"Audiobook saved: {output_file}, {len(chapters)} chapter(s), {position / 3600:.2f} hours")
+    return chapters
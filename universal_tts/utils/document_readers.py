@@ -0,0 +1,451 @@
+import re
+import codecs
+import zipfile
+import posixpath
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+# Each iter_* function yields a document's paragraphs one at a time, so the chunker can consume them
+# without the whole text being built first. Only the standard library is used.
+
+READ_SIZE = 64 * 1024
+
+# ---- HTML ----
+
+# Tags that end a paragraph of text
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "caption", "dd", "div", "dl", "dt", "figcaption",
+    "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "ol", "p", "pre", "section",
+    "table", "td", "th", "title", "tr", "ul",
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# Tags whose content is never read aloud
+SKIPPED_TAGS = {"head", "script", "style", "template", "noscript", "svg", "math", "nav"}
+
+CHARSET = re.compile(rb"""charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+
+
+class HTMLTextParser(HTMLParser):
+    """Collects the text of an HTML document as paragraphs while it is fed"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self.headings = []
+        self._parts = []
+        self._skip_depth = 0
+        self._heading = False
+
+    def _flush(self):
+        text = " ".join("".join(self._parts).split())
+        self._parts = []
+        if text:
+            self.paragraphs.append(text)
+            if self._heading:
+                self.headings.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in HEADING_TAGS
+        elif tag == "br":
+            self._parts.append(" ")
+        elif tag == "img" and not self._skip_depth:
+            # Keep the alt text of images used as words (e.g. drop caps)
+            alt = dict(attrs).get("alt")
+            if alt and len(alt) <= 2:
+                self._parts.append(alt)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._flush()
+        else:
+            self.handle_starttag(tag, attrs)
+            if tag in SKIPPED_TAGS:
+                self._skip_depth -= 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            self._heading = False
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def drain(self):
+        """Return and forget the paragraphs completed so far"""
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+
+def sniff_encoding(head, default="utf-8"):
+    """Return the encoding declared by a BOM or a charset in the first bytes of a document"""
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                          (codecs.BOM_UTF16_BE, "utf-16")):
+        if head.startswith(bom):
+            return encoding
+    match = CHARSET.search(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return default
+
+
+def iter_html_stream(stream, encoding="utf-8", parser=None):
+    """Yield the paragraphs of HTML read from a binary stream"""
+    parser = parser or HTMLTextParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        parser.feed(decoder.decode(data))
+        yield from parser.drain()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.drain()
+
+
+def iter_html(file_path):
+    """Yield the paragraphs of an HTML or XHTML file"""
+    with open(file_path, "rb") as f:
+        encoding = sniff_encoding(f.read(1024))
+        f.seek(0)
+        yield from iter_html_stream(f, encoding)
+
+
+# ---- EPUB ----
+
+CONTAINER_NS = {"container": "urn:oasis:names:tc:opendocument:xmlns:container"}
+OPF_NS = {"opf": "http://www.idpf.org/2007/opf"}
+
+
+def _epub_package(archive):
+    """Return the path of the package document (OPF) of an EPUB"""
+    container = ElementTree.fromstring(archive.read("META-INF/container.xml"))
+    rootfile = container.find(".//container:rootfile", CONTAINER_NS)
+    if rootfile is None:
+        raise ValueError("EPUB has no package document")
+    return rootfile.get("full-path")
+
+
+def iter_epub_documents(archive):
+    """Yield the archive paths of an EPUB's content documents in reading order"""
+    package_path = _epub_package(archive)
+    package = ElementTree.fromstring(archive.read(package_path))
+    base = posixpath.dirname(package_path)
+    manifest = {item.get("id"): item for item in package.iterfind(".//opf:manifest/opf:item", OPF_NS)}
+    for itemref in package.iterfind(".//opf:spine/opf:itemref", OPF_NS):
+        item = manifest.get(itemref.get("idref"))
+        if item is None or itemref.get("linear") == "no":
+            continue
+        if "html" not in (item.get("media-type") or ""):
+            continue
+        yield posixpath.normpath(posixpath.join(base, unquote(item.get("href"))))
+
+
+def _read_html_member(archive, name):
+    """Return (paragraphs, headings) of an HTML document in a zip archive"""
+    with archive.open(name) as f:
+        encoding = sniff_encoding(f.read(1024))
+    parser = HTMLTextParser()
+    with archive.open(name) as f:
+        paragraphs = list(iter_html_stream(f, encoding, parser))
+    return paragraphs, parser.headings
+
+
+def iter_epub_chapters(file_path):
+    """Yield (title, paragraphs) for each content document of an EPUB, in reading order.
+
+    The title is the document's first heading, or None. Only one chapter
+    is held in memory at a time.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        for name in iter_epub_documents(archive):
+            try:
+                paragraphs, headings = _read_html_member(archive, name)
+            except KeyError:
+                continue  # listed in the spine but missing from the archive
+            if paragraphs:
+                yield (headings[0] if headings else None), paragraphs
+
+
+def iter_epub(file_path):
+    """Yield the paragraphs of an EPUB, chapter by chapter"""
+    for _, paragraphs in iter_epub_chapters(file_path):
+        yield from paragraphs
+
+
+# ---- Markdown ----
+
+FENCE = re.compile(r"^\s*(```|~~~)")
+ATX_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+SETEXT_UNDERLINE = re.compile(r"^\s{0,3}(=+|-+)\s*$")
+HORIZONTAL_RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+TABLE_DELIMITER = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+LINE_PREFIX = re.compile(r"^\s{0,3}(>\s?)*\s*([-*+]\s+(\[[ xX]\]\s+)?|\d+[.)]\s+)?")
+IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+LINK = re.compile(r"\[([^\]]+)\](\([^)]*\)|\[[^\]]*\])")
+LINK_DEFINITION = re.compile(r"^\s{0,3}\[[^\]]+\]:\s")
+INLINE_MARKUP = re.compile(r"(\*\*|__|~~|`+|(?<!\w)[*_](?=\S)|(?<=\S)[*_](?!\w))")
+HTML_TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+
+
+def _markdown_inline(line):
+    line = IMAGE.sub(r"\1", line)
+    line = LINK.sub(r"\1", line)
+    line = HTML_TAG.sub("", line)
+    return INLINE_MARKUP.sub("", line)
+
+
+def iter_markdown(file_path):
+    """Yield the paragraphs of a Markdown file as plain text.
+
+    Headings, list items and quotes become paragraphs of their own, markup
+    is removed (link and image text is kept) and fenced code blocks are
+    left out.
+    """
+    paragraph = []
+    in_fence = False
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if FENCE.match(line):
+                in_fence = not in_fence
+                continue
+            if in_fence or LINK_DEFINITION.match(line):
+                continue
+            # A blank line, a rule or a table delimiter ends the paragraph, and so does a setext
+            # underline, which makes the lines above it a heading
+            if (not line.strip() or HORIZONTAL_RULE.match(line) or TABLE_DELIMITER.match(line)
+                    or (paragraph and SETEXT_UNDERLINE.match(line))):
+                if paragraph:
+                    yield " ".join(paragraph)
+                    paragraph = []
+                continue
+
+            heading = ATX_HEADING.match(line)
+            if heading:
+                if paragraph:
+                    yield " ".join(paragraph)
+                    paragraph = []
+                text = _markdown_inline(heading.group(1)).strip()
+                if text:
+                    yield text
+                continue
+
+            prefix = LINE_PREFIX.match(line)
+            if prefix.group(2) and paragraph:
+                # A new list item starts a new paragraph
+                yield " ".join(paragraph)
+                paragraph = []
+            text = line[prefix.end():]
+            if "|" in text:
+                text = " ".join(cell.strip() for cell in text.strip().strip("|").split("|"))
+            text = _markdown_inline(text).strip()
+            if text:
+                paragraph.append(text)
+    if paragraph:
+        yield " ".join(paragraph)
+
+
+# ---- ODT ----
+
+ODF_TEXT = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+ODF_PARAGRAPHS = {f"{{{ODF_TEXT}}}p", f"{{{ODF_TEXT}}}h"}
+ODF_SKIPPED = {f"{{{ODF_TEXT}}}note", f"{{{ODF_TEXT}}}tracked-changes", f"{{{ODF_TEXT}}}sequence-decls"}
+
+
+def _odf_text(element):
+    """Return the text of an ODF paragraph, expanding spaces, tabs and line breaks"""
+    parts = [element.text or ""]
+    for child in element:
+        tag = child.tag
+        if tag in ODF_SKIPPED:
+            pass
+        elif tag == f"{{{ODF_TEXT}}}s":
+            parts.append(" " * int(child.get(f"{{{ODF_TEXT}}}c", "1")))
+        elif tag in (f"{{{ODF_TEXT}}}tab", f"{{{ODF_TEXT}}}line-break"):
+            parts.append(" ")
+        else:
+            parts.append(_odf_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def iter_odt(file_path):
+    """Yield the paragraphs and headings of an OpenDocument text file"""
+    with zipfile.ZipFile(file_path) as archive, archive.open("content.xml") as content:
+        depth = 0
+        for event, element in ElementTree.iterparse(content, events=("start", "end")):
+            if element.tag not in ODF_PARAGRAPHS:
+                continue
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            # Paragraphs nested in another (e.g. in a note) are part of the outer one
+            if depth == 0:
+                text = " ".join(_odf_text(element).split())
+                if text:
+                    yield text
+                element.clear()
+
+
+# ---- RTF ----
+
+RTF_TOKEN = re.compile(
+    r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|([^\\{}\r\n]+)",
+    re.IGNORECASE,
+)
+
+# Groups whose content is not document text
+RTF_DESTINATIONS = {
+    "aftncn", "aftnsep", "aftnsepc", "annotation", "atnauthor", "atndate", "atnicn", "atnid", "atnparent",
+    "atnref", "atntime", "atrfend", "atrfstart", "author", "background", "bkmkend", "bkmkstart", "blipuid",
+    "buptim", "category", "colorschememapping", "colortbl", "comment", "company", "creatim", "datafield",
+    "datastore", "defchp", "defpap", "do", "doccomm", "docvar", "dptxbxtext", "ebcend", "ebcstart",
+    "factoidname", "falt", "fchars", "ffdeftext", "ffentrymcr", "ffexitmcr", "ffformat", "ffhelptext",
+    "ffl", "ffname", "ffstattext", "file", "filetbl", "fldinst", "fldtype", "fname",
+    "fontemb", "fontfile", "fonttbl", "footer", "footerf", "footerl", "footerr", "footnote", "formfield",
+    "ftncn", "ftnsep", "ftnsepc", "g", "generator", "gridtbl", "header", "headerf", "headerl", "headerr",
+    "hl", "hlfr", "hlinkbase", "hlloc", "hlsrc", "hsv", "htmltag", "info", "keycode", "keywords",
+    "latentstyles", "lchars", "levelnumbers", "leveltext", "lfolevel", "linkval", "list", "listlevel",
+    "listname", "listoverride", "listoverridetable", "listpicture", "liststylename", "listtable",
+    "listtext", "lsdlockedexcept", "macc", "maccPr", "mailmerge", "maln", "malnScr", "manager", "margPr",
+    "mbar", "mbarPr", "mbaseJc", "mbegChr", "mborderBox", "mborderBoxPr", "mbox", "mboxPr", "mchr",
+    "mcount", "mctrlPr", "md", "mdeg", "mdegHide", "mden", "mdiff", "mdPr", "me", "mendChr", "meqArr",
+    "meqArrPr", "mf", "mfName", "mfPr", "mfunc", "mfuncPr", "mgroupChr", "mgroupChrPr", "mgrow",
+    "mhideBot", "mhideLeft", "mhideRight", "mhideTop", "mhtmltag", "mlim", "mlimloc", "mlimlow",
+    "mlimlowPr", "mlimupp", "mlimuppPr", "mm", "mmaddfieldname", "mmath", "mmathPict", "mmathPr",
+    "mmaxdist", "mmc", "mmcJc", "mmconnectstr", "mmconnectstrdata", "mmcPr", "mmcs", "mmdatasource",
+    "mmheadersource", "mmmailsubject", "mmodso", "mmodsofilter", "mmodsofldmpdata", "mmodsomappedname",
+    "mmodsoname", "mmodsorecipdata", "mmodsosort", "mmodsosrc", "mmodsotable", "mmodsoudl",
+    "mmodsoudldata", "mmodsouniquetag", "mmPr", "mmquery", "mmr", "mnary", "mnaryPr", "mnoBreak",
+    "mnum", "mobjDist", "moMath", "moMathPara", "moMathParaPr", "mopEmu", "mphant", "mphantPr",
+    "mplcHide", "mpos", "mr", "mrad", "mradPr", "mrPr", "msepChr", "mshow", "mshp", "msPre", "msPrePr",
+    "msSub", "msSubPr", "msSubSup", "msSubSupPr", "msSup", "msSupPr", "mstrikeBLTR", "mstrikeH",
+    "mstrikeTLBR", "mstrikeV", "msub", "msubHide", "msup", "msupHide", "mtransp", "mtype", "mvertJc",
+    "mvfmf", "mvfml", "mvtof", "mvtol", "mzeroAsc", "mzeroDesc", "mzeroWid", "nesttableprops",
+    "nextfile", "nonesttables", "objalias", "objclass", "objdata", "object", "objname", "objsect",
+    "objtime", "oldcprops", "oldpprops", "oldsprops", "oldtprops", "oleclsid", "operator", "panose",
+    "password", "passwordhash", "pgp", "pgptbl", "picprop", "pict", "pn", "pnseclvl", "pntext",
+    "pntxta", "pntxtb", "printim", "private", "propname", "protend", "protstart", "protusertbl", "pxe",
+    "revtbl", "revtim", "rsidtbl", "rxe", "shp", "shpgrp", "shpinst", "shppict", "shprslt",
+    "shptxt", "sn", "sp", "staticval", "stylesheet", "subject", "sv", "svb", "tc", "template",
+    "themedata", "title", "txe", "ud", "upr", "userprops", "wgrffmtfilter", "windowcaption", "writereservation",
+    "writereservhash", "xe", "xform", "xmlattrname", "xmlattrvalue", "xmlclose", "xmlname", "xmlnstbl",
+    "xmlopen",
+}
+
+# Control words that stand for characters
+RTF_SPECIAL = {
+    "par": "\n", "sect": "\n", "page": "\n", "line": "\n", "row": "\n", "tab": " ", "cell": " ",
+    "emdash": "\u2014", "endash": "\u2013", "emspace": " ", "enspace": " ", "qmspace": " ",
+    "bullet": "\u2022", "lquote": "\u2018", "rquote": "\u2019", "ldblquote": "\u201c", "rdblquote": "\u201d",
+}
+
+
+def iter_rtf(file_path):
+    """Yield the paragraphs of an RTF document.
+
+    Handles groups, destinations that hold no text (font tables, pictures,
+    field instructions...), hex escapes in the document's code page and
+    Unicode escapes with their fallback characters.
+    """
+    stack = []
+    ignorable = False
+    skip_fallback = 1  # characters to skip after a \uN escape
+    to_skip = 0
+    codepage = "cp1252"
+    parts = []
+    # RTF is 7-bit; no token spans a line break, so the file is tokenized line by line
+    with open(file_path, "r", encoding="latin-1") as f:
+        for line in f:
+            for match in RTF_TOKEN.finditer(line):
+                word, arg, hex_code, symbol, brace, text = match.groups()
+                if brace == "{":
+                    stack.append((skip_fallback, ignorable))
+                    to_skip = 0
+                    continue
+                if brace == "}":
+                    if stack:
+                        skip_fallback, ignorable = stack.pop()
+                    to_skip = 0
+                    continue
+                if word is None and hex_code is None and symbol is None and text is None:
+                    continue  # raw line breaks are not text in RTF
+
+                if symbol is not None:
+                    to_skip = 0
+                    if symbol == "*":
+                        ignorable = True
+                    elif ignorable:
+                        pass
+                    elif symbol in "\\{}":
+                        parts.append(symbol)
+                    elif symbol in "~_":
+                        parts.append(" " if symbol == "~" else "-")
+                    elif symbol in "\r\n":
+                        parts.append("\n")  # an escaped line break is a \par
+                    continue
+
+                if word is not None:
+                    to_skip = 0
+                    if word in RTF_DESTINATIONS:
+                        ignorable = True
+                    elif word == "ansicpg" and arg:
+                        codepage = f"cp{arg}"
+                    elif word == "uc" and arg:
+                        skip_fallback = int(arg)
+                    elif ignorable:
+                        pass
+                    elif word == "u" and arg:
+                        code = int(arg)
+                        parts.append(chr(code + 65536 if code < 0 else code))
+                        to_skip = skip_fallback
+                    elif word in RTF_SPECIAL:
+                        parts.append(RTF_SPECIAL[word])
+                    continue
+
+                if hex_code is not None:
+                    if to_skip:
+                        to_skip -= 1
+                    elif not ignorable:
+                        try:
+                            parts.append(bytes([int(hex_code, 16)]).decode(codepage))
+                        except (LookupError, UnicodeDecodeError):
+                            parts.append(bytes([int(hex_code, 16)]).decode("cp1252", errors="replace"))
+                    continue
+
+                if to_skip:
+                    skipped = min(to_skip, len(text))
+                    text = text[skipped:]
+                    to_skip -= skipped
+                if not ignorable:
+                    parts.append(text)
+
+            # Hand over the paragraphs completed on this line
+            if "\n" in parts:
+                *paragraphs, rest = "".join(parts).split("\n")
+                parts = [rest]
+                for paragraph in paragraphs:
+                    paragraph = " ".join(paragraph.split())
+                    if paragraph:
+                        yield paragraph
+
+    text = " ".join("".join(parts).split())
+    if text:
+        yield text
@@ -0,0 +1,23 @@
+import hashlib
+
+# 16 bytes keeps accidental collisions out of reach even for billions of chunks
+DIGEST_SIZE = 16
+
+
+def normalize_for_fingerprint(text):
+    """Collapse whitespace and case, so texts that are spoken the same compare equal"""
+    return " ".join(text.split()).casefold()
+
+
+def fingerprint(text):
+    """Return a hex digest identifying text up to whitespace and case"""
+    data = normalize_for_fingerprint(text).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def find_duplicates(texts):
+    """Return (fingerprints, first) where first[i] is the index of the first text equal to texts[i]"""
+    fingerprints = [fingerprint(text) for text in texts]
+    seen = {}
+    first = [seen.setdefault(fp, index) for index, fp in enumerate(fingerprints)]
+    return fingerprints, first
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import logging
+from pathlib import Path
+
+
+class FolderWatcher:
+    """Detects new and changed files in folders by polling an mtime index.
+
+    Each scan() stats the files in the watched folders (no file is opened)
+    and compares (mtime, size) with the index of files already reported. A
+    new or changed file is only reported once it has stayed unchanged for
+    settle_seconds, so files that are still being copied or written are
+    not picked up half-finished. The index can be saved to a state file so
+    a restarted watcher does not report everything again.
+    """
+
+    def __init__(self, paths, extensions, settle_seconds=5.0, recursive=False, state_file=None):
+        self.paths = [Path(path) for path in paths]
+        self.extensions = {extension.lower() for extension in extensions}
+        self.settle_seconds = settle_seconds
+        self.recursive = recursive
+        self.state_file = Path(state_file) if state_file else None
+        # path -> (mtime_ns, size) of reported files
+        self._index = {}
+        # path -> ((mtime_ns, size), time the file was first seen with that signature)
+        self._pending = {}
+        if self.state_file and self.state_file.exists():
+            self._load_state()
+
+    def _load_state(self):
+        try:
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+            self._index = {path: tuple(signature) for path, signature in state.items()}
+            logging.info(f"Loaded {len(self._index)} known file(s) from {self.state_file}")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable watch state {self.state_file}: {e}")
+
+    def save_state(self):
+        """Write the index of reported files to the state file"""
+        if not self.state_file:
+            return
+        temp_file = self.state_file.with_name(self.state_file.name + ".tmp")
+        temp_file.write_text(json.dumps(self._index), encoding="utf-8")
+        os.replace(temp_file, self.state_file)
+
+    def _iter_files(self, directory):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Skip hidden files and editor/Office lock files
+                if entry.name.startswith((".", "~$")):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive:
+                        yield from self._iter_files(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in self.extensions:
+                    yield entry
+
+    def scan(self):
+        """Return the files that are new or changed and have settled since the last scan"""
+        now = time.monotonic()
+        seen = set()
+        ready = []
+        complete = True
+        for path in self.paths:
+            try:
+                for entry in self._iter_files(path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                    seen.add(entry.path)
+                    if self._index.get(entry.path) == signature:
+                        continue
+
+                    pending = self._pending.get(entry.path)
+                    if pending is None or pending[0] != signature:
+                        # New file, or still changing: restart its settle timer
+                        self._pending[entry.path] = (signature, now)
+                    elif now - pending[1] >= self.settle_seconds:
+                        del self._pending[entry.path]
+                        self._index[entry.path] = signature
+                        ready.append(Path(entry.path))
+            except OSError as e:
+                complete = False
+                logging.warning(f"Cannot scan watched folder {path}: {e}")
+
+        if not complete:
+            # A folder that is briefly unavailable (e.g. a network share) must not reset its index
+            return sorted(ready)
+        # Forget deleted files so they are reported again if they come back
+        for path in [path for path in self._index if path not in seen]:
+            del self._index[path]
+        for path in [path for path in self._pending if path not in seen]:
+            del self._pending[path]
+        return sorted(ready)
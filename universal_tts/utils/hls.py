@@ -0,0 +1,117 @@
+import os
+import math
+import struct
+import logging
+from pathlib import Path
+
+from utils.metrics import registry
+from utils.mp3_frames import Mp3FrameCounter, id3_frame, id3_tag
+
+# Audio per segment; players start after the first one
+DEFAULT_SEGMENT_SECONDS = 6.0
+
+PLAYLIST_NAME = "stream.m3u8"
+
+# Timestamps of packed audio segments are on the 90 kHz MPEG-2 clock, in 33 bits
+PTS_CLOCK = 90000
+PTS_MASK = (1 << 33) - 1
+TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+hls_segments_total = registry.counter(
+    "tts_hls_segments_total", "HLS segments written")
+
+
+def timestamp_tag(seconds):
+    """Return the ID3 tag that starts a packed audio segment, giving the time of its first sample"""
+    pts = round(seconds * PTS_CLOCK) & PTS_MASK
+    return id3_tag([id3_frame("PRIV", TIMESTAMP_OWNER + struct.pack(">Q", pts))])
+
+
+class HlsWriter:
+    """Write an MP3 stream as HLS packed audio segments and a playlist, while it is being produced.
+
+    Used as a tap on an AudioStitcher: the stitched audio is cut at frame
+    boundaries into segments of about segment_seconds, and the playlist is
+    rewritten as each segment is saved, so a player can start listening
+    while the rest of a long document is still being synthesized. close()
+    writes the final segment and ends the playlist.
+    """
+
+    def __init__(self, directory, segment_seconds=DEFAULT_SEGMENT_SECONDS, prefix="segment"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.playlist_path = self.directory / PLAYLIST_NAME
+        self.segment_seconds = segment_seconds
+        self.prefix = prefix
+        self.segments = []
+        self.position = 0.0
+        self._frames = Mp3FrameCounter()
+        self._buffer = bytearray()
+        # Sample count at the start of the segment being filled
+        self._segment_start = 0
+        self._closed = False
+        self._write_playlist()
+
+    def configure(self, audio_format):
+        pass
+
+    def begin_segment(self):
+        """A new response starts in the stitched stream"""
+        self._frames.start_stream()
+
+    def write(self, data):
+        """Add stitched MP3 data; complete segments are saved as soon as they are full"""
+        counter = self._frames
+        for buffer, start, end in counter.iter_frames(data):
+            self._buffer += buffer[start:end]
+            if self._duration() >= self.segment_seconds:
+                self._save_segment()
+
+    def end_segment(self):
+        pass
+
+    def close(self):
+        """Save the last partial segment and mark the playlist as complete"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._buffer:
+            self._save_segment()
+        self._write_playlist()
+        logging.info(f"HLS playlist complete: {self.playlist_path}, {len(self.segments)} segment(s)")
+
+    def _duration(self):
+        return (self._frames.samples - self._segment_start) / self._frames.sample_rate
+
+    def _save_segment(self):
+        duration = self._duration()
+        name = f"{self.prefix}_{len(self.segments):05d}.mp3"
+        tmp = self.directory / f"{name}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(timestamp_tag(self.position))
+            f.write(self._buffer)
+        os.replace(tmp, self.directory / name)
+        self.segments.append((name, duration))
+        self.position += duration
+        self._buffer = bytearray()
+        self._segment_start = self._frames.samples
+        hls_segments_total.inc()
+        self._write_playlist()
+
+    def _write_playlist(self):
+        # An EVENT playlist only grows, so players may start at the beginning before it is complete
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(self.segment_seconds)}",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for name, duration in self.segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(name)
+        if self._closed:
+            lines.append("#EXT-X-ENDLIST")
+        tmp = self.playlist_path.with_name(PLAYLIST_NAME + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, self.playlist_path)
@@ -1,82 +1,137 @@
 import os
+import json
+import queue
+import atexit
 import logging
 import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
+from utils.helpers import truncate_text
+
+# Rotate the log file once it reaches this size, keeping a few old files
+LOG_FILE_NAME = "tts.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Listener thread that performs all log I/O
+_listener = None
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The standard QueueHandler formats every record in the calling thread so it
+    can be pickled; records here never leave the process, so formatting (and
+    any lazy arguments such as LazyJSON) is deferred to the listener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class LazyJSON:
+    """Serialize an object to JSON only when the log record is formatted.
+
+    String values longer than max_length are truncated, so logging API
+    parameters does not copy the full input text into the log.
+    """
+
+    def __init__(self, obj, max_length=200):
+        self.obj = obj
+        self.max_length = max_length
+
+    def __str__(self):
+        return json.dumps(self._truncate(self.obj), indent=2)
+
+    def _truncate(self, value):
+        if isinstance(value, str) and len(value) > self.max_length:
+            return f"{truncate_text(value, self.max_length)} ({len(value)} chars)"
+        if isinstance(value, dict):
+            return {k: self._truncate(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._truncate(v) for v in value]
+        return value
+
+
+def stop_logging():
+    """Flush queued log records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logging():
-    """Setup logging to file with enhanced error checking"""
+    """Setup non-blocking logging to a size-rotated file and the console.
+
+    Application threads only put records on a queue; a QueueListener thread
+    writes them to logs/tts.log (rotated by size) and to the console.
+    """
+    global _listener
     try:
         # Reset any existing logger configuration first
+        stop_logging()
         for handler in logging.root.handlers[:]:
             logging.root.removeHandler(handler)
-            
+
         # Create logs directory if it doesn't exist
         logs_dir = Path("logs")
         try:
             logs_dir.mkdir(exist_ok=True)
-            print(f"Logs directory: {logs_dir.absolute()} {'exists' if logs_dir.exists() else 'creation failed'}")
         except Exception as dir_err:
             print(f"Error creating logs directory: {dir_err}")
             logs_dir = Path(".")
-        
-        # Create a log file with timestamp in name
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = logs_dir / f"tts_log_{timestamp}.log"
-        
-        print(f"Attempting to create log file: {log_file.absolute()}")
-        
-        # Test if we can write to the file
+
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        handlers = []
+
+        # File handler rotating by size
+        log_file = logs_dir / LOG_FILE_NAME
         try:
-            with open(log_file, 'w') as f:
-                f.write(f"Log started at {datetime.datetime.now().isoformat()}\n")
-            print(f"Log file created successfully: {log_file}")
+            file_handler = RotatingFileHandler(
+                log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
         except Exception as file_err:
-            print(f"Cannot write to log file: {file_err}")
-            log_file = Path(f"./tts_log_{timestamp}.log")
-            try:
-                with open(log_file, 'w') as f:
-                    f.write(f"Log started at {datetime.datetime.now().isoformat()}\n")
-                print(f"Created fallback log file: {log_file}")
-            except Exception as fallback_err:
-                print(f"Cannot create fallback log file: {fallback_err}")
-                return False
-        
-        # Configure basic logging
-        logging.basicConfig(
-            filename=str(log_file),
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S',
-            filemode='w'  # Overwrite if exists
-        )
-        
-        # Add console handler for informational messages
+            print(f"Cannot write to log file {log_file.absolute()}: {file_err}")
+            log_file = None
+
+        # Console handler for informational messages
         console = logging.StreamHandler()
         console.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         console.setFormatter(formatter)
-        
-        # Make sure we don't add duplicate handlers
+        handlers.append(console)
+
+        # All I/O happens on the listener thread
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
         root_logger = logging.getLogger('')
-        has_console = any(isinstance(h, logging.StreamHandler) for h in root_logger.handlers)
-        if not has_console:
-            root_logger.addHandler(console)
-            
+        root_logger.setLevel(logging.DEBUG if log_file else logging.INFO)
+        root_logger.addHandler(DeferredQueueHandler(log_queue))
+
         # Log startup information
-        logging.info(f"Logging initialized to: {log_file}")
+        logging.info(f"Logging initialized to: {log_file or 'console only'}")
         logging.info(f"Application started at: {datetime.datetime.now().isoformat()}")
         logging.info(f"Python version: {os.sys.version}")
         logging.info(f"Operating system: {os.name} - {os.sys.platform}")
-        
-        print(f"Logging to: {log_file}")
-        return True
-        
+
+        print(f"Logging to: {log_file or 'console only'}")
+        return log_file is not None
+
     except Exception as e:
         print(f"Critical error in setup_logging: {e}")
         # Fallback to console-only logging
         logging.basicConfig(
             level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
+            format=LOG_FORMAT
         )
         print("Fallback to console logging only")
-        return False
\ No newline at end of file
+        return False
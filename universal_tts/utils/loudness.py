@@ -0,0 +1,139 @@
+import logging
+import math
+
+from utils.metrics import registry
+
+# Default target level of speech, as the RMS of the non-silent windows in dBFS
+DEFAULT_TARGET_DB = -20.0
+
+# Gain is kept within +/- this many dB, so near-silent chunks are not pumped up into noise
+MAX_GAIN_DB = 12.0
+
+# Audio of a chunk held back before its first block is released, to measure its level
+LOOKAHEAD_SECONDS = 3.0
+
+# Loudness is measured over windows of this length; windows below the gate are silence
+WINDOW_SECONDS = 0.1
+GATE_DB = -50.0
+
+FULL_SCALE = 32768.0
+
+gain_db = registry.histogram(
+    "tts_loudness_gain_db", "Gain applied to a chunk by loudness normalization, in dB")
+
+
+class LoudnessNormalizer:
+    """Bring the chunks of a 16-bit PCM stream to the same speech level, block by block.
+
+    Used as the processor of an AudioStitcher (pcm and wav output). The
+    level of each chunk is the RMS of its non-silent windows; the first
+    LOOKAHEAD_SECONDS of a chunk are held back to measure it, after which
+    blocks are released as they arrive with the gain for the level measured
+    so far. Gain changes are ramped across a block, so there are no clicks.
+    Samples are scaled with NumPy straight from the block's memory; only the
+    lookahead is ever buffered, never a whole chunk or file.
+    """
+
+    def __init__(self, target_db=DEFAULT_TARGET_DB, max_gain_db=MAX_GAIN_DB, lookahead_seconds=LOOKAHEAD_SECONDS):
+        import numpy
+        self._np = numpy
+        self.target_db = target_db
+        self.max_gain_db = max_gain_db
+        self.lookahead_seconds = lookahead_seconds
+        self.sample_width = 2
+        self.channels = 1
+        self.sample_rate = 24000
+        self._enabled = True
+        self._pending = bytearray()
+        self._gain = None
+        self._energy = 0.0
+        self._windows = 0
+        self._tail = None
+
+    def configure(self, audio_format):
+        """Set the sample layout of the stream (a dict as in AudioStitcher.audio_format)"""
+        self.sample_rate = audio_format["sample_rate"]
+        self.channels = audio_format["channels"]
+        self.sample_width = audio_format["sample_width"]
+        self._enabled = self.sample_width == 2
+        if not self._enabled:
+            logging.warning(f"Loudness normalization needs 16-bit PCM, not {self.sample_width * 8}-bit; skipped")
+
+    def begin_segment(self):
+        """Start measuring a new chunk"""
+        self._pending = bytearray()
+        self._gain = None
+        self._energy = 0.0
+        self._windows = 0
+        self._tail = None
+
+    def process(self, data):
+        """Return the normalized audio that can be released after data, possibly none yet"""
+        if not self._enabled:
+            return data
+        self._pending += data
+        frame = self.sample_width * self.channels
+        if self._gain is None and len(self._pending) < self.lookahead_seconds * self.sample_rate * frame:
+            return b""
+        # Whole sample frames only; the rest waits for the next block
+        usable = len(self._pending) - len(self._pending) % frame
+        return self._release(usable)
+
+    def end_segment(self):
+        """Return the rest of the chunk, normalized"""
+        if not self._enabled:
+            return b""
+        return self._release(len(self._pending))
+
+    def _release(self, size):
+        # Whole sample frames are scaled; an incomplete frame at the end of a response is passed through
+        frame = self.sample_width * self.channels
+        whole = size - size % frame
+        view = memoryview(self._pending)[:whole]
+        try:
+            out = self._scale(view)
+        finally:
+            view.release()
+        out += bytes(self._pending[whole:size])
+        del self._pending[:size]
+        return out
+
+    def _scale(self, view):
+        np = self._np
+        samples = np.frombuffer(view, dtype="<i2")
+        self._measure(samples)
+        previous = self._gain
+        self._gain = self._target_gain()
+        if previous is None:
+            gain_db.observe(20 * math.log10(self._gain))
+            previous = self._gain
+        if previous == self._gain:
+            scaled = samples * np.float32(self._gain)
+        else:
+            # Ramp from the previous gain over the block, per sample frame
+            frames = samples.size // self.channels
+            ramp = np.linspace(previous, self._gain, frames, dtype=np.float32)
+            scaled = samples.reshape(frames, self.channels) * ramp[:, None]
+        return np.clip(scaled, -FULL_SCALE, FULL_SCALE - 1).astype("<i2").tobytes()
+
+    def _measure(self, samples):
+        np = self._np
+        window = max(1, int(self.sample_rate * WINDOW_SECONDS)) * self.channels
+        if self._tail is not None:
+            samples = np.concatenate((self._tail, samples))
+        whole = samples.size - samples.size % window
+        if whole:
+            squares = samples[:whole].astype(np.float32).reshape(-1, window)
+            power = np.einsum("ij,ij->i", squares, squares) / (window * FULL_SCALE * FULL_SCALE)
+            loud = power[power > 10 ** (GATE_DB / 10)]
+            self._energy += float(loud.sum())
+            self._windows += loud.size
+        self._tail = samples[whole:].copy()
+
+    def _target_gain(self):
+        if not self._windows:
+            # Nothing above the gate yet: leave the audio as it is
+            return 1.0 if self._gain is None else self._gain
+        level_db = 10 * math.log10(self._energy / self._windows)
+        change = max(-self.max_gain_db, min(self.max_gain_db, self.target_db - level_db))
+        return 10 ** (change / 20)
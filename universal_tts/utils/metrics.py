@@ -0,0 +1,273 @@
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Buckets for throughput histograms, in bytes per second
+THROUGHPUT_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 1e8)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class for metrics with optional labels"""
+
+    type = None
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """Return a list of (label_key, value) pairs"""
+        with self._lock:
+            return list(self._values.items())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [(key, {"counts": list(s["counts"]), "sum": s["sum"], "count": s["count"]})
+                    for key, s in self._values.items()]
+
+    def quantile(self, state, q):
+        """Estimate a quantile from bucket counts by linear interpolation"""
+        if not state["count"]:
+            return None
+        rank = q * state["count"]
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, state["counts"]):
+            if seen + count >= rank and count:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound if bound != math.inf else lower
+        return lower
+
+
+class MetricsRegistry:
+    """Thread-safe collection of named metrics.
+
+    Metrics are created on first use, so any module can record into the
+    shared registry without setup:
+
+        registry.counter("tts_requests_total", "Speech API requests").inc(model="tts-1")
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=""):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: m.name)
+
+    def reset(self):
+        """Clear all recorded values (metric definitions are kept)"""
+        for metric in self.metrics():
+            metric.reset()
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serializable dict"""
+        result = {}
+        for metric in self.metrics():
+            samples = []
+            for key, value in metric.samples():
+                sample = {"labels": dict(key)}
+                if metric.type == "histogram":
+                    sample.update({
+                        "count": value["count"],
+                        "sum": value["sum"],
+                        "p50": metric.quantile(value, 0.50),
+                        "p95": metric.quantile(value, 0.95),
+                        "p99": metric.quantile(value, 0.99),
+                    })
+                else:
+                    sample["value"] = value
+                samples.append(sample)
+            result[metric.name] = {"type": metric.type, "help": metric.help, "samples": samples}
+        return result
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for key, value in metric.samples():
+                if metric.type == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, value["counts"]):
+                        cumulative += count
+                        le = [("le", _format_value(bound))]
+                        lines.append(f"{metric.name}_bucket{_format_labels(key, le)} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                    lines.append(f"{metric.name}_count{_format_labels(key)} {value['count']}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        """Write a JSON snapshot of all metrics to path"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+
+# Shared registry used by the application
+registry = MetricsRegistry()
+
+
+def start_metrics_server(port, host="127.0.0.1", metrics_registry=None):
+    """Serve metrics over HTTP in a background thread.
+
+    /metrics returns the Prometheus text format and /metrics.json a JSON
+    snapshot. Returns the server; call shutdown() on it to stop serving.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    metrics_registry = metrics_registry or registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = metrics_registry.to_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = metrics_registry.to_json().encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("Metrics server: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,163 @@
+import logging
+
+# Kilobits per second by bitrate index, for MPEG-1 and MPEG-2/2.5 Layer III
+BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+BITRATES[0] = BITRATES[2]
+
+# Sample rates by version (3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5) and sample rate index
+SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+ID3_HEADER_SIZE = 10
+
+
+def parse_frame_header(header):
+    """Return (frame_length, samples, sample_rate) for a 4-byte MPEG Layer III frame header, or None"""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 3
+    layer = (header[1] >> 1) & 3
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = BITRATES[version][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 1
+    if version == 3:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+
+
+def id3_tag_size(header):
+    """Return the total size of an ID3v2 tag from its 10-byte header, or None if it is not one"""
+    if len(header) < ID3_HEADER_SIZE or header[:3] != b"ID3":
+        return None
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = ID3_HEADER_SIZE if header[5] & 0x10 else 0
+    return ID3_HEADER_SIZE + size + footer
+
+
+def synchsafe(value):
+    """Encode an integer as 4 bytes of 7 bits each, as ID3v2 sizes are"""
+    return bytes([(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F])
+
+
+def id3_frame(frame_id, body):
+    """Build an ID3v2.4 frame"""
+    return frame_id.encode("ascii") + synchsafe(len(body)) + b"\x00\x00" + body
+
+
+def id3_tag(frames):
+    """Build an ID3v2.4 tag from encoded frames"""
+    payload = b"".join(frames)
+    return b"ID3\x04\x00\x00" + synchsafe(len(payload)) + payload
+
+
+def _is_info_frame(frame):
+    # A Xing/Info frame at the start of a stream carries encoder metadata, not audio
+    return b"Xing" in frame[4:48] or b"Info" in frame[4:48]
+
+
+class Mp3FrameCounter:
+    """Count the audio frames of an MP3 stream fed in blocks of any size, without decoding it.
+
+    ID3v2 tags and Xing/Info frames are skipped, and the counter resyncs on
+    the next frame header after anything it does not recognize. Call
+    start_stream() where a new response begins in a concatenated stream.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = None
+        self._pending = b""
+        self._skip = 0
+        self._headers = {}
+        self._first_frame = True
+
+    def start_stream(self):
+        """Forget any incomplete frame; the next frame may be a Xing/Info frame"""
+        self._pending = b""
+        self._skip = 0
+        self._first_frame = True
+
+    @property
+    def seconds(self):
+        """Duration of the frames counted so far"""
+        return self.samples / self.sample_rate if self.sample_rate else 0.0
+
+    def feed(self, data):
+        """Count the complete frames in data and keep the incomplete tail for the next block"""
+        for _ in self.iter_frames(data):
+            pass
+
+    def iter_frames(self, data):
+        """Count the complete frames in data like feed(), yielding (buffer, start, end) for each audio frame.
+
+        buffer[start:end] is the frame; the generator must be run to the
+        end, as the incomplete tail is only kept for the next block then.
+        """
+        if self._skip:
+            skipped = min(self._skip, len(data))
+            self._skip -= skipped
+            data = data[skipped:]
+        if self._pending:
+            data = self._pending + data
+        end = len(data)
+        pos = 0
+        headers = self._headers
+        while pos + 4 <= end:
+            key = data[pos:pos + 4]
+            header = headers.get(key)
+            if header is None:
+                if key[:3] == b"ID3":
+                    if pos + ID3_HEADER_SIZE > end:
+                        break
+                    size = id3_tag_size(data[pos:pos + ID3_HEADER_SIZE])
+                    self._first_frame = True
+                    if pos + size > end:
+                        self._skip = pos + size - end
+                        pos = end
+                        break
+                    pos += size
+                    continue
+                header = parse_frame_header(key)
+                if header is None:
+                    # Not at a frame: move on to the next possible sync byte
+                    next_sync = data.find(b"\xff", pos + 1)
+                    pos = next_sync if next_sync != -1 else end
+                    self._first_frame = True
+                    continue
+                headers[key] = header
+            length, samples, sample_rate = header
+            if pos + length > end:
+                break
+            pos += length
+            if self._first_frame:
+                self._first_frame = False
+                if _is_info_frame(data[pos - length:pos]):
+                    continue
+            self.frames += 1
+            self.samples += samples
+            self.sample_rate = sample_rate
+            yield data, pos - length, pos
+        self._pending = data[pos:]
+
+
+def mp3_duration(path, block_size=1024 * 1024):
+    """Return the duration of an MP3 file in seconds by walking its frame headers"""
+    counter = Mp3FrameCounter()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            counter.feed(block)
+    if counter.frames == 0:
+        logging.warning(f"No MP3 frames found in {path}")
+    return counter.seconds
@@ -0,0 +1,98 @@
+import re
+import math
+
+from utils.metrics import registry
+
+# Blocks starting or ending within this fraction of the page height from the top or bottom edge
+# are candidates for running headers, footers and page numbers
+MARGIN_RATIO = 0.1
+
+# A margin block is a running header or footer if it recurs on at least this fraction of pages (and 2)
+MIN_REPEAT_RATIO = 0.5
+
+# Position buckets per page height; repeated blocks must fall in the same one
+POSITION_BUCKETS = 20
+
+# A valid roman numeral (not just any word of the letters ivxlcdm, such as "mild" or "civil")
+ROMAN = r"(?=[ivxlcdm])m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})"
+
+# A page number on its own. Roman numerals only count with "page" or "of N", as a bare one may be a
+# word ("I"); bare ones are stripped when they share the position of the page numbers on other pages
+PAGE_NUMBER = re.compile(
+    rf"^[\s\-–—|]*(?:(?:page\s+)?\d+|page\s+{ROMAN}|{ROMAN}(?=\s*(?:of|/)\s*\d))(\s*(of|/)\s*\d+)?[\s\-–—|]*$",
+    re.IGNORECASE)
+BARE_ROMAN = re.compile(rf"^\s*{ROMAN}\s*$", re.IGNORECASE)
+DIGITS = re.compile(r"\d+")
+
+# A word broken over a line end with a hyphen (or soft hyphen), continued in lower case. The pattern
+# starts at the hyphen and looks back for the letter, so the scan does not stop at every word character
+HYPHENATED = re.compile(r"[-\u00ad](?<=\w[-\u00ad])[ \t]*\n\s*(?=[a-z])")
+
+stripped_chars_total = registry.counter(
+    "tts_pdf_stripped_chars_total", "Characters of PDF headers, footers and page numbers left out of extracted text")
+
+
+def _margin_key(block, page_height):
+    """Return a key identifying a header/footer block across pages, or None for body text"""
+    x0, y0, x1, y1, text = block[:5]
+    if y1 <= page_height * MARGIN_RATIO:
+        band = "top"
+    elif y0 >= page_height * (1 - MARGIN_RATIO):
+        band = "bottom"
+    else:
+        return None
+    bucket = int((y0 + y1) / 2 / page_height * POSITION_BUCKETS)
+    # Digits vary from page to page ("Page 3", dates), so they are ignored in the comparison;
+    # a bare roman numeral compares equal to an arabic page number
+    normalized = "#" if BARE_ROMAN.match(text) else DIGITS.sub("#", " ".join(text.split()).casefold())
+    return band, bucket, normalized
+
+
+def strip_page_margins(pages):
+    """Return (page_texts, stripped): the text of each PDF page without running headers, footers and page numbers.
+
+    pages is a list of (page_height, blocks) with blocks as
+    (x0, y0, x1, y1, text) tuples in reading order, as returned by PyMuPDF's
+    page.get_text("blocks"). Blocks near the top or bottom edge are dropped
+    if the same text (ignoring digits) appears at the same position on
+    enough pages, or if they are only a page number. A bare roman numeral
+    is treated like a number, so it is only dropped where page numbers
+    recur.
+    """
+    keys = [[_margin_key(block, height) if height else None for block in blocks] for height, blocks in pages]
+    counts = {}
+    for page_keys in keys:
+        for key in set(filter(None, page_keys)):
+            counts[key] = counts.get(key, 0) + 1
+    min_pages = max(2, math.ceil(len(pages) * MIN_REPEAT_RATIO))
+    repeated = {key for key, count in counts.items() if count >= min_pages}
+
+    page_texts = []
+    stripped = 0
+    for (height, blocks), page_keys in zip(pages, keys):
+        kept = []
+        for block, key in zip(blocks, page_keys):
+            text = block[4]
+            if key is not None and (key in repeated or PAGE_NUMBER.match(text)):
+                stripped += len(text)
+                continue
+            kept.append(text if text.endswith("\n") else text + "\n")
+        page_texts.append("".join(kept))
+
+    stripped_chars_total.inc(stripped)
+    return page_texts, stripped
+
+
+def clean_pdf_pages(pages):
+    """Join the text blocks of PDF pages, leaving out running headers, footers and page numbers.
+
+    See strip_page_margins for the format of pages. Words hyphenated over a
+    line break are rejoined.
+    """
+    page_texts, stripped = strip_page_margins(pages)
+    return dehyphenate("\n".join(page_texts)), stripped
+
+
+def dehyphenate(text):
+    """Rejoin words split with a hyphen at a line end ("synthe-\\nsis" becomes "synthesis")"""
+    return HYPHENATED.sub("", text)
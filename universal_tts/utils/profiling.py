@@ -0,0 +1,174 @@
+import io
+import sys
+import time
+import logging
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+# Number of functions and allocation sites listed in the summary
+DEFAULT_TOP_N = 25
+
+# From Python 3.12, cProfile is interpreter-wide: one profiler sees every thread and no second one can be enabled
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+# Profiler whose profile() block the current thread is in
+_active = threading.local()
+
+
+def active_profiler():
+    """Return the JobProfiler profiling the calling thread, or None"""
+    return getattr(_active, "profiler", None)
+
+
+def profiled(fn):
+    """Wrap fn so that, in whatever thread it runs, it is profiled by the calling thread's profiler"""
+    profiler = active_profiler()
+    if profiler is None or PROFILES_ALL_THREADS:
+        # The profiler enabled in the calling thread already sees the thread fn runs in
+        return fn
+
+    def run(*args, **kwargs):
+        with profiler.profile():
+            return fn(*args, **kwargs)
+    return run
+
+
+class JobProfiler:
+    """Opt-in CPU and memory profiler for a synthesis job or batch.
+
+    Before Python 3.12, cProfile only sees the thread it is enabled in, so
+    every thread that does work for the job wraps it in profile(); the
+    per-thread stats are merged when the profile is written. Work handed to
+    other threads is wrapped with profiled() (the speech scheduler does this
+    for its tasks). From 3.12 the profiler enabled by the job's thread sees
+    every thread, and profiled() leaves work as it is. If another profiler
+    is already active, the block runs without profiling. tracemalloc covers
+    all threads.
+
+        profiler = JobProfiler()
+        profiler.start()
+        with profiler.profile():
+            ...  # in any thread, as often as needed
+        profiler.finish(output_dir / "report")  # report.prof, report.profile.txt
+    """
+
+    def __init__(self, top_n=DEFAULT_TOP_N, trace_memory=True):
+        self.top_n = top_n
+        self.trace_memory = trace_memory
+        self._stats = None
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._owns_tracemalloc = False
+        self._baseline = None
+        self._largest_snapshot = None
+        self._largest_size = -1
+
+    def start(self):
+        """Start the wall clock and memory tracing"""
+        self._started_at = time.perf_counter()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                self._owns_tracemalloc = True
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.take_snapshot()
+        return self
+
+    @contextmanager
+    def profile(self):
+        """Profile the with-block in the calling thread"""
+        if active_profiler() is not None:
+            # Already profiled further up this thread; cProfile cannot be enabled twice
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+ allows one profiler at a time (e.g. another job being profiled, or a debugger)
+            logging.warning(f"Not profiling this part of the job: {e}")
+            profiler = None
+        _active.profiler = self
+        try:
+            yield
+        finally:
+            _active.profiler = None
+            if profiler is not None:
+                profiler.disable()
+                self._collect(profiler)
+
+    def _collect(self, profiler):
+        snapshot = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            size = tracemalloc.get_traced_memory()[0]
+            if size > self._largest_size:
+                snapshot = tracemalloc.take_snapshot()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+            if snapshot is not None and size > self._largest_size:
+                self._largest_size = size
+                self._largest_snapshot = snapshot
+
+    def cancel(self):
+        """Stop tracing without writing a profile"""
+        if self._owns_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._owns_tracemalloc = False
+
+    def finish(self, output_base):
+        """Stop tracing and write <output_base>.prof and <output_base>.profile.txt.
+
+        Returns the paths of the written files.
+        """
+        output_base = Path(output_base)
+        output_base.parent.mkdir(parents=True, exist_ok=True)
+        prof_file = output_base.parent / f"{output_base.name}.prof"
+        summary_file = output_base.parent / f"{output_base.name}.profile.txt"
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+
+        peak_memory = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+        out = io.StringIO()
+        out.write(f"Wall time: {elapsed:.3f} s\n")
+        if peak_memory is not None:
+            out.write(f"Peak traced memory: {peak_memory / (1024 * 1024):.1f} MB\n")
+        out.write("\n")
+
+        with self._lock:
+            stats = self._stats
+        if stats is not None:
+            stats.dump_stats(str(prof_file))
+            for sort_key, title in (("cumulative", "cumulative time"), ("tottime", "own time")):
+                out.write(f"=== Top {self.top_n} functions by {title} ===\n")
+                stats.stream = out
+                stats.sort_stats(sort_key).print_stats(self.top_n)
+        else:
+            prof_file = None
+            out.write("No profiled code ran\n")
+
+        if self._largest_snapshot is not None:
+            out.write(f"=== Top {self.top_n} allocation sites (growth since job start) ===\n")
+            filters = (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+            snapshot = self._largest_snapshot.filter_traces(filters)
+            baseline = self._baseline.filter_traces(filters)
+            for stat in snapshot.compare_to(baseline, "lineno")[:self.top_n]:
+                out.write(f"{stat}\n")
+
+        summary_file.write_text(out.getvalue(), encoding="utf-8")
+        logging.info(f"Profile written to {summary_file}")
+        return prof_file, summary_file
+
@@ -0,0 +1,150 @@
+import logging
+
+from utils.metrics import registry
+
+# Pause in seconds inserted after a chunk, by the kind of boundary that follows it
+DEFAULT_PAUSES = {"sentence": 0.35, "paragraph": 0.8, "chapter": 2.0}
+
+# Samples quieter than this are silence
+DEFAULT_THRESHOLD_DB = -40.0
+
+# Silence kept next to speech when trimming, so soft onsets and decays are not cut off
+MARGIN_SECONDS = 0.05
+
+# Silence held back at most while waiting to see whether more speech follows; older silence is written
+MAX_HELD_SECONDS = 10.0
+
+trimmed_seconds_total = registry.counter(
+    "tts_trimmed_silence_seconds_total", "Leading and trailing silence removed from chunk responses, in seconds")
+
+
+def parse_pauses(spec):
+    """Parse "sentence=0.3,paragraph=1,chapter=2.5" into a pauses dict, starting from the defaults"""
+    pauses = dict(DEFAULT_PAUSES)
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        kind, separator, seconds = part.partition("=")
+        kind = kind.strip()
+        if not separator or kind not in DEFAULT_PAUSES:
+            raise ValueError(f"Expected {', '.join(f'{k}=SECONDS' for k in DEFAULT_PAUSES)}, got '{part}'")
+        try:
+            pauses[kind] = float(seconds)
+        except ValueError:
+            raise ValueError(f"Not a number of seconds: '{seconds.strip()}'")
+        if pauses[kind] < 0:
+            raise ValueError(f"Pause for {kind} cannot be negative")
+    return pauses
+
+
+class SilenceTrimmer:
+    """Trim the silence at both edges of each chunk of a 16-bit PCM stream and insert a set pause.
+
+    Used as a processor of an AudioStitcher (pcm and wav output). Leading
+    silence is dropped as blocks arrive; silence after the last speech seen
+    is held back until more speech follows it, and dropped when the chunk
+    ends. A pause for the boundary after the chunk (set with boundary) is
+    then written as digital silence, so the gap between two chunks is the
+    pause plus at most MARGIN_SECONDS on each side, whatever silence the
+    responses came with. Detection is vectorized with NumPy per block; only
+    a run of silence is ever held, never a whole chunk.
+    """
+
+    def __init__(self, pauses=None, threshold_db=DEFAULT_THRESHOLD_DB):
+        import numpy
+        self._np = numpy
+        self.pauses = dict(DEFAULT_PAUSES if pauses is None else pauses)
+        self.threshold = round(32768 * 10 ** (threshold_db / 20))
+        # Kind of boundary after the current chunk ("sentence", "paragraph", "chapter"), or None for no pause
+        self.boundary = None
+        self.sample_width = 2
+        self.channels = 1
+        self.sample_rate = 24000
+        self._enabled = True
+        self.begin_segment()
+
+    def configure(self, audio_format):
+        """Set the sample layout of the stream (a dict as in AudioStitcher.audio_format)"""
+        self.sample_rate = audio_format["sample_rate"]
+        self.channels = audio_format["channels"]
+        self.sample_width = audio_format["sample_width"]
+        self._enabled = self.sample_width == 2
+        if not self._enabled:
+            logging.warning(f"Silence trimming needs 16-bit PCM, not {self.sample_width * 8}-bit; skipped")
+
+    def begin_segment(self):
+        """Start a new chunk; its leading silence is trimmed"""
+        self._leading = True
+        self._partial = b""
+        self._held = bytearray()
+        self._trimmed = 0
+
+    def process(self, data):
+        """Return the audio that can be written after data; trailing silence is held back"""
+        if not self._enabled:
+            return data
+        frame = self.sample_width * self.channels
+        data = self._partial + data
+        whole = len(data) - len(data) % frame
+        self._partial = data[whole:]
+        view = memoryview(data)[:whole]
+        first, last = self._loud_range(view)
+        if first is None:
+            return self._hold(view)
+        out = bytearray()
+        if self._leading:
+            self._leading = False
+            # The margin before the first speech may reach back into silence held from earlier blocks
+            margin = self._frames_bytes(MARGIN_SECONDS)
+            held = self._held + view[:first]
+            self._trimmed += max(0, len(held) - margin)
+            out += held[len(held) - min(margin, len(held)):]
+        else:
+            out += self._held
+            out += view[:first]
+        self._held = bytearray()
+        out += view[first:last]
+        out += self._hold(view[last:])
+        return bytes(out)
+
+    def end_segment(self):
+        """Drop the trailing silence of the chunk and return the pause for the boundary after it"""
+        if not self._enabled:
+            return b""
+        # An incomplete sample frame at the end of a response is dropped with the silence
+        margin = self._frames_bytes(MARGIN_SECONDS)
+        kept = bytes(self._held[:margin]) if not self._leading else b""
+        self._trimmed += len(self._held) + len(self._partial) - len(kept)
+        trimmed_seconds_total.inc(self._trimmed / (self.sample_rate * self.sample_width * self.channels))
+        self._held = bytearray()
+        self._partial = b""
+        pause = self.pauses.get(self.boundary, 0.0) if self.boundary else 0.0
+        return kept + bytes(self._frames_bytes(max(0.0, pause - 2 * MARGIN_SECONDS)))
+
+    def _frames_bytes(self, seconds):
+        return round(seconds * self.sample_rate) * self.sample_width * self.channels
+
+    def _loud_range(self, view):
+        """Return the byte offsets of the first loud sample frame and the end of the last, or (None, None)"""
+        np = self._np
+        samples = np.frombuffer(view, dtype="<i2")
+        loud = np.flatnonzero((samples > self.threshold) | (samples < -self.threshold))
+        if not loud.size:
+            return None, None
+        frame = self.sample_width * self.channels
+        return int(loud[0]) // self.channels * frame, (int(loud[-1]) // self.channels + 1) * frame
+
+    def _hold(self, view):
+        """Hold back silence; returns any that is written now"""
+        self._held += view
+        if self._leading:
+            # Leading silence is never written; keep only what the margin may need
+            limit = self._frames_bytes(MARGIN_SECONDS)
+        else:
+            limit = self._frames_bytes(MAX_HELD_SECONDS)
+        excess = len(self._held) - limit
+        if excess <= 0:
+            return b""
+        released = b"" if self._leading else bytes(self._held[:excess])
+        if self._leading:
+            self._trimmed += excess
+        del self._held[:excess]
+        return released
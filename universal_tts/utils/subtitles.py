@@ -0,0 +1,108 @@
+import re
+
+from utils.text_chunker import SENTENCE_BOUNDARY
+
+SUBTITLE_FORMATS = ["srt", "vtt"]
+
+# Audio formats whose duration is known while stitching, without decoding
+TIMED_FORMATS = ["mp3", "wav", "pcm"]
+
+# Longest caption (two lines of LINE_CHARS); longer sentences are split at word boundaries into even pieces
+MAX_CUE_CHARS = 84
+LINE_CHARS = 42
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def format_timestamp(seconds, format="srt"):
+    """Format seconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT)"""
+    milliseconds = max(0, round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    separator = "," if format == "srt" else "."
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def balanced_split(text, max_chars):
+    """Split text at spaces into the fewest pieces of about max_chars, with lengths as even as possible"""
+    count = -(-len(text) // max_chars)
+    if count <= 1:
+        return [text]
+    target = len(text) / count
+    pieces = []
+    piece = ""
+    for word in text.split(" "):
+        extended = f"{piece} {word}" if piece else word
+        # Break before the word when that leaves the piece closer to the target length
+        if piece and len(pieces) < count - 1 and len(extended) - target > target - len(piece):
+            pieces.append(piece)
+            piece = word
+        else:
+            piece = extended
+    pieces.append(piece)
+    return pieces
+
+
+def cue_texts(text):
+    """Split the text of a chunk into caption-sized pieces, one sentence (or heading) or less each"""
+    for line in text.splitlines():
+        for sentence in SENTENCE_BOUNDARY.split(WHITESPACE.sub(" ", line).strip()):
+            if sentence:
+                yield from balanced_split(sentence, MAX_CUE_CHARS)
+
+
+class SubtitleWriter:
+    """Write SRT or WebVTT captions while a document's audio is being stitched.
+
+    Call add() after each chunk with the position the audio has reached.
+    The chunk's time span is shared among its sentences in proportion to
+    their length, so timing comes from the known chunk durations and the
+    audio is never decoded or aligned. Cues are flushed as they are added.
+    """
+
+    def __init__(self, path, format="srt"):
+        if format not in SUBTITLE_FORMATS:
+            raise ValueError(f"Unsupported subtitle format: {format}")
+        self.path = path
+        self.format = format
+        self.cues = 0
+        self.position = 0.0
+        self._file = open(str(path), "w", encoding="utf-8")
+        if format == "vtt":
+            self._file.write("WEBVTT\n\n")
+
+    def add(self, text, end):
+        """Caption text as spoken from the end of the previous chunk until end seconds"""
+        start = self.position
+        self.position = max(start, end)
+        pieces = list(cue_texts(text))
+        total = sum(len(piece) for piece in pieces)
+        if not total:
+            return
+        span = self.position - start
+        offset = 0
+        for piece in pieces:
+            cue_start = start + span * offset / total
+            offset += len(piece)
+            self._write_cue(cue_start, start + span * offset / total, piece)
+        self._file.flush()
+
+    def _write_cue(self, start, end, text):
+        self.cues += 1
+        timing = f"{format_timestamp(start, self.format)} --> {format_timestamp(end, self.format)}"
+        lines = "\n".join(balanced_split(text, LINE_CHARS))
+        if self.format == "srt":
+            self._file.write(f"{self.cues}\n{timing}\n{lines}\n\n")
+        else:
+            self._file.write(f"{timing}\n{lines}\n\n")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
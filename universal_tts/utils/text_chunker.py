@@ -0,0 +1,186 @@
+import re
+import zlib
+from collections import Counter
+
+from utils.fingerprint import fingerprint, normalize_for_fingerprint
+
+# Maximum number of characters the speech endpoint accepts in a single request
+MAX_INPUT_CHARS = 4096
+
+# Whitespace that follows sentence-ending punctuation
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+")
+
+# In stable chunking, a paragraph whose hash is divisible by this ends a chunk that is at least half full
+ANCHOR_DIVISOR = 4
+
+# In stable chunking, a paragraph at least this long that occurs more than once becomes a chunk of its own
+MIN_REPEATED_CHARS = 200
+
+
+def _split_words(sentence, max_chars):
+    """Split a sentence longer than max_chars at whitespace (or hard if there is none)"""
+    start = 0
+    while len(sentence) - start > max_chars:
+        cut = sentence.rfind(" ", start, start + max_chars + 1)
+        if cut <= start:
+            cut = start + max_chars
+        yield sentence[start:cut].strip()
+        start = cut
+    rest = sentence[start:].strip()
+    if rest:
+        yield rest
+
+
+def _split_long_paragraph(paragraph, max_chars):
+    """Split a paragraph longer than max_chars at sentence boundaries"""
+    buffer = []
+    size = 0
+    for sentence in SENTENCE_BOUNDARY.split(paragraph):
+        for piece in _split_words(sentence, max_chars):
+            added = len(piece) + (1 if buffer else 0)
+            if buffer and size + added > max_chars:
+                yield " ".join(buffer)
+                buffer = []
+                size = 0
+                added = len(piece)
+            buffer.append(piece)
+            size += added
+    if buffer:
+        yield " ".join(buffer)
+
+
+def iter_chunks(paragraphs, max_chars=MAX_INPUT_CHARS):
+    """Pack an iterable of paragraphs into chunks of at most max_chars characters.
+
+    Paragraphs are kept whole whenever they fit; longer ones are split at
+    sentence boundaries and, as a last resort, at word boundaries.
+    """
+    buffer = []
+    size = 0
+    for paragraph in paragraphs:
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        if len(paragraph) > max_chars:
+            if buffer:
+                yield "\n".join(buffer)
+                buffer = []
+                size = 0
+            yield from _split_long_paragraph(paragraph, max_chars)
+            continue
+
+        added = len(paragraph) + (1 if buffer else 0)
+        if buffer and size + added > max_chars:
+            yield "\n".join(buffer)
+            buffer = []
+            size = 0
+            added = len(paragraph)
+        buffer.append(paragraph)
+        size += added
+
+    if buffer:
+        yield "\n".join(buffer)
+
+
+def _iter_pieces(paragraphs, max_chars):
+    """Yield non-empty paragraphs, splitting those longer than max_chars"""
+    for paragraph in paragraphs:
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars:
+            yield from _split_long_paragraph(paragraph, max_chars)
+        else:
+            yield paragraph
+
+
+def _is_anchor(paragraph):
+    # Normalized so that duplicates differing only in case or spacing are split the same way
+    normalized = normalize_for_fingerprint(paragraph)
+    return zlib.crc32(normalized.encode("utf-8")) % ANCHOR_DIVISOR == 0
+
+
+def iter_stable_chunks(paragraphs, max_chars=MAX_INPUT_CHARS):
+    """Pack paragraphs into chunks whose boundaries depend only on nearby content.
+
+    A chunk ends after an anchor paragraph (chosen by its hash) once it is
+    at least half full, or when the next paragraph would not fit. Editing a
+    paragraph then changes its own chunk and at most the chunks up to the
+    next anchor, instead of shifting every boundary after it as greedy
+    packing does. Chunks are smaller on average than with iter_chunks.
+
+    Long paragraphs that repeat (boilerplate, disclaimers) are emitted as
+    chunks of their own, so every copy maps to the same synthesized audio.
+    """
+    pieces = list(_iter_pieces(paragraphs, max_chars))
+    counts = Counter(fingerprint(piece) for piece in pieces if len(piece) >= MIN_REPEATED_CHARS)
+    repeated = {fp for fp, count in counts.items() if count > 1}
+
+    min_chars = max_chars // 2
+    buffer = []
+    size = 0
+    for paragraph in pieces:
+        if repeated and len(paragraph) >= MIN_REPEATED_CHARS and fingerprint(paragraph) in repeated:
+            if buffer:
+                yield "\n".join(buffer)
+                buffer = []
+                size = 0
+            yield paragraph
+            continue
+        added = len(paragraph) + (1 if buffer else 0)
+        if buffer and size + added > max_chars:
+            yield "\n".join(buffer)
+            buffer = []
+            size = 0
+            added = len(paragraph)
+        buffer.append(paragraph)
+        size += added
+        if size >= min_chars and _is_anchor(paragraph):
+            yield "\n".join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield "\n".join(buffer)
+
+
+def split_text(text, max_chars=MAX_INPUT_CHARS, stable=False, paragraph_ends=None):
+    """Split text into chunks that each fit in a single speech request.
+
+    text is a string or an iterable of paragraphs (e.g. from
+    FileModel.iter_paragraphs), which is consumed once as the chunks are
+    packed. With stable, boundaries are content-defined (see
+    iter_stable_chunks) so unchanged parts of an edited text produce the
+    same chunks. A paragraph_ends set, if given, receives the number of
+    words up to the end of every paragraph, for chunk_boundaries.
+    """
+    paragraphs = text.splitlines() if isinstance(text, str) else text
+    if paragraph_ends is not None:
+        paragraphs = _count_words(paragraphs, paragraph_ends)
+    chunker = iter_stable_chunks if stable else iter_chunks
+    return list(chunker(paragraphs, max_chars))
+
+
+def _count_words(paragraphs, paragraph_ends):
+    words = 0
+    for paragraph in paragraphs:
+        words += len(paragraph.split())
+        paragraph_ends.add(words)
+        yield paragraph
+
+
+def chunk_boundaries(paragraph_ends, chunks):
+    """Return the kind of boundary after each chunk: "paragraph", "sentence" (inside a long paragraph) or None.
+
+    Chunks keep the words of the text in order, so a chunk ends a paragraph
+    when the words up to its end are those up to the end of a paragraph
+    (paragraph_ends, as filled in by split_text). The last chunk has no
+    boundary after it.
+    """
+    kinds = []
+    words = 0
+    for chunk in chunks[:-1]:
+        words += len(chunk.split())
+        kinds.append("paragraph" if words in paragraph_ends else "sentence")
+    return kinds + [None] if chunks else []
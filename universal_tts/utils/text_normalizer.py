@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+from utils.pdf_text import dehyphenate
+
+# Characters the voices read out oddly or that carry no speech, mapped in one str.translate() pass
+CHARACTER_MAP = {
+    # Ligatures produced by PDF extraction
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl", "\ufb05": "st",
+    "\ufb06": "st",
+    # Tabs and unusual spaces (no-break, en/em, thin, ideographic, ...)
+    "\t": " ", "\u00a0": " ", "\u1680": " ", "\u202f": " ", "\u205f": " ", "\u3000": " ",
+    **{chr(code): " " for code in range(0x2000, 0x200b)},
+    # Line and paragraph separators
+    "\u2028": "\n", "\u2029": "\n\n", "\x0b": "\n", "\x0c": "\n\n", "\x85": "\n",
+    # Zero-width characters, soft hyphens and byte order marks
+    "\u200b": None, "\u200c": None, "\u200d": None, "\u2060": None, "\ufeff": None, "\u00ad": None,
+    # List bullets and symbols that would be read as words ("bullet", "trade mark")
+    "\u2022": " ", "\u25e6": " ", "\u25aa": " ", "\u25ab": " ", "\u25cf": " ", "\u25cb": " ",
+    "\u25a0": " ", "\u25a1": " ", "\u2023": " ", "\u2043": " ", "\u2122": None, "\u00ae": None,
+    # Replacement characters from undecodable input
+    "\ufffd": None,
+}
+
+
+def _build_translation_table():
+    table = {ord(char): value for char, value in CHARACTER_MAP.items()}
+    # Remove the remaining C0 and C1 control characters, keeping newlines
+    for code in list(range(0x00, 0x20)) + [0x7f] + list(range(0x80, 0xa0)):
+        if code != ord("\n"):
+            table.setdefault(code, None)
+    return table
+
+
+TRANSLATION_TABLE = _build_translation_table()
+
+# str.translate() has a fast path for ASCII text; other text is scanned once for the characters to map,
+# which are then replaced in bulk
+SPECIAL_CHARACTERS = re.compile("[" + "".join(re.escape(chr(code)) for code in sorted(TRANSLATION_TABLE)) + "]")
+
+# Runs of spaces (the literal prefix lets the regex engine skip ahead quickly)
+SPACE_RUNS = re.compile("  +")
+
+# Three or more line breaks: at most one blank line between paragraphs
+BLANK_LINES = re.compile("\n\n\n+")
+
+# A single line break inside a sentence (a hard wrap from a PDF or e-mail): the line does not end
+# with punctuation and the next one starts in lower case. Matching starts at the newline.
+BROKEN_WRAP = re.compile(r"\n(?<=[\w,;)\]]\n)(?=[a-z(])")
+
+
+def _map_characters(text):
+    if text.isascii():
+        return text.translate(TRANSLATION_TABLE)
+    for char in set(SPECIAL_CHARACTERS.findall(text)):
+        text = text.replace(char, TRANSLATION_TABLE[ord(char)] or "")
+    return text
+
+
+def normalize_text(text):
+    """Clean extracted or pasted text before it is chunked and synthesized.
+
+    Removes control and zero-width characters, replaces ligatures and
+    symbols the voices mispronounce, rejoins hyphenated words and lines that
+    were hard-wrapped mid-sentence, and collapses whitespace. Every step is
+    a precompiled regex, translate or replace pass over the whole text, so
+    the cost is linear in its size.
+    """
+    if not text:
+        return text
+    if not text.isascii():
+        # One code point per accented letter, so the same word always looks the same
+        text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = dehyphenate(text)
+    text = _map_characters(text)
+    text = SPACE_RUNS.sub(" ", text)
+    text = text.replace(" \n", "\n").replace("\n ", "\n")
+    text = BROKEN_WRAP.sub(" ", text)
+    text = BLANK_LINES.sub("\n\n", text)
+    return text.strip()
@@ -0,0 +1,279 @@
+import os
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from utils.audio_stitcher import PCM_CHANNELS, PCM_FORMATS, PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, build_wav_header
+from utils.metrics import registry
+
+# ffmpeg codec options and container for each output format, matching what the speech endpoint returns
+ENCODERS = {
+    "mp3": (["-c:a", "libmp3lame", "-b:a", "128k"], "mp3"),
+    "opus": (["-c:a", "libopus", "-b:a", "64k"], "ogg"),
+    "aac": (["-c:a", "aac", "-b:a", "128k"], "adts"),
+    "flac": (["-c:a", "flac"], "flac"),
+    "wav": (["-c:a", "pcm_s16le"], "wav"),
+    "pcm": (["-c:a", "pcm_s16le"], "s16le"),
+}
+
+# ffmpeg names of raw PCM input by sample width in bytes
+PCM_INPUTS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+# Blocks queued for an encoder before stitching waits for it to catch up
+QUEUE_BLOCKS = 64
+
+transcode_seconds = registry.histogram(
+    "tts_transcode_seconds", "Time from the end of stitching until an encoder finished its output, by format")
+
+
+def synthesis_format(formats):
+    """Return the format to request from the API so that every one of formats comes from one synthesis.
+
+    A single format is requested as is. For several, the audio is requested
+    as wav if that is one of them, or else as pcm, and the others are
+    written from it by a Transcoder.
+    """
+    if len(formats) == 1:
+        return formats[0]
+    return "wav" if "wav" in formats else "pcm"
+
+
+def find_ffmpeg():
+    """Return the ffmpeg executable (TTS_FFMPEG or the one on PATH); raises RuntimeError if there is none"""
+    ffmpeg = os.environ.get("TTS_FFMPEG") or shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("Transcoding needs ffmpeg; install it or set TTS_FFMPEG to its path")
+    return ffmpeg
+
+
+class EncoderPool:
+    """Limit the encoder processes running at once, across all documents being synthesized.
+
+    The encoders of one document are started together, as they are fed the
+    same stream; a document waits until there are slots for all of them, or
+    for the whole pool if it needs more encoders than the pool has slots.
+    """
+
+    def __init__(self, max_processes=None):
+        self.max_processes = max_processes or os.cpu_count() or 2
+        self._slots = threading.BoundedSemaphore(self.max_processes)
+        self._lock = threading.Lock()
+
+    def acquire(self, count):
+        """Wait for count process slots (at most the size of the pool); returns the number taken"""
+        count = min(count, self.max_processes)
+        # Slots are taken by one document at a time, so two documents never hold part of what each needs
+        with self._lock:
+            for _ in range(count):
+                self._slots.acquire()
+        return count
+
+    def release(self, count):
+        for _ in range(count):
+            self._slots.release()
+
+
+encoder_pool = EncoderPool(int(os.environ.get("TTS_ENCODER_PROCESSES", "0")) or None)
+
+
+class _Encoder:
+    """One ffmpeg process encoding the stream to one format, fed from a queue by its own thread"""
+
+    def __init__(self, command, format, path):
+        self.format = format
+        self.path = Path(path)
+        self.part_file = self.path.with_name(self.path.name + ".part")
+        self.broken = False
+        # Errors go to a file, so a chatty encoder can never block on a full pipe
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command + [str(self.part_file)], stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=self._stderr)
+        self.queue = queue.Queue(maxsize=QUEUE_BLOCKS)
+        self.thread = threading.Thread(target=self._feed, name=f"tts-encode-{format}", daemon=True)
+        self.thread.start()
+
+    def _feed(self):
+        stdin = self.process.stdin
+        while True:
+            block = self.queue.get()
+            if block is None:
+                break
+            if self.broken:
+                # Keep draining, so the stitcher is never blocked by an encoder that has exited
+                continue
+            try:
+                stdin.write(block)
+            except OSError:
+                self.broken = True
+        try:
+            stdin.close()
+        except OSError:
+            self.broken = True
+
+    def put(self, data):
+        self.queue.put(data)
+
+    def finish(self):
+        """Wait for the encoder; returns None, or an error message if it failed"""
+        self.queue.put(None)
+        self.thread.join()
+        returncode = self.process.wait()
+        self._stderr.seek(0)
+        message = self._stderr.read().decode("utf-8", "replace").strip()
+        self._stderr.close()
+        if returncode != 0:
+            self.part_file.unlink(missing_ok=True)
+            return f"ffmpeg failed encoding {self.format} (exit code {returncode}): {message[-500:]}"
+        os.replace(self.part_file, self.path)
+        return None
+
+    def kill(self):
+        self.process.kill()
+        self.queue.put(None)
+        self.thread.join()
+        self.process.wait()
+        self._stderr.close()
+        self.part_file.unlink(missing_ok=True)
+
+
+class _PcmWriter:
+    """Write the stream as pcm, or as wav with its sizes filled in when finished; no encoder is needed"""
+
+    def __init__(self, format, path, audio_format):
+        self.format = format
+        self.path = Path(path)
+        self.part_file = self.path.with_name(self.path.name + ".part")
+        self.audio_format = audio_format
+        self._bytes = 0
+        self._file = open(self.part_file, "wb")
+        if format == "wav":
+            self._file.write(build_wav_header(audio_format, 0))
+
+    def put(self, data):
+        self._file.write(data)
+        self._bytes += len(data)
+
+    def finish(self):
+        if self.format == "wav":
+            self._file.seek(0)
+            self._file.write(build_wav_header(self.audio_format, self._bytes))
+        self._file.close()
+        os.replace(self.part_file, self.path)
+        return None
+
+    def kill(self):
+        self._file.close()
+        self.part_file.unlink(missing_ok=True)
+
+
+class Transcoder:
+    """Encode stitched PCM audio to other formats while it is being synthesized.
+
+    Used as a tap on an AudioStitcher with pcm or wav output: one ffmpeg
+    process per compressed target format is started when the first audio
+    arrives, and every block is queued to each of them, so the encoders run
+    in parallel with synthesis and with each other. pcm and wav targets are
+    written directly, without ffmpeg. Each output is written to a .part
+    file and renamed when it is complete. close() waits for the encoders
+    and returns the paths written; abort() stops them.
+    """
+
+    def __init__(self, outputs, pool=None, ffmpeg=None):
+        # Output path by format
+        self.outputs = dict(outputs)
+        self.pool = pool or encoder_pool
+        self.ffmpeg = ffmpeg
+        if ffmpeg is None and any(format not in PCM_FORMATS for format in self.outputs):
+            self.ffmpeg = find_ffmpeg()
+        self.audio_format = {
+            "sample_rate": PCM_SAMPLE_RATE,
+            "channels": PCM_CHANNELS,
+            "sample_width": PCM_SAMPLE_WIDTH,
+        }
+        self._encoders = None
+        self._slots = 0
+
+    def configure(self, audio_format):
+        """Set the sample layout of the stream (a dict as in AudioStitcher.audio_format)"""
+        self.audio_format = dict(audio_format)
+
+    def begin_segment(self):
+        pass
+
+    def write(self, data):
+        """Queue a block of audio to every encoder"""
+        if self._encoders is None:
+            self._start()
+        for encoder in self._encoders:
+            encoder.put(data)
+
+    def end_segment(self):
+        pass
+
+    def close(self):
+        """Wait for the encoders to finish; returns {format: path}, or raises RuntimeError if one failed"""
+        if self._encoders is None:
+            self._start()
+        start = time.perf_counter()
+        errors = []
+        try:
+            for encoder in self._encoders:
+                error = encoder.finish()
+                if error:
+                    errors.append(error)
+                else:
+                    transcode_seconds.observe(time.perf_counter() - start, format=encoder.format)
+        except BaseException:
+            # Interrupted while waiting: stop the encoders not yet finished
+            self.abort()
+            raise
+        finally:
+            self._release()
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return self.outputs
+
+    def abort(self):
+        """Stop the encoders and remove their partial output"""
+        if not self._encoders:
+            return
+        try:
+            for encoder in self._encoders:
+                encoder.kill()
+        finally:
+            self._release()
+
+    def _release(self):
+        self.pool.release(self._slots)
+        self._slots = 0
+        self._encoders = []
+
+    def _start(self):
+        fmt = self.audio_format
+        sample_format = PCM_INPUTS.get(fmt["sample_width"])
+        if sample_format is None:
+            raise ValueError(f"Cannot transcode {fmt['sample_width'] * 8}-bit audio")
+        command = [self.ffmpeg, "-hide_banner", "-loglevel", "error", "-f", sample_format,
+                   "-ar", str(fmt["sample_rate"]), "-ac", str(fmt["channels"]), "-i", "pipe:0"]
+        encoded = [format for format in self.outputs if format not in PCM_FORMATS]
+        self._slots = self.pool.acquire(len(encoded)) if encoded else 0
+        started = []
+        try:
+            for format, path in self.outputs.items():
+                if format in PCM_FORMATS:
+                    started.append(_PcmWriter(format, path, fmt))
+                    continue
+                codec, container = ENCODERS[format]
+                started.append(_Encoder(command + codec + ["-f", container, "-y"], format, path))
+        except BaseException:
+            for encoder in started:
+                encoder.kill()
+            self._release()
+            raise
+        self._encoders = started
+        logging.debug(f"Writing {', '.join(self.outputs)} with {len(encoded)} encoder process(es)")
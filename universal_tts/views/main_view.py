@@ -279,6 +279,31 @@ class MainView:
             
             output_browse = ttk.Button(output_frame, text="Browse", command=self.controller.browse_output_folder)
             output_browse.pack(side=tk.LEFT, padx=(0, 5))
+            
+            # Opt-in profiling of the next generation job
+            self.profile_var = tk.BooleanVar(value=False)
+            profile_check = ttk.Checkbutton(output_frame, text="Profile job", variable=self.profile_var)
+            profile_check.pack(side=tk.LEFT, padx=(5, 0))
+            
+            # Reuse audio of unchanged paragraphs when a document is generated again
+            self.incremental_var = tk.BooleanVar(value=False)
+            incremental_check = ttk.Checkbutton(output_frame, text="Reuse unchanged audio",
+                                                variable=self.incremental_var)
+            incremental_check.pack(side=tk.LEFT, padx=(5, 0))
+            
+            # Further formats written from the same synthesis as the selected format
+            formats_frame = ttk.Frame(self.scrollable_frame, padding=(15, 0, 10, 5))
+            formats_frame.pack(fill=tk.X, padx=5)
+            formats_label = ttk.Label(formats_frame, text="Also save as:")
+            formats_label.pack(side=tk.LEFT, padx=(0, 5))
+            self.extra_format_vars = {}
+            for format in ["mp3", "opus", "aac", "flac", "wav", "pcm"]:
+                self.extra_format_vars[format] = tk.BooleanVar(value=False)
+                format_check = ttk.Checkbutton(formats_frame, text=format, variable=self.extra_format_vars[format])
+                format_check.pack(side=tk.LEFT, padx=(5, 0))
+            formats_note = ttk.Label(formats_frame, text="one synthesis; compressed formats need ffmpeg",
+                                     font=('Arial', 8, 'italic'), foreground='#666666')
+            formats_note.pack(side=tk.LEFT, padx=(10, 0))
         
     def get_current_tab(self):
         """Get the currently selected tab index"""